@@ -1,5 +1,7 @@
 from django.db import models
 
+from requestdataapp.fts import FullTextField
+
 
 class Author(models.Model):
     """Модель Author представляет автора статьи"""
@@ -35,3 +37,24 @@ class Article(models.Model):
 
     def __str__(self) -> str:
         return f'{self.title!r}'
+
+
+class ArticleSearch(models.Model):
+    """
+    FTS5-индекс заголовков и текстов статей (только SQLite), его заполняют триггеры из миграции.
+    Столбцы индекса: 0 — title, 1 — content.
+    """
+    class Meta:
+        managed = False
+        db_table = "blogapp_article_fts"
+
+    article = models.OneToOneField(
+        Article,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column="rowid",
+        db_constraint=False,
+        related_name="search",
+    )
+    document = FullTextField(db_column="blogapp_article_fts")
+    rank = models.FloatField()
@@ -1,3 +1,42 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import translation
 
-# Create your tests here.
+from .models import Article, Author, Category
+
+
+class ArticleSearchViewTestCase(TestCase):
+    def setUp(self):
+        # блог есть только в i18n_patterns, а активный язык мог остаться от других тестов
+        with translation.override("en"):
+            self.url = reverse("blogapp:articles-search")
+        author = Author.objects.create(name="Search author")
+        category = Category.objects.create(name="Search category")
+        self.article = Article.objects.create(
+            title="Caching in Django",
+            content="Long introduction. " * 50 + "The <b>low-level</b> cache API stores values. " + "Outro. " * 50,
+            author=author,
+            category=category,
+        )
+        Article.objects.create(title="Templates", content="Nothing here", author=author, category=category)
+
+    def test_search_with_snippet(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {"q": "cache api"}, follow=True)
+        self.assertContains(response, "Caching in Django")
+        self.assertNotContains(response, "Templates")
+        self.assertContains(response, "<mark>cache</mark> <mark>API</mark>")
+        self.assertContains(response, "&lt;b&gt;low-level&lt;/b&gt;")
+        self.assertNotContains(response, "Outro. Outro. Outro. Outro. Outro. Outro. Outro. Outro.")
+        article_query = next(q["sql"] for q in queries if "blogapp_article_fts" in q["sql"])
+        self.assertNotIn('"blogapp_article"."content"', article_query)
+
+    def test_index_follows_changes(self):
+        self.article.content = "Rewritten about sessions"
+        self.article.save()
+        response = self.client.get(self.url, {"q": "sessions"}, follow=True)
+        self.assertContains(response, "Caching in Django")
+        response = self.client.get(self.url, {"q": "cache"}, follow=True)
+        self.assertContains(response, "Nothing found")
@@ -1,10 +1,11 @@
 from django.urls import path
 
-from .views import ArticleListView
+from .views import ArticleListView, ArticleSearchView
 
 
 app_name = "blogapp"
 
 urlpatterns = [
     path("articles/", ArticleListView.as_view(), name="articles"),
+    path("articles/search/", ArticleSearchView.as_view(), name="articles-search"),
 ]
@@ -1,14 +1,27 @@
 from django.shortcuts import render
 from django.views.generic import ListView
 
+from requestdataapp.fts import FullTextSearchMixin
+
 from .models import Article
 
 
 class ArticleListView(ListView):
     """Class Based View для отображения списка статей"""
+    query_budget = 2
 
     template_name = "blogapp/articles_list.html"
     context_object_name = "articles"
-    queryset = (
-        Article.objects.select_related("author", "category").prefetch_related("tags").defer("content")
-    )
+    # content не откладываем: шаблон его выводит, и defer дал бы запрос на каждую статью
+    queryset = Article.objects.select_related("author", "category").prefetch_related("tags")
+
+
+class ArticleSearchView(FullTextSearchMixin, ListView):
+    """Поиск статей по заголовку и тексту, со сниппетами текста"""
+    query_budget = 2
+
+    template_name = "blogapp/articles_search.html"
+    context_object_name = "articles"
+    paginate_by = 20
+    search_fields = "title", "content"
+    queryset = Article.objects.select_related("author", "category").defer("content")
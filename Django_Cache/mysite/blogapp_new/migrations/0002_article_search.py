@@ -0,0 +1,33 @@
+# Generated by Django 4.2.11 on 2026-10-18 12:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+import requestdataapp.fts
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogapp_new', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArticleSearch',
+            fields=[
+                ('article', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search', serialize=False, to='blogapp_new.article')),
+                ('document', requestdataapp.fts.FullTextField(db_column='blogapp_new_article_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'blogapp_new_article_fts',
+                'managed': False,
+            },
+        ),
+        # FTS5 есть только в SQLite, на других БД поиск остаётся LIKE
+        requestdataapp.fts.CreateFullTextIndex(
+            table='blogapp_new_article_fts',
+            content_table='blogapp_new_article',
+            columns=['title', 'body'],
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.urls import reverse
 
+from requestdataapp.fts import FullTextField
+
 
 class Article(models.Model):
     title = models.CharField(max_length=100)
@@ -9,3 +11,24 @@ class Article(models.Model):
 
     def get_absolute_url(self):
         return reverse("blogapp_new:article", kwargs={"pk": self.pk})
+
+
+class ArticleSearch(models.Model):
+    """
+    FTS5-индекс заголовков и текстов статей (только SQLite), его заполняют триггеры из миграции.
+    Столбцы индекса: 0 — title, 1 — body.
+    """
+    class Meta:
+        managed = False
+        db_table = "blogapp_new_article_fts"
+
+    article = models.OneToOneField(
+        Article,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column="rowid",
+        db_constraint=False,
+        related_name="search",
+    )
+    document = FullTextField(db_column="blogapp_new_article_fts")
+    rank = models.FloatField()
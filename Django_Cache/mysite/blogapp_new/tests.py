@@ -1,3 +1,29 @@
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone, translation
 
-# Create your tests here.
+from .models import Article
+
+
+class ArticleSearchViewTestCase(TestCase):
+    def setUp(self):
+        # блог есть только в i18n_patterns, а активный язык мог остаться от других тестов
+        with translation.override("en"):
+            self.url = reverse("blogapp_new:articles-search")
+        self.published = Article.objects.create(
+            title="Published about sitemaps",
+            body="Sitemaps help search engines find pages.",
+            published_at=timezone.now(),
+        )
+        Article.objects.create(title="Draft about sitemaps", body="Not yet")
+
+    def test_search_published(self):
+        response = self.client.get(self.url, {"q": "sitemap"}, follow=True)
+        self.assertContains(response, "Published about sitemaps")
+        self.assertNotContains(response, "Draft about sitemaps")
+        self.assertContains(response, "<mark>Sitemaps</mark> help")
+
+    def test_empty_query(self):
+        response = self.client.get(self.url, follow=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "Published about sitemaps")
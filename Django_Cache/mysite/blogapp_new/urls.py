@@ -2,6 +2,7 @@ from django.urls import path
 
 from .views import (
     ArticleListView,
+    ArticleSearchView,
     ArticleDetailView,
     LatestArticlesFeed
 )
@@ -10,6 +11,7 @@ app_name = "blogapp_new"
 
 urlpatterns = [
     path("articles/", ArticleListView.as_view(), name="articles"),
+    path("articles/search/", ArticleSearchView.as_view(), name="articles-search"),
     path("articles/<int:pk>/", ArticleDetailView.as_view(), name="article"),
     path("articles/latest/feed", LatestArticlesFeed(), name="articles-feed"),
 ]
@@ -2,10 +2,13 @@ from django.views.generic import ListView, DetailView
 from django.contrib.syndication.views import Feed
 from django.urls import reverse, reverse_lazy
 
+from requestdataapp.fts import FullTextSearchMixin
+
 from .models import Article
 
 
 class ArticleListView(ListView):
+    query_budget = 1
     queryset = (
         Article.objects
         .filter(published_at__isnull=False)
@@ -13,11 +16,25 @@ class ArticleListView(ListView):
     )
 
 
+class ArticleSearchView(FullTextSearchMixin, ListView):
+    query_budget = 2
+    template_name = "blogapp_new/article_search.html"
+    paginate_by = 20
+    search_fields = "title", "body"
+    queryset = (
+        Article.objects
+        .filter(published_at__isnull=False)
+        .defer("body")
+    )
+
+
 class ArticleDetailView(DetailView):
+    query_budget = 1
     model = Article
 
 
 class LatestArticlesFeed(Feed):
+    query_budget = 1
     title = "Blog articles (latest)"
     description = "Updates on changes and addition blog articles"
     link = reverse_lazy("blogapp_new:articles")
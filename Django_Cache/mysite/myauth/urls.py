@@ -1,6 +1,8 @@
 from django.urls import path
 from django.contrib.auth.views import LoginView
 
+from requestdataapp.querybudget import query_budget
+
 from myauth.views import (
     get_cookie_view,
     set_cookie_view,
@@ -15,7 +17,11 @@ from myauth.views import (
     UserAboutMelView,
     HelloView,
 )
-from shopapp.views import UserOrdersListView, UserOrdersDataExportView
+from shopapp.views import (
+    UserOrdersListView,
+    UserOrdersDataExportView,
+    AsyncUserOrdersDataExportView,
+)
 
 
 app_name = 'myauth'
@@ -27,11 +33,16 @@ urlpatterns = [
     path("users/<int:pk>/update", UserUpdateView.as_view(), name="user_update"),
     path("users/<int:pk>/orders/", UserOrdersListView.as_view(), name="user_orders_list"),
     path("users/<int:pk>/orders/export/", UserOrdersDataExportView.as_view(), name="user_orders_export"),
+    path(
+        "users/<int:pk>/orders/export/async/",
+        AsyncUserOrdersDataExportView.as_view(),
+        name="user_orders_export_async",
+    ),
     path('login/',
-         LoginView.as_view(
+         query_budget(9)(LoginView.as_view(
              template_name='myauth/login.html',
              redirect_authenticated_user=True,
-         ),
+         )),
          name="login"),
     path("logout/", logout_view, name="logout"),
     path("logout/", MyLogoutView.as_view(), name="logout"),
@@ -17,11 +17,14 @@ from django.views.generic import CreateView, UpdateView, ListView
 from django.utils.translation import gettext_lazy as _, ngettext
 from django.views.decorators.cache import cache_page
 
+from requestdataapp.querybudget import query_budget
+
 from .forms import ProfileForm
 from .models import Profile
 
 
 class HelloView(View):
+    query_budget = 0
     welcome_message = _("welcome hello world!")
     def get(self, request: HttpRequest) -> HttpResponse:
         items_str = request.GET.get("items") or 0
@@ -39,13 +42,16 @@ class HelloView(View):
 
 
 class UsersListView(ListView):
+    query_budget = 1
     template_name = 'myauth/users-list.html'
     context_object_name = 'users'
-    queryset = User.objects.all()
+    # шаблон показывает аватар из профиля каждого пользователя
+    queryset = User.objects.select_related("profile")
     users = User.objects.all()
 
 
 class UserAboutMelView(UpdateView):
+    query_budget = 4
     template_name = 'myauth/user_detail_form.html'
     model = Profile
     context_object_name = 'profile'
@@ -63,6 +69,8 @@ class UserAboutMelView(UpdateView):
 
 
 class UserUpdateView(UserPassesTestMixin, UpdateView):
+    query_budget = 5
+
     def test_func(self):
         if self.request.user.is_superuser or self.request.user.is_staff:
             return True
@@ -87,6 +95,7 @@ class UserUpdateView(UserPassesTestMixin, UpdateView):
 
 
 class RegisterView(CreateView):
+    query_budget = 13
     form_class = UserCreationForm
     template_name = "myauth/register.html"
     success_url = reverse_lazy("myauth:users")
@@ -106,6 +115,7 @@ class RegisterView(CreateView):
         return response
 
 
+@query_budget(9)
 def login_view(request: HttpRequest) -> HttpResponse:
     if request.method == 'GET':
         if request.user.is_authenticated:
@@ -122,15 +132,18 @@ def login_view(request: HttpRequest) -> HttpResponse:
                   {"error": "Invalid login authentication"})
 
 
+@query_budget(4)
 def logout_view(request: HttpRequest):
     logout(request)
     return redirect(reverse('myauth:login'))
 
 
 class MyLogoutView(LogoutView):
+    query_budget = 4
     next_page = reverse_lazy("myauth:login")
 
 
+@query_budget(2)
 @user_passes_test(lambda u: u.is_superuser)
 def set_cookie_view(request: HttpRequest) -> HttpResponse:
     if not request.user.is_superuser:
@@ -140,18 +153,21 @@ def set_cookie_view(request: HttpRequest) -> HttpResponse:
     return response
 
 
+@query_budget(0)
 @cache_page(60 * 2)
 def get_cookie_view(request: HttpRequest) -> HttpResponse:
     value = request.COOKIES.get("fizz", "default value")
     return HttpResponse(f"Cookie value: {value!r} + {random()}")
 
 
+@query_budget(5)
 @permission_required("myauth:view_profile", raise_exception=True)
 def set_session_view(request: HttpRequest) -> HttpResponse:
     request.session["foobar"] = "spameggs"
     return HttpResponse("Session set!")
 
 
+@query_budget(2)
 @login_required
 def get_session_view(request: HttpRequest) -> HttpResponse:
     value = request.session.get("foobar", "default")
@@ -159,5 +175,7 @@ def get_session_view(request: HttpRequest) -> HttpResponse:
 
 
 class FooBarView(View):
+    query_budget = 0
+
     def get(self, request: HttpRequest) -> JsonResponse:
         return JsonResponse({"foo": "bar", "spam": "eggs"})
@@ -10,9 +10,13 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 import django.core.cache.backends.filebased
+import os
+import tempfile
+
 import sentry_sdk
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
 from django.urls import reverse_lazy
 from django.utils.translation import gettext_lazy as _
 
@@ -68,7 +72,7 @@ INSTALLED_APPS = [
     "drf_spectacular",
 
     'shopapp.apps.ShopappConfig',
-    # 'requestdataapp.apps.RequestdataappConfig',
+    'requestdataapp.apps.RequestdataappConfig',
     'myauth.apps.MyauthConfig',
     "myapiapp.apps.MyapiappConfig",
     "blogapp.apps.BlogappConfig",
@@ -76,8 +80,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # первым, чтобы длительность запроса включала остальные middleware
+    'requestdataapp.middlewares.MetricsMiddleware',
+    # после MetricsMiddleware: берёт у неё число SQL-запросов и чтения кэша
+    'requestdataapp.middlewares.AccessLogMiddleware',
     # "django.middleware.cache.UpdateCacheMiddleware",
     'django.middleware.security.SecurityMiddleware',
+    # до сессий и аутентификации: отклонённый запрос не ходит в базу
+    'requestdataapp.middlewares.RateLimitMiddleware',
+    # до сессий, чтобы их запросы входили в бюджет view
+    'requestdataapp.middlewares.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -90,8 +102,6 @@ MIDDLEWARE = [
     # "django.middleware.cache.FetchFromCacheMiddleware",
 
     # 'requestdataapp.middlewares.set_useragent_on_request_middleware',
-    # 'requestdataapp.middlewares.CountRequestMiddleware',
-    # 'requestdataapp.middlewares.throttling_middleware',
 ]
 
 ROOT_URLCONF = 'mysite.urls'
@@ -128,16 +138,68 @@ CACHES = {
     "default": {
         # пустышка:
         # "BACKEND": "django.core.cache.dummy.DummyCache",
-        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        # FileBasedCache, который считает попадания и промахи для /metrics
+        "BACKEND": "requestdataapp.cache.FileBasedCache",
         # Linux:
         # "LOCARION": "/var/tmp/django_cache",
         # Windows:
         "LOCATION": "c:/foo/bar",
-    }
+    },
 }
+# общий для всех воркеров кэш с атомарным incr: счётчики ограничения частоты и журнал
+# подсказок товаров. FileBasedCache не подходит: его incr — это get и set, и параллельные
+# запросы теряют обновления. Кэш — redis по адресу из REDIS_URL; только с DEBUG можно без него,
+# тогда это LocMemCache, общий лишь внутри процесса: лимиты и журнал действуют в каждом
+# процессе отдельно, что годится для runserver и тестов, но не для нескольких воркеров
+if os.environ.get("REDIS_URL"):
+    CACHES["shared"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ["REDIS_URL"],
+    }
+elif not DEBUG:
+    raise ImproperlyConfigured("REDIS_URL must be set when DEBUG is off: rate limits need a cache shared by all workers")
+else:
+    CACHES["shared"] = {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "shared",
+        # по два счётчика на клиента: без вытеснения до ~200 тысяч IP в окне
+        "OPTIONS": {"MAX_ENTRIES": 500_000},
+    }
 
 CACHE_MIDDLEWARE_SECONDS = 200
 
+# метрики для Prometheus (requestdataapp.metrics): каждый процесс пишет свой файл в METRICS_DIR,
+# /metrics складывает их; каталог общий для всех воркеров и очищается при деплое
+METRICS_DIR = os.environ.get("METRICS_DIR", Path(tempfile.gettempdir()) / "mysite_metrics")
+METRICS_FLUSH_INTERVAL = 1
+# с каких адресов (REMOTE_ADDR, адреса или сети) отдавать /metrics. За прокси REMOTE_ADDR —
+# адрес самого прокси, поэтому снаружи /metrics должен закрывать прокси
+METRICS_ALLOWED_IPS = [
+    network.strip() for network in os.environ.get("METRICS_ALLOWED_IPS", "127.0.0.1,::1").split(",")
+]
+
+# бюджеты SQL-запросов view (requestdataapp.querybudget): какая доля запросов проверяется,
+# бросать ли исключение при превышении (в тестах включает TEST_RUNNER) и сколько
+# одинаковых запросов за запрос считать подозрением на N+1
+QUERY_BUDGET_SAMPLE_RATE = 0.05
+QUERY_BUDGET_STRICT = False
+QUERY_BUDGET_REPEATS = 5
+TEST_RUNNER = "requestdataapp.testrunner.QueryBudgetTestRunner"
+
+# ограничение частоты запросов (requestdataapp.middlewares.RateLimitMiddleware):
+# счётчики в этом кэше, он должен быть общим для воркеров и с атомарным incr
+RATE_LIMIT_CACHE = "shared"
+RATE_LIMIT_TRUST_X_FORWARDED_FOR = False
+# первое правило, чей path (регулярное выражение) подходит к пути, limit запросов за window секунд
+RATE_LIMITS = [
+    {"name": "suggest", "path": r"^(/[\w-]+)?/shop/products/suggest/", "limit": 1200, "window": 60},
+    {"name": "api", "path": r"^(/[\w-]+)?/(shop/)?api/", "limit": 300, "window": 60},
+    {"name": "default", "path": r"", "limit": 600, "window": 60},
+]
+
+# журнал изменений названий товаров для подсказок (shopapp.autocomplete), нужен атомарный incr
+PRODUCT_SUGGEST_CACHE = "shared"
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -215,6 +277,15 @@ LOGFILE_NAME = BASE_DIR / "log.txt"
 # LOGFILE_SIZE = 400
 LOGFILE_SIZE = 1 * 1024 * 1024
 LOGFILE_COUNT = 3
+# длина очереди логов (requestdataapp.log_handlers); при переполнении записи ниже WARNING отбрасываются
+# и считаются в django_log_records_dropped_total в /metrics
+LOG_QUEUE_SIZE = 10_000
+
+# журнал запросов (requestdataapp.middlewares.AccessLogMiddleware), строка JSON на запрос;
+# разбирается командой analyze_access_log
+ACCESS_LOGFILE_NAME = BASE_DIR / "access.jsonl"
+ACCESS_LOGFILE_SIZE = 10 * 1024 * 1024
+ACCESS_LOGFILE_COUNT = 5
 
 LOGGING = {
     "version": 1,
@@ -223,26 +294,57 @@ LOGGING = {
         "verbose": {
             "format": "%(asctime)s [%(levelname)s] %(name)s: %(message)s",
         },
+        "json": {
+            "()": "requestdataapp.log_handlers.JsonFormatter",
+        },
     },
     "handlers": {
-        "console": {
-            "class": "logging.StreamHandler",
+        "queue": {
+            # консоль и файл пишет фоновый поток, ротация файла не задерживает запросы
+            "()": "requestdataapp.log_handlers.QueueListenerHandler",
+            "handlers": [
+                {
+                    "class": "logging.StreamHandler",
+                },
+                {
+                    # для ротации по дням:
+                    # "class": "logging.handlers.TimedRotatingFileHandler",
+                    "class": "logging.handlers.RotatingFileHandler",
+                    "filename": LOGFILE_NAME,
+                    "maxBytes": LOGFILE_SIZE,
+                    "backupCount": LOGFILE_COUNT,
+                },
+            ],
+            "maxsize": LOG_QUEUE_SIZE,
             "formatter": "verbose",
         },
-        "logfile": {
-            # для ротации по дням:
-            # "class": "logging.handlers.TimedRotatingFileHandler",
-            "class": "logging.handlers.RotatingFileHandler",
-            "filename": LOGFILE_NAME,
-            "maxBytes": LOGFILE_SIZE,
-            "backupCount": LOGFILE_COUNT,
-            "formatter": "verbose",
+        "access": {
+            # файл пишет фоновый поток, запрос только кладёт запись в очередь
+            "()": "requestdataapp.log_handlers.QueueListenerHandler",
+            "handlers": [
+                {
+                    "class": "logging.handlers.RotatingFileHandler",
+                    "filename": ACCESS_LOGFILE_NAME,
+                    "maxBytes": ACCESS_LOGFILE_SIZE,
+                    "backupCount": ACCESS_LOGFILE_COUNT,
+                    # файл открывается при первой записи; в тестах он во временном каталоге (TEST_RUNNER)
+                    "delay": True,
+                },
+            ],
+            "maxsize": LOG_QUEUE_SIZE,
+            "formatter": "json",
+        },
+    },
+    "loggers": {
+        "access": {
+            "handlers": ["access"],
+            "level": "INFO",
+            "propagate": False,
         },
     },
     "root": {
         "handlers": [
-            "console",
-            "logfile",
+            "queue",
         ],
         "level": "INFO",
     },
@@ -6,6 +6,7 @@ from django.urls import path, include
 from django.contrib.sitemaps.views import sitemap
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView, SpectacularRedocView
 
+from requestdataapp.views import metrics_view
 from .sitemaps import sitemaps
 
 urlpatterns = [
@@ -18,6 +19,7 @@ urlpatterns = [
     path("api/schema/swagger/", SpectacularSwaggerView.as_view(url_name="schema"), name="swagger"),
     path("api/schema/redoc/", SpectacularRedocView.as_view(url_name="schema"), name="dedoc"),
     path("api/", include("myapiapp.urls")),
+    path("metrics", metrics_view, name="metrics"),
 ]
 
 urlpatterns += i18n_patterns(
@@ -0,0 +1,40 @@
+"""
+Бэкенды кэша, которые считают попадания и промахи для метрик запроса
+(requestdataapp.metrics). Подключаются в settings.CACHES вместо стандартных.
+"""
+from contextvars import ContextVar
+
+from django.core.cache.backends import filebased, locmem
+
+from requestdataapp.metrics import record_cache_reads
+
+_missing = object()
+# стандартный get_many() вызывает get() для каждого ключа, такие чтения не считаем дважды
+_in_get_many: ContextVar[bool] = ContextVar("in_get_many", default=False)
+
+
+class CacheMetricsMixin:
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _missing, version)
+        if not _in_get_many.get():
+            hit = value is not _missing
+            record_cache_reads(hits=int(hit), misses=int(not hit))
+        return default if value is _missing else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        token = _in_get_many.set(True)
+        try:
+            values = super().get_many(keys, version)
+        finally:
+            _in_get_many.reset(token)
+        record_cache_reads(hits=len(values), misses=len(keys) - len(values))
+        return values
+
+
+class FileBasedCache(CacheMetricsMixin, filebased.FileBasedCache):
+    pass
+
+
+class LocMemCache(CacheMetricsMixin, locmem.LocMemCache):
+    pass
@@ -3,3 +3,6 @@ class AdminException(Exception):
     def __init__(self, text):
         self.txt = text
 
+
+class QueryBudgetExceeded(AssertionError):
+    """View сделала больше SQL-запросов, чем объявлено в её бюджете."""
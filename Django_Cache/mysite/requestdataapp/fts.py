@@ -0,0 +1,241 @@
+"""
+Полнотекстовый поиск по FTS5-индексам SQLite, общий для магазина и блогов.
+
+Индекс — виртуальная таблица с внешним содержимым из таблицы модели, её создаёт
+и синхронизирует триггерами операция миграции CreateFullTextIndex. Неуправляемая
+модель индекса связана с моделью OneToOne-полем по rowid с related_name="search",
+а поле FullTextField — скрытый столбец с именем самой таблицы:
+
+    class ArticleSearch(models.Model):
+        article = models.OneToOneField(
+            Article, on_delete=models.DO_NOTHING, primary_key=True,
+            db_column="rowid", db_constraint=False, related_name="search",
+        )
+        document = FullTextField(db_column="blogapp_article_fts")
+        rank = models.FloatField()
+
+На других БД индекса нет, и поиск остаётся обычным LIKE по полям.
+"""
+import re
+from functools import reduce
+from operator import or_
+from typing import Optional, Sequence
+
+from django.db import connections, models, router
+from django.db.migrations.operations.base import Operation
+from django.db.models import F, Func, Lookup, Q, QuerySet, TextField, Value
+from django.utils.html import escape
+from django.utils.safestring import SafeString, mark_safe
+
+# границы совпадений в сниппете: управляющие символы не встречаются в тексте,
+# поэтому сниппет можно экранировать целиком и потом заменить их на <mark>
+SNIPPET_START = "\x02"
+SNIPPET_END = "\x03"
+
+
+class FullTextField(models.TextField):
+    """
+    Скрытый столбец FTS5 с именем самой таблицы: ``field__match=query`` по нему
+    ищет сразу по всем проиндексированным столбцам.
+    """
+
+
+@FullTextField.register_lookup
+class Match(Lookup):
+    lookup_name = "match"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} MATCH {rhs}", [*lhs_params, *rhs_params]
+
+
+def fts_query(term: str) -> str:
+    """
+    Запрос FTS5 из строки поиска: каждое слово ищется по префиксу, все слова обязательны.
+    Слова берутся в кавычки, поэтому операторы FTS5 из ввода пользователя не работают.
+    """
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", term))
+
+
+def fts_available(using: str) -> bool:
+    return connections[using].vendor == "sqlite"
+
+
+def fts_search(queryset: QuerySet, term: str) -> QuerySet:
+    """
+    Объекты queryset, подходящие под строку поиска, с релевантностью search_rank
+    (bm25, чем меньше, тем лучше).
+    """
+    query = fts_query(term)
+    if not query:
+        return queryset
+    # без статистики (ANALYZE) SQLite может начать соединение с таблицей модели и делать
+    # MATCH для каждой строки; подзапрос IN по индексу такого плана не допускает
+    search_field = queryset.model._meta.get_field("search")
+    matches = search_field.related_model.objects.filter(document__match=query).values(
+        search_field.remote_field.attname,
+    )
+    return (
+        queryset
+        .filter(pk__in=matches, search__document__match=query)
+        .annotate(search_rank=F("search__rank"))
+    )
+
+
+class Snippet(Func):
+    """
+    Фрагмент столбца column (номер в FTS-таблице) вокруг совпадений, считается в БД
+    функцией snippet() из того же запроса с MATCH. Совпадения обрамлены SNIPPET_START/SNIPPET_END.
+    """
+    function = "snippet"
+    output_field = TextField()
+
+    def __init__(self, column: int, tokens: int = 16, document: str = "search__document"):
+        super().__init__(
+            F(document),
+            Value(column),
+            Value(SNIPPET_START),
+            Value(SNIPPET_END),
+            Value("…"),
+            Value(tokens),
+        )
+
+
+def render_snippet(snippet: Optional[str]) -> SafeString:
+    return mark_safe(
+        escape(snippet or "")
+        .replace(SNIPPET_START, "<mark>")
+        .replace(SNIPPET_END, "</mark>")
+    )
+
+
+class FullTextSearchMixin:
+    """
+    Поиск для ListView: ``?q=`` по FTS5-индексу модели, по релевантности.
+    У найденных объектов есть snippet_html — фрагмент столбца snippet_column вокруг
+    совпадений, посчитанный в БД, так что полный текст загружать не нужно.
+    Без индекса ищет LIKE по search_fields, без сниппетов.
+    """
+    search_fields = ()
+    snippet_column = 1
+    search_param = "q"
+
+    def get_queryset(self):
+        self.search_term = self.request.GET.get(self.search_param, "").strip()
+        queryset = super().get_queryset()
+        if not fts_query(self.search_term):
+            return queryset.none()
+        if not fts_available(queryset.db):
+            condition = reduce(or_, (
+                Q(**{f"{field}__icontains": self.search_term})
+                for field in self.search_fields
+            ))
+            return queryset.filter(condition).annotate(search_snippet=Value(None, output_field=TextField()))
+        return (
+            fts_search(queryset, self.search_term)
+            .annotate(search_snippet=Snippet(self.snippet_column))
+            .order_by("search_rank", "pk")
+        )
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["search_term"] = self.search_term
+        for obj in context["object_list"]:
+            obj.snippet_html = render_snippet(obj.search_snippet)
+        return context
+
+
+def create_fts_sql(table: str, content_table: str, columns: Sequence[str]) -> list[str]:
+    """
+    Виртуальная таблица FTS5 с внешним содержимым из content_table (rowid — её id),
+    триггеры, которые держат индекс в синхронизации, и первичное заполнение индекса.
+    """
+    names = ", ".join(columns)
+    new = ", ".join(f"new.{column}" for column in columns)
+    old = ", ".join(f"old.{column}" for column in columns)
+    insert_new = f"INSERT INTO {table}(rowid, {names}) VALUES (new.id, {new});"
+    delete_old = f"INSERT INTO {table}({table}, rowid, {names}) VALUES ('delete', old.id, {old});"
+    return [
+        f"""
+        CREATE VIRTUAL TABLE {table} USING fts5(
+            {names},
+            content='{content_table}', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        """,
+        f"CREATE TRIGGER {table}_insert AFTER INSERT ON {content_table} BEGIN {insert_new} END",
+        f"CREATE TRIGGER {table}_delete AFTER DELETE ON {content_table} BEGIN {delete_old} END",
+        f"""
+        CREATE TRIGGER {table}_update AFTER UPDATE OF {names} ON {content_table} BEGIN
+            {delete_old}
+            {insert_new}
+        END
+        """,
+        f"INSERT INTO {table}({table}) VALUES ('rebuild')",
+    ]
+
+
+def drop_fts_sql(table: str) -> list[str]:
+    return [
+        f"DROP TRIGGER IF EXISTS {table}_insert",
+        f"DROP TRIGGER IF EXISTS {table}_delete",
+        f"DROP TRIGGER IF EXISTS {table}_update",
+        f"DROP TABLE IF EXISTS {table}",
+    ]
+
+
+class CreateFullTextIndex(Operation):
+    """
+    Операция миграции: индекс FTS5 по столбцам columns таблицы content_table.
+    FTS5 есть только в SQLite, на других БД операция ничего не делает.
+    Состояние моделей не меняет: модель индекса описывается отдельным CreateModel.
+    """
+    reversible = True
+
+    def __init__(self, table: str, content_table: str, columns: Sequence[str]):
+        self.table = table
+        self.content_table = content_table
+        self.columns = list(columns)
+
+    def deconstruct(self):
+        kwargs = {"table": self.table, "content_table": self.content_table, "columns": self.columns}
+        return self.__class__.__qualname__, [], kwargs
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if self.applies_to(app_label, schema_editor):
+            for sql in create_fts_sql(self.table, self.content_table, self.columns):
+                schema_editor.execute(sql)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if self.applies_to(app_label, schema_editor):
+            for sql in drop_fts_sql(self.table):
+                schema_editor.execute(sql)
+
+    @staticmethod
+    def applies_to(app_label: str, schema_editor) -> bool:
+        connection = schema_editor.connection
+        return connection.vendor == "sqlite" and router.allow_migrate(connection.alias, app_label)
+
+    def describe(self):
+        return f"Create FTS5 index {self.table} on {self.content_table}"
+
+
+class DropFullTextIndex(CreateFullTextIndex):
+    """
+    Обратная CreateFullTextIndex операция. Нужна перед AlterField и другими операциями,
+    которые на SQLite пересоздают таблицу content_table: вместе со старой таблицей
+    пропадают и триггеры индекса, поэтому индекс удаляют и после создают заново.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def describe(self):
+        return f"Drop FTS5 index {self.table} on {self.content_table}"
@@ -0,0 +1,146 @@
+"""
+Обработчики логов, которые не пишут на диск из потока запроса.
+
+QueueListenerHandler кладёт записи в очередь, а настоящие обработчики
+(файл, консоль) вызывает QueueListener в фоновом потоке, так что и ротация файла
+идёт там же. Подключается в settings.LOGGING через "()", вложенные обработчики
+описываются так же, как в "handlers":
+
+    "access": {
+        "()": "requestdataapp.log_handlers.QueueListenerHandler",
+        "handlers": [{"class": "logging.handlers.RotatingFileHandler", "filename": ...}],
+        "formatter": "json",
+    }
+
+В потоке запроса к сообщению только подставляются аргументы, форматтер обработчика
+(время, JSON, traceback) работает уже в фоновом потоке.
+
+Очередь ограничена (maxsize). Если диск не успевает и очередь заполнилась, записи
+ниже block_level отбрасываются сразу, а записи от block_level и выше ждут места
+не дольше block_timeout секунд. Отброшенные записи считаются в dropped,
+сумма по процессу уходит в /metrics (django_log_records_dropped_total).
+"""
+import atexit
+import copy
+import json
+import logging
+import os
+import weakref
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from queue import Full, Queue
+
+from django.utils.module_loading import import_string
+
+
+def build_handler(config: dict) -> logging.Handler:
+    # форматтер вложенным обработчикам задаёт setFormatter() QueueListenerHandler
+    config = dict(config)
+    handler_class = import_string(config.pop("class"))
+    level = config.pop("level", logging.NOTSET)
+    handler = handler_class(**config)
+    handler.setLevel(level)
+    return handler
+
+
+class BoundedQueueListener(QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # в полной очереди put_nowait() упал бы, а слушатель как раз освобождает место
+        self.queue.put(self._sentinel)
+
+
+_queue_handlers: "weakref.WeakSet[QueueListenerHandler]" = weakref.WeakSet()
+
+
+def dropped_records() -> int:
+    return sum(handler.dropped for handler in _queue_handlers)
+
+
+class QueueListenerHandler(QueueHandler):
+    def __init__(
+        self,
+        handlers: list[dict],
+        maxsize: int = 10_000,
+        block_level: str = "WARNING",
+        block_timeout: float = 0.1,
+    ):
+        super().__init__(Queue(maxsize))
+        self.block_level = logging.getLevelName(block_level)
+        self.block_timeout = block_timeout
+        self.dropped = 0
+        _queue_handlers.add(self)
+        self.handlers = [build_handler(config) for config in handlers]
+        self.listener = BoundedQueueListener(self.queue, *self.handlers, respect_handler_level=True)
+        self.listener.start()
+        self.listener_started = True
+        # поток слушателя не переживает fork, в дочернем процессе (воркере gunicorn) запускаем свой
+        os.register_at_fork(after_in_child=self.restart_listener)
+        atexit.register(self.stop_listener)
+
+    def setFormatter(self, fmt: logging.Formatter) -> None:
+        super().setFormatter(fmt)
+        for handler in self.handlers:
+            handler.setFormatter(fmt)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # аргументы подставляем сразу: объекты в них могут измениться, пока запись в очереди
+        record = copy.copy(record)
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+            return
+        except Full:
+            pass
+        if record.levelno >= self.block_level:
+            try:
+                self.queue.put(record, timeout=self.block_timeout)
+                return
+            except Full:
+                pass
+        # счётчик без блокировки: потеря инкремента при гонке потоков здесь допустима
+        self.dropped += 1
+
+    def restart_listener(self) -> None:
+        if self.listener_started:
+            # записи в очереди остались от родителя, он их и допишет
+            self.queue = self.listener.queue = Queue(self.queue.maxsize)
+            self.dropped = 0
+            self.listener.start()
+
+    def stop_listener(self) -> None:
+        # stop() дописывает то, что осталось в очереди
+        if self.listener_started:
+            self.listener.stop()
+            self.listener_started = False
+
+    def close(self) -> None:
+        self.stop_listener()
+        for handler in self.handlers:
+            handler.close()
+        super().close()
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Одна строка JSON на запись. Если сообщение — словарь, его поля попадают в объект
+    как есть, иначе сообщение кладётся в поле message.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+        }
+        if isinstance(record.msg, dict):
+            data.update(record.msg)
+        else:
+            data["message"] = record.getMessage()
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
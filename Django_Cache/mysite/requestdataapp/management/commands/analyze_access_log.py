@@ -0,0 +1,117 @@
+import json
+import math
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+# ширина интервала гистограммы — 1%, с такой точностью и считаются перцентили
+BUCKET_BASE = 1.01
+
+
+class RouteStats:
+    """
+    Длительности одного маршрута в логарифмической гистограмме: память не растёт
+    с числом запросов, а перцентиль получается с ошибкой не больше ширины интервала.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.buckets = Counter()
+        self.first = None
+        self.last = None
+
+    def add(self, duration_ms: float, status: int, time: datetime) -> None:
+        self.count += 1
+        if status >= 500:
+            self.errors += 1
+        self.buckets[math.ceil(math.log(max(duration_ms, 0.001), BUCKET_BASE))] += 1
+        if self.first is None or time < self.first:
+            self.first = time
+        if self.last is None or time > self.last:
+            self.last = time
+
+    def percentile(self, q: float) -> float:
+        rank = math.ceil(self.count * q)
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return BUCKET_BASE ** bucket
+        return 0.0
+
+    def throughput(self) -> float:
+        seconds = (self.last - self.first).total_seconds()
+        return self.count / seconds if seconds > 0 else float(self.count)
+
+
+class Command(BaseCommand):
+    """
+    Читает журнал запросов (AccessLogMiddleware) построчно вместе с ротированными
+    файлами и печатает по каждому маршруту число запросов, запросы в секунду,
+    долю ответов 5xx и перцентили длительности p50/p95/p99.
+    """
+    help = "Print per-endpoint latency percentiles and throughput from the access log"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "files", nargs="*",
+            help="log files (default: settings.ACCESS_LOGFILE_NAME and its rotated copies)",
+        )
+        parser.add_argument("--sort", choices=["count", "p50", "p95", "p99"], default="p99")
+        parser.add_argument("--limit", type=int, default=30)
+
+    def handle(self, *args, **options):
+        paths = [Path(name) for name in options["files"]] or self.rotated_files()
+        if not paths:
+            raise CommandError("No access log files found")
+
+        routes: dict[str, RouteStats] = {}
+        total = RouteStats()
+        skipped = 0
+        for path in paths:
+            with path.open(encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                        duration, status = entry["duration_ms"], entry["status"]
+                        time = datetime.fromisoformat(entry["time"])
+                    except (ValueError, KeyError, TypeError):
+                        skipped += 1
+                        continue
+                    route = f"{entry.get('method')} {entry.get('route') or '<unresolved>'}"
+                    if route not in routes:
+                        routes[route] = RouteStats()
+                    routes[route].add(duration, status, time)
+                    total.add(duration, status, time)
+        if not total.count:
+            raise CommandError("No access log entries found")
+
+        self.stdout.write(
+            f"{'route':<50} {'count':>8} {'req/s':>8} {'5xx':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+        )
+        key = {
+            "count": lambda item: item[1].count,
+            "p50": lambda item: item[1].percentile(0.5),
+            "p95": lambda item: item[1].percentile(0.95),
+            "p99": lambda item: item[1].percentile(0.99),
+        }[options["sort"]]
+        rows = sorted(routes.items(), key=key, reverse=True)[:options["limit"]]
+        for route, stats in [*rows, ("total", total)]:
+            self.stdout.write(
+                f"{route:<50} {stats.count:>8} {stats.throughput():>8.2f} "
+                f"{stats.errors / stats.count:>6.1%} {stats.percentile(0.5):>9.1f} "
+                f"{stats.percentile(0.95):>9.1f} {stats.percentile(0.99):>9.1f}"
+            )
+        if skipped:
+            self.stderr.write(f"{skipped} malformed lines skipped")
+
+    @staticmethod
+    def rotated_files() -> list[Path]:
+        # RotatingFileHandler: самый старый файл — .N, самый новый — без суффикса
+        base = Path(settings.ACCESS_LOGFILE_NAME)
+        paths = [base.with_name(f"{base.name}.{index}") for index in range(settings.ACCESS_LOGFILE_COUNT, 0, -1)]
+        return [path for path in [*paths, base] if path.exists()]
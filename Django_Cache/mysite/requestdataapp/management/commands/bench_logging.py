@@ -0,0 +1,89 @@
+import logging
+import os
+import tempfile
+import time
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from statistics import mean, quantiles
+
+from django.core.management import BaseCommand
+
+from requestdataapp.log_handlers import QueueListenerHandler
+
+FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+
+
+class Command(BaseCommand):
+    """
+    Замеряет, сколько стоит один вызов log.info() в вызывающем потоке (потоке запроса)
+    при прежней синхронной настройке логов (StreamHandler и RotatingFileHandler в
+    корневом логгере) и при записи через QueueListenerHandler.
+
+    Файл ротируется каждые --max-bytes байт, консоль пишется в /dev/null.
+    Между вызовами выдерживается пауза --interval (работа запроса между строками лога):
+    без неё фоновый поток не успевает за циклом и очередь отбрасывает записи.
+    Для очереди выводится и число отброшенных записей.
+    """
+    help = "Benchmark per-call logging cost on the calling thread, sync vs queued handlers"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--calls", type=int, default=100_000)
+        parser.add_argument("--max-bytes", type=int, default=1024 * 1024)
+        parser.add_argument("--queue-size", type=int, default=10_000)
+        parser.add_argument("--interval", type=float, default=0.0005, help="seconds between calls")
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory, open(os.devnull, "w") as devnull:
+            file_config = {
+                "class": "logging.handlers.RotatingFileHandler",
+                "filename": str(Path(directory) / "sync.log"),
+                "maxBytes": options["max_bytes"],
+                "backupCount": 3,
+            }
+            sync_handlers = [
+                logging.StreamHandler(devnull),
+                RotatingFileHandler(
+                    **{key: value for key, value in file_config.items() if key != "class"}
+                ),
+            ]
+            for handler in sync_handlers:
+                handler.setFormatter(logging.Formatter(FORMAT))
+            self.report("sync", self.run(sync_handlers, options["calls"], options["interval"]))
+            for handler in sync_handlers:
+                handler.close()
+
+            queue_handler = QueueListenerHandler(
+                handlers=[
+                    {"class": "logging.StreamHandler", "stream": devnull},
+                    {**file_config, "filename": str(Path(directory) / "queued.log")},
+                ],
+                maxsize=options["queue_size"],
+            )
+            queue_handler.setFormatter(logging.Formatter(FORMAT))
+            latencies = self.run([queue_handler], options["calls"], options["interval"])
+            queue_handler.close()
+            self.report("queue", latencies)
+            self.stdout.write(f"queue: {queue_handler.dropped} of {options['calls']} records dropped")
+
+    @staticmethod
+    def run(handlers: list[logging.Handler], calls: int, interval: float) -> list[float]:
+        logger = logging.getLogger("bench_logging")
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        logger.handlers = handlers
+        latencies = []
+        for number in range(calls):
+            started = time.perf_counter()
+            logger.info("Rendering shop index %s", number)
+            latencies.append(time.perf_counter() - started)
+            if interval:
+                time.sleep(interval)
+        logger.handlers = []
+        return latencies
+
+    def report(self, name: str, latencies: list[float]) -> None:
+        percentiles = quantiles(latencies, n=1000)
+        self.stdout.write(
+            f"{name}: mean {mean(latencies) * 1e6:.1f} µs, p99 {percentiles[989] * 1e6:.1f} µs, "
+            f"p99.9 {percentiles[998] * 1e6:.1f} µs, max {max(latencies) * 1e3:.2f} ms"
+        )
@@ -0,0 +1,51 @@
+import time
+from random import randrange
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+
+from requestdataapp.middlewares import RateLimitMiddleware
+
+
+class Command(BaseCommand):
+    """
+    Замеряет стоимость RateLimitMiddleware на запрос при разном числе клиентов (IP).
+
+    Сначала каждый клиент делает по запросу, чтобы счётчики всех клиентов лежали в кэше,
+    затем замеряются запросы со случайных IP. View — пустышка, в замер входит только middleware.
+    Счётчики в кэше settings.RATE_LIMIT_CACHE, как при работе сайта (с --cache — в другом
+    кэше из settings.CACHES); перед каждым замером кэш очищается.
+    """
+    help = "Benchmark per-request cost of the rate limiter for many distinct clients"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+        parser.add_argument("--requests", type=int, default=50_000)
+        parser.add_argument("--cache", help="cache alias from settings.CACHES (default: settings.RATE_LIMIT_CACHE)")
+
+    def handle(self, *args, **options):
+        alias = options["cache"] or settings.RATE_LIMIT_CACHE
+        self.stdout.write(f"cache {alias!r}: {settings.CACHES[alias]['BACKEND']}")
+        for clients in options["clients"]:
+            with override_settings(RATE_LIMIT_CACHE=alias):
+                caches[alias].clear()
+                self.stdout.write(f"{clients:,} clients: {self.run(clients, options['requests']):.1f} µs per request")
+
+    def run(self, clients: int, requests: int) -> float:
+        middleware = RateLimitMiddleware(lambda request: HttpResponse())
+        factory = RequestFactory()
+
+        def make_request(client: int):
+            return factory.get("/shop/products/", REMOTE_ADDR=f"10.{client >> 16 & 255}.{client >> 8 & 255}.{client & 255}")
+
+        for client in range(clients):
+            middleware(make_request(client))
+
+        batch = [make_request(randrange(clients)) for _ in range(requests)]
+        started = time.perf_counter()
+        for request in batch:
+            middleware(request)
+        return (time.perf_counter() - started) / requests * 1_000_000
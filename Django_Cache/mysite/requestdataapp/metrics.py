@@ -0,0 +1,185 @@
+"""
+Метрики запросов в текстовом формате Prometheus.
+
+MetricsMiddleware (requestdataapp.middlewares) для каждого запроса записывает
+длительность (гистограмма), код ответа, число и время SQL-запросов и попадания/промахи
+кэша (requestdataapp.cache). Метки — имя view из resolver_match, а не путь,
+чтобы число рядов не росло с числом URL.
+
+Каждый процесс (воркер gunicorn) копит метрики в памяти и не чаще раза в
+METRICS_FLUSH_INTERVAL секунд сбрасывает их в свой файл <pid>.json в METRICS_DIR.
+View /metrics складывает файлы всех процессов. Файлы завершившихся процессов
+остаются, чтобы счётчики не уменьшались; при деплое каталог надо очищать.
+"""
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Optional
+
+from django.conf import settings
+
+from requestdataapp.log_handlers import dropped_records
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS = {
+    "django_http_requests_total": ("counter", "Responses by view, method and status code."),
+    "django_http_request_duration_seconds": ("histogram", "Request duration by view and method."),
+    "django_db_queries_total": ("counter", "Database queries by view."),
+    "django_db_query_duration_seconds_total": ("counter", "Time spent in database queries by view."),
+    "django_cache_requests_total": ("counter", "Cache reads by view and result (hit or miss)."),
+    "django_log_records_dropped_total": ("counter", "Log records dropped because the logging queue was full."),
+}
+
+
+class RequestStats:
+    __slots__ = ("queries", "query_seconds", "cache_hits", "cache_misses")
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+# статистика текущего запроса; своя в каждом потоке и в каждой задаче asyncio
+request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def record_cache_reads(hits: int, misses: int) -> None:
+    stats = request_stats.get()
+    if stats is not None:
+        stats.cache_hits += hits
+        stats.cache_misses += misses
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = None
+        self.reset()
+
+    def reset(self) -> None:
+        self.pid = os.getpid()
+        self.counters: dict[tuple, float] = {}
+        # по каждому ряду: число наблюдений в каждом интервале (последний — +Inf) и сумма
+        self.histograms: dict[tuple, list] = {}
+        self.flushed_at = 0.0
+
+    @property
+    def directory(self) -> Path:
+        return Path(settings.METRICS_DIR)
+
+    def check_pid(self) -> None:
+        # после fork у процесса-потомка свои метрики и свой файл
+        if self.pid != os.getpid():
+            self.reset()
+
+    def inc(self, name: str, labels: tuple, value: float = 1) -> None:
+        key = (name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, labels: tuple, value: float) -> None:
+        key = (name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = [[0] * (len(DURATION_BUCKETS) + 1), 0.0]
+        histogram[0][bisect_left(DURATION_BUCKETS, value)] += 1
+        histogram[1] += value
+
+    def record_request(self, view: str, method: str, status: int, duration: float, stats: RequestStats) -> None:
+        with self.lock:
+            self.check_pid()
+            self.inc("django_http_requests_total", (("view", view), ("method", method), ("status", str(status))))
+            self.observe("django_http_request_duration_seconds", (("view", view), ("method", method)), duration)
+            if stats.queries:
+                self.inc("django_db_queries_total", (("view", view),), stats.queries)
+                self.inc("django_db_query_duration_seconds_total", (("view", view),), stats.query_seconds)
+            if stats.cache_hits:
+                self.inc("django_cache_requests_total", (("view", view), ("result", "hit")), stats.cache_hits)
+            if stats.cache_misses:
+                self.inc("django_cache_requests_total", (("view", view), ("result", "miss")), stats.cache_misses)
+            if time.monotonic() - self.flushed_at >= settings.METRICS_FLUSH_INTERVAL:
+                self.flush()
+
+    def dump(self) -> dict:
+        # счётчик ведут сами обработчики логов, в файл процесса он попадает при сбросе
+        self.counters[("django_log_records_dropped_total", ())] = dropped_records()
+        return {
+            "counters": [[name, labels, value] for (name, labels), value in self.counters.items()],
+            "histograms": [[name, labels, *histogram] for (name, labels), histogram in self.histograms.items()],
+        }
+
+    def flush(self) -> None:
+        """
+        Записывает метрики процесса в его файл. Вызывается под self.lock.
+        Файл заменяется целиком, поэтому читатель не увидит его недописанным.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{self.pid}.json"
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self.dump()))
+        os.replace(tmp_path, path)
+        self.flushed_at = time.monotonic()
+
+    def collect(self) -> tuple[dict, dict]:
+        """
+        Складывает метрики из файлов всех процессов.
+        """
+        with self.lock:
+            self.check_pid()
+            self.flush()
+        counters: dict[tuple, float] = {}
+        histograms: dict[tuple, list] = {}
+        for path in self.directory.glob("*.json"):
+            try:
+                data = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            for name, labels, value in data["counters"]:
+                key = (name, tuple(map(tuple, labels)))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, buckets, total in data["histograms"]:
+                key = (name, tuple(map(tuple, labels)))
+                if key not in histograms:
+                    histograms[key] = [[0] * len(buckets), 0.0]
+                histogram = histograms[key]
+                histogram[0] = [a + b for a, b in zip(histogram[0], buckets)]
+                histogram[1] += total
+        return counters, histograms
+
+
+def format_labels(labels) -> str:
+    def escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels) + "}"
+
+
+def render_metrics(counters: dict, histograms: dict) -> str:
+    lines = []
+    for metric, (kind, help_text) in METRICS.items():
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for (name, labels), value in sorted(counters.items()):
+            if name == metric:
+                lines.append(f"{name}{format_labels(labels)} {value}")
+        for (name, labels), (buckets, total) in sorted(histograms.items()):
+            if name != metric:
+                continue
+            cumulative = 0
+            for bound, count in zip([*map(str, DURATION_BUCKETS), "+Inf"], buckets):
+                cumulative += count
+                lines.append(f"{name}_bucket{format_labels((*labels, ('le', bound)))} {cumulative}")
+            lines.append(f"{name}_sum{format_labels(labels)} {total}")
+            lines.append(f"{name}_count{format_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
@@ -1,10 +1,22 @@
+import logging
+import math
 import time
-from django.http import HttpRequest
-from requestdataapp.exceptions import AdminException
+from contextlib import AsyncExitStack, ExitStack
+from random import random
+from typing import Optional
 
-IP_LIST = list()
-TIME = 60
-MAX_REQ = 100
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpRequest, HttpResponse
+
+from requestdataapp.metrics import RequestStats, registry, request_stats
+from requestdataapp.querybudget import QueryRecorder, check_query_budget, get_query_budget
+from requestdataapp.ratelimit import SlidingWindowLimiter, get_client_ip, get_rules
+
+access_log = logging.getLogger("access")
 
 
 def set_useragent_on_request_middleware(get_response):
@@ -20,69 +32,289 @@ def set_useragent_on_request_middleware(get_response):
     return middleware
 
 
-class CountRequestMiddleware:
+def wrap_connections(wrapper) -> ExitStack:
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(wrapper))
+    return stack
+
+
+async def awrap_connections(wrapper) -> AsyncExitStack:
+    # соединения у каждого потока свои, а под ASGI ORM ходит в базу из потока sync_to_async
+    # (одного на запрос), поэтому обёртки ставятся и снимаются в нём же
+    wrappers = await sync_to_async(wrap_connections)(wrapper)
+    stack = AsyncExitStack()
+    stack.push_async_callback(sync_to_async(wrappers.close))
+    return stack
+
+
+class SyncAsyncMiddleware:
+    """
+    Основа middleware, которые работают и под WSGI, и под ASGI. Под ASGI get_response —
+    корутина, и запрос идёт через __acall__ без перехода в поток на каждой middleware.
+    """
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
-        self.responses_count = 0
-        self.requests_count = 0
-        self.exceptions_count = 0
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+
+class RateLimitMiddleware(SyncAsyncMiddleware):
+    """
+    Ограничивает частоту запросов с одного IP по правилам settings.RATE_LIMITS
+    (применяется первое правило, чей path подходит к пути запроса).
+    При превышении отвечает 429 с заголовком Retry-After.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.rules = get_rules()
+        if not self.rules:
+            # без правил (например, в тестах) middleware не нужен и кэш счётчиков тоже
+            raise MiddlewareNotUsed
+        self.limiter = SlidingWindowLimiter()
 
     def __call__(self, request: HttpRequest):
-        self.requests_count += 1
-        # print(f'requests count = {self.requests_count}')
-        response = self.get_response(request)
-        self.responses_count += 1
-        # print(f'responses_count = {self.responses_count}')
-        return response
+        if self.async_mode:
+            return self.__acall__(request)
+        rule = self.get_rule(request)
+        if rule is not None:
+            retry_after = self.limiter.hit(
+                key=f"{rule.name}:{get_client_ip(request)}",
+                limit=rule.limit,
+                window=rule.window,
+            )
+            if retry_after:
+                return self.too_many_requests(retry_after)
+        return self.get_response(request)
 
-    def process_exception(self, request: HttpRequest, exception: Exception):
-        self.exceptions_count += 1
-        print(f'exceptions count = {self.exceptions_count}')
+    async def __acall__(self, request: HttpRequest):
+        rule = self.get_rule(request)
+        if rule is not None:
+            retry_after = await sync_to_async(self.limiter.hit)(
+                key=f"{rule.name}:{get_client_ip(request)}",
+                limit=rule.limit,
+                window=rule.window,
+            )
+            if retry_after:
+                return self.too_many_requests(retry_after)
+        return await self.get_response(request)
 
+    def get_rule(self, request: HttpRequest):
+        return next((rule for rule in self.rules if rule.path.search(request.path_info)), None)
 
-def throttling_middleware(get_response):
-    def _get_ip_address(request):
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip_address = x_forwarded_for.split(',')[0]
-        else:
-            ip_address = request.META.get('REMOTE_ADDR')
-        return ip_address
+    @staticmethod
+    def too_many_requests(retry_after: float) -> HttpResponse:
+        return HttpResponse(
+            "Too Many Requests",
+            status=429,
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
 
-    def middleware(request: HttpRequest):
 
-        ip_address = _get_ip_address(request)
-        _ip = next((el for el in IP_LIST if el['ip_address'] == ip_address), False)
-        if not _ip:
-            time_now = time.time()
-            IP_LIST.append({'ip_address': ip_address, 'count': 1, 'time': time_now})
+class MetricsMiddleware(SyncAsyncMiddleware):
+    """
+    Собирает метрики запроса (см. requestdataapp.metrics). Должен стоять первым в MIDDLEWARE,
+    чтобы длительность включала остальные middleware. Потоковый ответ записывается,
+    когда отдан последний кусок: выгрузки читают базу, пока отдают ответ.
+    """
+
+    def __call__(self, request: HttpRequest):
+        if self.async_mode:
+            return self.__acall__(request)
+        stats = RequestStats()
+        started = time.perf_counter()
+        with self.collecting(stats):
+            response = self.get_response(request)
+        return self.wrap_response(request, response, stats, started)
+
+    async def __acall__(self, request: HttpRequest):
+        stats = RequestStats()
+        started = time.perf_counter()
+        async with await self.acollecting(stats):
+            response = await self.get_response(request)
+        return self.wrap_response(request, response, stats, started)
+
+    def wrap_response(self, request: HttpRequest, response, stats: RequestStats, started: float):
+        if not response.streaming:
+            self.record(request, response, stats, started)
+        elif response.is_async:
+            response.streaming_content = self.arecord_streaming(
+                response.streaming_content, request, response, stats, started,
+            )
         else:
-            time_now = time.time()
-            if time_now - _ip['time'] > TIME:
-                new_list = [el for el in IP_LIST if not el == _ip]
-                return new_list
-            else:
-                _ip['count'] += 1
-                if _ip['count'] >= MAX_REQ:
-                    raise AdminException('Too Many Requests')
-                return get_response(request)
-        return get_response(request)
-    return middleware
+            response.streaming_content = self.record_streaming(
+                response.streaming_content, request, response, stats, started,
+            )
+        return response
+
+    def collecting(self, stats: RequestStats) -> ExitStack:
+        stack = ExitStack()
+        # не reset(token): потоковый ответ может дочитываться в другом контексте
+        stack.callback(request_stats.set, request_stats.get())
+        request_stats.set(stats)
+        stack.enter_context(wrap_connections(self.count_query))
+        return stack
+
+    async def acollecting(self, stats: RequestStats) -> AsyncExitStack:
+        stack = AsyncExitStack()
+        stack.callback(request_stats.set, request_stats.get())
+        request_stats.set(stats)
+        await stack.enter_async_context(await awrap_connections(self.count_query))
+        return stack
 
+    def record_streaming(self, content, request: HttpRequest, response, stats: RequestStats, started: float):
+        try:
+            with self.collecting(stats):
+                yield from content
+        finally:
+            self.record(request, response, stats, started)
 
+    async def arecord_streaming(self, content, request: HttpRequest, response, stats: RequestStats, started: float):
+        try:
+            async with await self.acollecting(stats):
+                async for chunk in content:
+                    yield chunk
+        finally:
+            self.record(request, response, stats, started)
 
+    @staticmethod
+    def record(request: HttpRequest, response, stats: RequestStats, started: float) -> None:
+        duration = time.perf_counter() - started
+        match = request.resolver_match
+        view = match.view_name if match is not None else "<unresolved>"
+        registry.record_request(view, request.method, response.status_code, duration, stats)
 
+    @staticmethod
+    def count_query(execute, sql, params, many, context):
+        stats = request_stats.get()
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if stats is not None:
+                stats.queries += 1
+                stats.query_seconds += time.perf_counter() - started
 
 
+class QueryBudgetMiddleware(SyncAsyncMiddleware):
+    """
+    Проверяет у доли запросов (settings.QUERY_BUDGET_SAMPLE_RATE) число SQL-запросов
+    против бюджета view и ищет повторяющиеся запросы (см. requestdataapp.querybudget).
+    """
 
+    def __call__(self, request: HttpRequest):
+        if self.async_mode:
+            return self.__acall__(request)
+        if random() >= settings.QUERY_BUDGET_SAMPLE_RATE:
+            return self.get_response(request)
+        recorder = QueryRecorder()
+        with wrap_connections(recorder):
+            response = self.get_response(request)
+        return self.check(request, response, recorder)
+
+    async def __acall__(self, request: HttpRequest):
+        if random() >= settings.QUERY_BUDGET_SAMPLE_RATE:
+            return await self.get_response(request)
+        recorder = QueryRecorder()
+        async with await awrap_connections(recorder):
+            response = await self.get_response(request)
+        return self.check(request, response, recorder)
 
+    def check(self, request: HttpRequest, response, recorder: QueryRecorder):
+        match = request.resolver_match
+        if match is None:
+            return response
+        budget = get_query_budget(match.func, request.method)
+        # выгрузки читают базу, пока отдают ответ, потоковые проверяем после последнего куска
+        if not response.streaming:
+            check_query_budget(match.view_name, budget, recorder)
+        elif response.is_async:
+            response.streaming_content = self.acheck_streaming(
+                response.streaming_content, match.view_name, budget, recorder,
+            )
+        else:
+            response.streaming_content = self.check_streaming(
+                response.streaming_content, match.view_name, budget, recorder,
+            )
+        return response
 
+    @staticmethod
+    def check_streaming(content, view_name: str, budget, recorder: QueryRecorder):
+        with wrap_connections(recorder):
+            yield from content
+        check_query_budget(view_name, budget, recorder)
 
+    @staticmethod
+    async def acheck_streaming(content, view_name: str, budget, recorder: QueryRecorder):
+        async with await awrap_connections(recorder):
+            async for chunk in content:
+                yield chunk
+        check_query_budget(view_name, budget, recorder)
 
 
+class AccessLogMiddleware(SyncAsyncMiddleware):
+    """
+    Пишет в логгер access одну запись (строку JSON, см. settings.LOGGING) на запрос:
+    маршрут, код ответа, длительность, число SQL-запросов, размер ответа и чтения кэша.
+    Число запросов и чтения кэша берутся у MetricsMiddleware, поэтому эта middleware
+    должна стоять после неё. Потоковый ответ записывается, когда отдан последний кусок,
+    вместе с запросами, сделанными во время отдачи.
+    """
 
+    def __call__(self, request: HttpRequest):
+        if self.async_mode:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        return self.wrap_response(request, response, started)
 
+    async def __acall__(self, request: HttpRequest):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        return self.wrap_response(request, response, started)
 
+    def wrap_response(self, request: HttpRequest, response, started: float):
+        match = request.resolver_match
+        stats = request_stats.get()
+        entry = {
+            "method": request.method,
+            "path": request.path,
+            "route": match.view_name if match is not None else None,
+            "status": response.status_code,
+            "client": get_client_ip(request),
+        }
+        if not response.streaming:
+            self.log(entry, stats, started, len(response.content))
+        elif response.is_async:
+            response.streaming_content = self.alog_streaming(response.streaming_content, entry, stats, started)
+        else:
+            response.streaming_content = self.log_streaming(response.streaming_content, entry, stats, started)
+        return response
 
+    def log_streaming(self, content, entry: dict, stats: Optional[RequestStats], started: float):
+        size = 0
+        for chunk in content:
+            size += len(chunk)
+            yield chunk
+        self.log(entry, stats, started, size)
 
+    async def alog_streaming(self, content, entry: dict, stats: Optional[RequestStats], started: float):
+        size = 0
+        async for chunk in content:
+            size += len(chunk)
+            yield chunk
+        self.log(entry, stats, started, size)
 
+    @staticmethod
+    def log(entry: dict, stats: Optional[RequestStats], started: float, size) -> None:
+        entry["queries"] = stats.queries if stats is not None else None
+        entry["cache_hits"] = stats.cache_hits if stats is not None else None
+        entry["cache_misses"] = stats.cache_misses if stats is not None else None
+        entry["duration_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        entry["bytes"] = size
+        access_log.info(entry)
@@ -0,0 +1,87 @@
+"""
+Бюджеты SQL-запросов для view и поиск N+1.
+
+View объявляет, сколько запросов ей можно сделать за запрос (включая запросы сессии
+и пользователя из middleware):
+
+- class-based view и Feed — атрибутом ``query_budget = 5``;
+- viewset — ``query_budget`` и ``query_budgets = {"list": 4, ...}`` по действиям;
+- функция или чужая view в urls.py — декоратором ``query_budget(3)``;
+- ``None`` — бюджет объявлен, но не проверяется (например, импорт пачками).
+
+QueryBudgetMiddleware проверяет долю запросов settings.QUERY_BUDGET_SAMPLE_RATE:
+при превышении бюджета пишет предупреждение в лог, а если settings.QUERY_BUDGET_STRICT
+(так в тестах, см. requestdataapp.testrunner) — бросает QueryBudgetExceeded.
+Одинаковые по форме запросы, повторённые не меньше QUERY_BUDGET_REPEATS раз,
+попадают в лог как подозрения на N+1.
+"""
+import logging
+import re
+from collections import Counter
+from typing import Callable, Optional
+
+from django.conf import settings
+
+from requestdataapp.exceptions import QueryBudgetExceeded
+
+log = logging.getLogger(__name__)
+
+# IN (%s, %s, ...) с любым числом параметров — одна и та же форма запроса
+PLACEHOLDERS_RE = re.compile(r"\(\s*%s(?:\s*,\s*%s)*\s*\)")
+
+
+def query_budget(budget: int):
+    """
+    Бюджет запросов для view-функции.
+    """
+    def decorator(func: Callable):
+        func.query_budget = budget
+        return func
+    return decorator
+
+
+def get_query_budget(view: Callable, method: str) -> Optional[int]:
+    # as_view() запоминает класс: Django — в view_class, DRF — в cls, а действия viewset в actions
+    owner = getattr(view, "view_class", None) or getattr(view, "cls", None) or view
+    actions = getattr(view, "actions", None)
+    if actions:
+        budgets = getattr(owner, "query_budgets", {})
+        action = actions.get(method.lower())
+        if action in budgets:
+            return budgets[action]
+    # декоратор может стоять и на результате as_view() чужого класса, например LoginView
+    for candidate in (view, owner):
+        if hasattr(candidate, "query_budget"):
+            return candidate.query_budget
+    return None
+
+
+def sql_shape(sql: str) -> str:
+    return PLACEHOLDERS_RE.sub("(%s)", sql)
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        self.shapes[sql_shape(sql)] += 1
+        return execute(sql, params, many, context)
+
+    @property
+    def count(self) -> int:
+        return sum(self.shapes.values())
+
+    def repeated(self, repeats: int) -> list[tuple[str, int]]:
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= repeats]
+
+
+def check_query_budget(view_name: str, budget: Optional[int], recorder: QueryRecorder) -> None:
+    for shape, count in recorder.repeated(settings.QUERY_BUDGET_REPEATS):
+        log.warning("Possible N+1 in %s: %d queries like %s", view_name, count, shape)
+    if budget is None or recorder.count <= budget:
+        return
+    message = f"{view_name} made {recorder.count} queries, budget is {budget}"
+    if settings.QUERY_BUDGET_STRICT:
+        raise QueryBudgetExceeded(message)
+    log.warning("Query budget exceeded: %s", message)
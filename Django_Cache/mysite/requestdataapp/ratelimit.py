@@ -0,0 +1,81 @@
+"""
+Ограничение частоты запросов скользящим окном.
+
+Окно приближается двумя счётчиками фиксированных окон: текущего и предыдущего,
+вклад предыдущего убывает линейно. Счётчики лежат в кэше settings.RATE_LIMIT_CACHE,
+поэтому общие для всех воркеров, если общий сам кэш (memcached, redis). Кэш должен
+поддерживать атомарный incr (memcached, redis, LocMemCache): в FileBasedCache и
+DatabaseCache incr — это get и set, параллельные запросы теряют обновления. На запрос уходит два-три обращения к кэшу,
+сколько бы ни было клиентов, а старые счётчики удаляет сам кэш по таймауту.
+"""
+import re
+import time
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpRequest
+
+
+class RateLimitRule(NamedTuple):
+    name: str
+    path: re.Pattern
+    limit: int
+    window: int
+
+
+def get_rules() -> list[RateLimitRule]:
+    return [
+        RateLimitRule(
+            name=rule["name"],
+            path=re.compile(rule["path"]),
+            limit=rule["limit"],
+            window=rule["window"],
+        )
+        for rule in getattr(settings, "RATE_LIMITS", [])
+    ]
+
+
+def get_client_ip(request: HttpRequest) -> str:
+    # X-Forwarded-For можно подделать, ему верим только за своим прокси
+    if getattr(settings, "RATE_LIMIT_TRUST_X_FORWARDED_FOR", False):
+        x_forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
+        if x_forwarded_for:
+            return x_forwarded_for.split(",")[0].strip()
+    return request.META.get("REMOTE_ADDR", "")
+
+
+class SlidingWindowLimiter:
+    key_prefix = "ratelimit"
+
+    def __init__(self, cache_alias: Optional[str] = None):
+        self.cache = caches[cache_alias or getattr(settings, "RATE_LIMIT_CACHE", "default")]
+
+    def hit(self, key: str, limit: int, window: int, now: Optional[float] = None) -> float:
+        """
+        Учитывает запрос клиента key. Возвращает 0, если лимит не превышен,
+        иначе через сколько секунд можно повторить запрос.
+        """
+        if now is None:
+            now = time.time()
+        index, elapsed = divmod(now, window)
+        current_key = f"{self.key_prefix}:{key}:{int(index)}"
+        previous_key = f"{self.key_prefix}:{key}:{int(index) - 1}"
+        try:
+            count = self.cache.incr(current_key)
+        except ValueError:
+            # счётчика ещё нет; add() не перезапишет счётчик, созданный параллельно
+            if self.cache.add(current_key, 1, window * 2):
+                count = 1
+            else:
+                count = self.cache.incr(current_key)
+        previous_count = self.cache.get(previous_key, 0)
+
+        weight = 1 - elapsed / window
+        estimate = previous_count * weight + count
+        if estimate <= limit:
+            return 0.0
+        if count <= limit:
+            # лимит освободится, когда вклад предыдущего окна уменьшится на превышение
+            return (estimate - limit) / previous_count * window
+        return window - elapsed
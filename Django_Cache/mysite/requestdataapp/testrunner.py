@@ -0,0 +1,43 @@
+import copy
+import logging.config
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class QueryBudgetTestRunner(DiscoverRunner):
+    """
+    Тестовый раннер, с которым бюджеты проверяются в каждом запросе
+    и превышение роняет тест.
+
+    Ограничение частоты запросов в тестах выключено: все тесты ходят с одного IP,
+    и общий счётчик давал бы случайные 429. Тесты ограничения задают RATE_LIMITS сами.
+
+    Журнал запросов (ACCESS_LOGFILE_NAME) тесты пишут во временный каталог.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.log_dir = tempfile.mkdtemp()
+        access_logfile = Path(self.log_dir) / "access.jsonl"
+        logging_config = copy.deepcopy(settings.LOGGING)
+        for handler in logging_config["handlers"]["access"]["handlers"]:
+            handler["filename"] = access_logfile
+        self.query_budget_settings = override_settings(
+            QUERY_BUDGET_SAMPLE_RATE=1,
+            QUERY_BUDGET_STRICT=True,
+            RATE_LIMITS=[],
+            ACCESS_LOGFILE_NAME=access_logfile,
+            LOGGING=logging_config,
+        )
+        self.query_budget_settings.enable()
+        logging.config.dictConfig(logging_config)
+
+    def teardown_test_environment(self, **kwargs):
+        self.query_budget_settings.disable()
+        shutil.rmtree(self.log_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
@@ -1,3 +1,347 @@
-from django.test import TestCase
+import json
+import logging
+import shutil
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest.mock import patch
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.http import HttpResponse, StreamingHttpResponse
+from asgiref.sync import iscoroutinefunction
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, override_settings
+from django.urls import URLPattern, URLResolver, get_resolver
+
+from requestdataapp.exceptions import QueryBudgetExceeded
+from requestdataapp.log_handlers import QueueListenerHandler
+from requestdataapp.metrics import registry
+from requestdataapp.middlewares import AccessLogMiddleware, MetricsMiddleware, QueryBudgetMiddleware, RateLimitMiddleware
+from requestdataapp.ratelimit import SlidingWindowLimiter
+
+RATE_LIMIT_CACHES = {
+    **settings.CACHES,
+    "ratelimit": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "ratelimit-tests"},
+}
+
+
+@override_settings(
+    CACHES=RATE_LIMIT_CACHES,
+    RATE_LIMIT_CACHE="ratelimit",
+    RATE_LIMITS=[
+        {"name": "api", "path": r"^(/[\w-]+)?/(shop/)?api/", "limit": 3, "window": 60},
+        {"name": "default", "path": r"", "limit": 5, "window": 60},
+    ],
+)
+class RateLimitMiddlewareTestCase(TestCase):
+    def setUp(self) -> None:
+        caches["ratelimit"].clear()
+
+    def test_too_many_requests(self):
+        for _ in range(3):
+            response = self.client.get("/shop/api/")
+            self.assertNotEqual(response.status_code, 429)
+        response = self.client.get("/shop/api/")
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(1 <= int(response["Retry-After"]) <= 60)
+
+    def test_limits_per_route_and_client(self):
+        for _ in range(4):
+            self.client.get("/shop/api/")
+        # у другого маршрута свой счётчик и свой лимит
+        response = self.client.get("/shop/", follow=True)
+        self.assertEqual(response.status_code, 200)
+        # и у другого клиента тоже
+        response = self.client.get("/shop/api/", REMOTE_ADDR="10.0.0.2")
+        self.assertNotEqual(response.status_code, 429)
+
+    async def test_too_many_requests_async(self):
+        async def view(request):
+            return HttpResponse()
+
+        middleware = RateLimitMiddleware(view)
+        request = AsyncRequestFactory().get("/shop/api/")
+        statuses = [(await middleware(request)).status_code for _ in range(4)]
+        self.assertEqual(statuses, [200, 200, 200, 429])
+
+
+@override_settings(CACHES=RATE_LIMIT_CACHES)
+class SlidingWindowLimiterTestCase(TestCase):
+    def setUp(self) -> None:
+        caches["ratelimit"].clear()
+        self.limiter = SlidingWindowLimiter("ratelimit")
+
+    def test_previous_window_weight(self):
+        for _ in range(10):
+            self.assertEqual(self.limiter.hit("client", limit=10, window=60, now=30), 0)
+        self.assertEqual(self.limiter.hit("client", limit=10, window=60, now=59), 1)
+        # в середине следующего окна от предыдущего остаётся половина: 11 * 0.5 + 5 > 10
+        for _ in range(4):
+            self.assertEqual(self.limiter.hit("client", limit=10, window=60, now=90), 0)
+        retry_after = self.limiter.hit("client", limit=10, window=60, now=90)
+        self.assertAlmostEqual(retry_after, 0.5 / 11 * 60)
+        # к концу окна вклад предыдущего почти исчез
+        self.assertEqual(self.limiter.hit("client", limit=10, window=60, now=119), 0)
+
+
+class MetricsTestCase(TestCase):
+    def setUp(self) -> None:
+        self.metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.metrics_dir)
+        settings_override = override_settings(
+            METRICS_DIR=self.metrics_dir,
+            CACHES={"default": {"BACKEND": "requestdataapp.cache.LocMemCache", "LOCATION": "metrics-tests"}},
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        caches["default"].clear()
+        registry.reset()
+        self.addCleanup(registry.reset)
+
+    def get_metrics(self) -> str:
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        return response.content.decode()
+
+    def test_request_metrics(self):
+        self.client.get("/shop/api/products/")
+        self.client.get("/shop/api/products/")
+        self.client.get("/shop/api/no-such-page/")
+        metrics = self.get_metrics()
+        self.assertIn(
+            'django_http_requests_total{view="shopapp:product-list",method="GET",status="200"} 2\n',
+            metrics,
+        )
+        self.assertIn(
+            'django_http_requests_total{view="<unresolved>",method="GET",status="404"} 1\n',
+            metrics,
+        )
+        self.assertIn(
+            'django_http_request_duration_seconds_bucket{view="shopapp:product-list",method="GET",le="+Inf"} 2\n',
+            metrics,
+        )
+        self.assertIn('django_db_queries_total{view="shopapp:product-list"}', metrics)
+        # ProductViewSet.list кэширует ответ: первый запрос промахивается, второй попадает
+        self.assertIn('django_cache_requests_total{view="shopapp:product-list",result="hit"}', metrics)
+        self.assertIn('django_cache_requests_total{view="shopapp:product-list",result="miss"}', metrics)
+        self.assertIn("django_log_records_dropped_total ", metrics)
+
+    def test_metrics_from_other_processes(self):
+        self.client.get("/shop/api/products/")
+        labels = [["view", "shopapp:product-list"], ["method", "GET"], ["status", "200"]]
+        Path(self.metrics_dir, "1.json").write_text(json.dumps({
+            "counters": [["django_http_requests_total", labels, 5]],
+            "histograms": [],
+        }))
+        metrics = self.get_metrics()
+        self.assertIn(
+            'django_http_requests_total{view="shopapp:product-list",method="GET",status="200"} 6\n',
+            metrics,
+        )
+
+    def test_streaming_response_recorded_after_last_chunk(self):
+        User.objects.create(username="streamed")
+
+        def view(request):
+            def rows():
+                yield "header\n"
+                for username in User.objects.values_list("username", flat=True):
+                    yield username + "\n"
+            return StreamingHttpResponse(rows())
+
+        request = RequestFactory().get("/")
+        request.resolver_match = type("Match", (), {"view_name": "streaming"})()
+        response = MetricsMiddleware(view)(request)
+        labels = (("view", "streaming"), ("method", "GET"), ("status", "200"))
+        self.assertNotIn(("django_http_requests_total", labels), registry.counters)
+        self.assertEqual(b"".join(response.streaming_content), b"header\nstreamed\n")
+        self.assertEqual(registry.counters[("django_http_requests_total", labels)], 1)
+        # запрос сделан, пока отдавался ответ
+        self.assertEqual(registry.counters[("django_db_queries_total", (("view", "streaming"),))], 1)
+
+    def test_metrics_forbidden_for_other_addresses(self):
+        response = self.client.get("/metrics", REMOTE_ADDR="203.0.113.5")
+        self.assertEqual(response.status_code, 403)
+        with override_settings(METRICS_ALLOWED_IPS=["203.0.113.0/24"]):
+            response = self.client.get("/metrics", REMOTE_ADDR="203.0.113.5")
+        self.assertEqual(response.status_code, 200)
+
+
+class QueryBudgetTestCase(TestCase):
+    budgeted_urlconfs = {"shopapp.urls", "myauth.urls", "blogapp.urls", "blogapp_new.urls"}
+
+    def iter_views(self, patterns, urlconf=None):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                # include() подставляет модуль urls, а роутер DRF и i18n_patterns — список
+                name = getattr(pattern.urlconf_name, "__name__", urlconf)
+                yield from self.iter_views(pattern.url_patterns, name)
+            elif isinstance(pattern, URLPattern):
+                yield urlconf, pattern
+
+    def test_views_declare_budgets(self):
+        views = [
+            (urlconf, pattern)
+            for urlconf, pattern in self.iter_views(get_resolver().url_patterns)
+            if urlconf in self.budgeted_urlconfs
+        ]
+        self.assertGreater(len(views), 50)
+        for urlconf, pattern in views:
+            view = pattern.callback
+            owner = getattr(view, "view_class", None) or getattr(view, "cls", None) or view
+            with self.subTest(urlconf=urlconf, name=pattern.name):
+                self.assertTrue(hasattr(view, "query_budget") or hasattr(owner, "query_budget"))
+
+    def test_shopapp_admin_views_declare_budgets(self):
+        # свои страницы ModelAdmin, кроме стандартных страниц админки
+        model_admins = [
+            model_admin for model, model_admin in admin.site._registry.items()
+            if model._meta.app_label == "shopapp"
+        ]
+        views = [
+            pattern
+            for model_admin in model_admins
+            for pattern in model_admin.get_urls()
+            if pattern.name not in {default.name for default in admin.ModelAdmin.get_urls(model_admin)}
+        ]
+        self.assertGreaterEqual(len(views), 4)
+        for pattern in views:
+            with self.subTest(name=pattern.name):
+                self.assertTrue(hasattr(pattern.callback, "query_budget"))
+
+    def test_budget_exceeded_in_tests(self):
+        # тесты запускаются с QUERY_BUDGET_STRICT
+        from shopapp.views import ProductListView
+
+        with patch.object(ProductListView, "query_budget", 0):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get("/shop/products/")
+
+    @override_settings(QUERY_BUDGET_STRICT=False)
+    def test_budget_exceeded_logged(self):
+        from shopapp.views import ProductListView
+
+        with patch.object(ProductListView, "query_budget", 0):
+            with self.assertLogs("requestdataapp.querybudget", "WARNING") as logs:
+                response = self.client.get("/shop/products/")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("shopapp:products_list made 1 queries, budget is 0", logs.output[0])
+
+    def test_repeated_queries_logged(self):
+        users = [User.objects.create(username=f"user{index}") for index in range(5)]
+
+        def view(request):
+            for user in users:
+                User.objects.filter(pk=user.pk).exists()
+            return HttpResponse()
+
+        request = RequestFactory().get("/")
+        request.resolver_match = type("Match", (), {"func": view, "view_name": "n-plus-one"})()
+        with self.assertLogs("requestdataapp.querybudget", "WARNING") as logs:
+            QueryBudgetMiddleware(view)(request)
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("Possible N+1 in n-plus-one: 5 queries like SELECT", logs.output[0])
+
+
+class AccessLogTestCase(TestCase):
+    def test_entry_per_request(self):
+        with self.assertLogs("access", "INFO") as logs:
+            response = self.client.get("/shop/api/orders/")
+        self.assertEqual(len(logs.records), 1)
+        entry = logs.records[0].msg
+        self.assertEqual(entry["route"], "shopapp:order-list")
+        self.assertEqual(entry["status"], 200)
+        self.assertEqual(entry["bytes"], len(response.content))
+        self.assertGreaterEqual(entry["queries"], 1)
+        self.assertGreater(entry["duration_ms"], 0)
+
+    def test_streaming_entry_counts_queries_made_while_streaming(self):
+        def view(request):
+            def rows():
+                yield "header\n"
+                yield f"{User.objects.count()}\n"
+            return StreamingHttpResponse(rows())
+
+        request = RequestFactory().get("/")
+        request.resolver_match = type("Match", (), {"view_name": "streaming"})()
+        response = MetricsMiddleware(AccessLogMiddleware(view))(request)
+        with self.assertLogs("access", "INFO") as logs:
+            content = b"".join(response.streaming_content)
+        entry = logs.records[0].msg
+        self.assertEqual(entry["bytes"], len(content))
+        self.assertEqual(entry["queries"], 1)
+
+    async def test_async_streaming_entry(self):
+        async def view(request):
+            async def rows():
+                yield "header\n"
+                yield f"{await User.objects.acount()}\n"
+            return StreamingHttpResponse(rows())
+
+        request = AsyncRequestFactory().get("/")
+        request.resolver_match = type("Match", (), {"view_name": "async-streaming"})()
+        middleware = MetricsMiddleware(AccessLogMiddleware(view))
+        # под ASGI цепочка остаётся асинхронной, без sync_to_async на каждой middleware
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = await middleware(request)
+        with self.assertLogs("access", "INFO") as logs:
+            content = b"".join([chunk async for chunk in response.streaming_content])
+        entry = logs.records[0].msg
+        self.assertEqual(entry["bytes"], len(content))
+        self.assertEqual(entry["queries"], 1)
+
+    def test_log_file_in_temp_dir(self):
+        # TEST_RUNNER не даёт тестам писать журнал в BASE_DIR
+        self.assertNotEqual(Path(settings.ACCESS_LOGFILE_NAME).parent, Path(settings.BASE_DIR))
+
+    def test_analyze_access_log(self):
+        log_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, log_dir)
+        lines = [
+            {"time": f"2026-10-01T12:{second // 60:02d}:{second % 60:02d}+00:00", "method": "GET",
+             "route": "shopapp:product-list", "status": 200, "duration_ms": duration}
+            for second, duration in enumerate(range(1, 101))
+        ]
+        (log_dir / "access.jsonl.1").write_text("".join(json.dumps(line) + "\n" for line in lines[:50]))
+        (log_dir / "access.jsonl").write_text("".join(json.dumps(line) + "\n" for line in lines[50:]))
+        out = StringIO()
+        with override_settings(ACCESS_LOGFILE_NAME=log_dir / "access.jsonl"):
+            call_command("analyze_access_log", stdout=out)
+        row = next(line for line in out.getvalue().splitlines() if line.startswith("GET shopapp:product-list"))
+        count, throughput, errors, p50, p95, p99 = row.split()[2:]
+        self.assertEqual(count, "100")
+        self.assertAlmostEqual(float(throughput), 100 / 99, places=2)
+        self.assertAlmostEqual(float(p50), 50, delta=0.5)
+        self.assertAlmostEqual(float(p95), 95, delta=1)
+        self.assertAlmostEqual(float(p99), 99, delta=1)
+
+
+class QueueListenerHandlerTestCase(TestCase):
+    def setUp(self) -> None:
+        # слушатель остановлен, поэтому очередь на одну запись сразу заполняется
+        self.handler = QueueListenerHandler(handlers=[], maxsize=1, block_timeout=0.01)
+        self.handler.stop_listener()
+        self.addCleanup(self.handler.close)
+        self.logger = logging.getLogger("tests.queue")
+        self.logger.propagate = False
+        self.logger.addHandler(self.handler)
+        self.addCleanup(self.logger.removeHandler, self.handler)
+
+    def test_full_queue_drops_records(self):
+        self.logger.warning("first")
+        self.logger.warning("waits for block_timeout and is dropped")
+        self.logger.info("dropped at once")
+        self.assertEqual(self.handler.dropped, 2)
+        self.assertEqual(self.handler.queue.get_nowait().msg, "first")
+
+    def test_args_rendered_on_enqueue(self):
+        items = ["a"]
+        self.logger.warning("items: %s", items)
+        items.append("b")
+        record = self.handler.queue.get_nowait()
+        self.assertEqual(record.msg, "items: ['a']")
+        self.assertIsNone(record.args)
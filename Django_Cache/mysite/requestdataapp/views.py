@@ -1,10 +1,13 @@
 import os
+from ipaddress import ip_address, ip_network
 
+from django.conf import settings
 from django.core.files.storage import FileSystemStorage
 from django.shortcuts import render
 from django.http import HttpResponse, HttpRequest
 
 from requestdataapp.exceptions import AdminException
+from requestdataapp.metrics import registry, render_metrics
 from .forms import UserBioForm, UploadFileForm
 
 
@@ -54,13 +57,20 @@ def handle_file_upload(request: HttpRequest) -> HttpResponse:
     return render(request, "requestdataapp/file-upload.html", context=context)
 
 
+def metrics_allowed(request: HttpRequest) -> bool:
+    # только REMOTE_ADDR: X-Forwarded-For подделывается клиентом
+    try:
+        address = ip_address(request.META.get("REMOTE_ADDR", ""))
+    except ValueError:
+        return False
+    return any(address in ip_network(network) for network in settings.METRICS_ALLOWED_IPS)
 
 
-
-
-
-
-
-
-
-
+def metrics_view(request: HttpRequest) -> HttpResponse:
+    # метрики всех процессов в текстовом формате Prometheus
+    if not metrics_allowed(request):
+        return HttpResponse("Forbidden", status=403)
+    return HttpResponse(
+        render_metrics(*registry.collect()),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
@@ -1,44 +1,72 @@
+import json
+
 from django.contrib import admin
-from django.http import HttpRequest, HttpResponse
+from django.contrib.admin.views.main import ChangeList
+from django.contrib.admin.widgets import ForeignKeyRawIdWidget
+from django.core.paginator import Paginator
+from django.core.exceptions import PermissionDenied
+from django.http import HttpRequest, HttpResponse, JsonResponse
+from django.db import transaction
 from django.db.models import QuerySet
-from django.shortcuts import render, redirect
-from django.urls import path
-
-from .models import Product, Order, ProductImage
-from .admin_mixins import ExportAsCSVMixin
-from .forms import CSVImportForm
-from .common import save_scv_products
+from django.db.models.functions import Length, Substr
+from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import path, reverse
 
+from requestdataapp.querybudget import query_budget
 
-class OrderInline(admin.TabularInline):
-    model = Product.orders.through
+from .models import Product, Order, ProductImage, Job
+from .admin_mixins import ExportAsCSVMixin, EstimatedCountMixin, ProductFullTextSearchMixin
+from .forms import CSVImportForm, ProductOrdersForm
+from .common import invalidate_products_cache, prefix_filter, update_in_chunks
+from .jobs import enqueue_job
 
 
 class ProductInline(admin.StackedInline):
     model = ProductImage
 
 
+def set_archived(modeladmin: admin.ModelAdmin, request: HttpRequest, queryset: QuerySet, archived: bool):
+    # строки, где значение уже такое, не трогаем, чтобы счётчик показывал реальные изменения
+    updated = update_in_chunks(queryset.exclude(archived=archived), archived=archived)
+    if updated:
+        transaction.on_commit(invalidate_products_cache)
+    modeladmin.message_user(
+        request,
+        f"{updated} products {'archived' if archived else 'unarchived'}",
+    )
+
+
 @admin.action(description="Archive products")
 def mark_archived(modeladmin: admin.ModelAdmin, request: HttpRequest, queryset: QuerySet):
-    queryset.update(archived=True)
+    set_archived(modeladmin, request, queryset, archived=True)
 
 
 @admin.action(description="Unarchive products")
 def mark_unarchived(modeladmin: admin.ModelAdmin, request: HttpRequest, queryset: QuerySet):
-    queryset.update(archived=False)
+    set_archived(modeladmin, request, queryset, archived=False)
+
+
+class ProductChangeList(ChangeList):
+    def get_queryset(self, request, *args, **kwargs):
+        # короткое описание считается в БД, полный текст в список не загружается
+        return super().get_queryset(request, *args, **kwargs).defer("description").annotate(
+            description_head=Substr("description", 1, ProductAdmin.description_short_length),
+            description_length=Length("description"),
+        )
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin, ExportAsCSVMixin):
+class ProductAdmin(EstimatedCountMixin, ProductFullTextSearchMixin, admin.ModelAdmin, ExportAsCSVMixin):
     change_list_template = "shopapp/products_changelist.html"
+    change_form_template = "admin/shopapp/product/change_form.html"
 
     actions = [
         mark_archived,
         mark_unarchived,
         'export_csv'
     ]
+    # заказы товара не инлайн: их подгружает страница по product_orders
     inlines = [
-        OrderInline,
         ProductInline
     ]
     # list_display = 'pk', 'name', 'description', 'price', 'discount'
@@ -64,12 +92,69 @@ class ProductAdmin(admin.ModelAdmin, ExportAsCSVMixin):
         })
     ]
 
+    description_short_length = 48
+    orders_per_page = 50
+
+    def get_changelist(self, request, **kwargs):
+        return ProductChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        # автодополнение в формах заказа ищет по началу названия, по индексу
+        if request.resolver_match and request.resolver_match.url_name == "autocomplete":
+            if search_term:
+                queryset = queryset.filter(prefix_filter("name", search_term))
+            return queryset, False
+        return super().get_search_results(request, queryset, search_term)
+
     def description_short(self, obj: Product) -> str:
-        if len(obj.description) < 48:
-            return obj.description
-        return f'{obj.description[:48]}...'
+        if obj.description_length < self.description_short_length:
+            return obj.description_head
+        return f'{obj.description_head}...'
+
+    # с проверкой прав обычного сотрудника (права пользователя и групп) и записью связи
+    @query_budget(11)
+    def product_orders(self, request: HttpRequest, object_id: int) -> HttpResponse:
+        product = get_object_or_404(Product, pk=object_id)
+        if not self.has_view_permission(request, product):
+            raise PermissionDenied
+        can_change = self.has_change_permission(request, product)
+        status = 200
+        form = ProductOrdersForm()
+        if request.method == "POST":
+            if not can_change:
+                raise PermissionDenied
+            form = ProductOrdersForm(request.POST)
+            if form.is_valid():
+                if form.cleaned_data["add_order"]:
+                    product.orders.add(form.cleaned_data["add_order"])
+                if form.cleaned_data["remove_order"]:
+                    product.orders.remove(form.cleaned_data["remove_order"])
+                form = ProductOrdersForm()
+            else:
+                status = 400
+        # номер заказа вводится руками или через окно поиска, без списка всех заказов
+        form.fields["add_order"].widget = ForeignKeyRawIdWidget(
+            Product.orders.through._meta.get_field("order").remote_field,
+            self.admin_site,
+        )
+        links = (
+            Product.orders.through.objects
+            .filter(product=product)
+            .select_related("order__user")
+            .order_by("-order_id")
+        )
+        paginator = Paginator(links, self.orders_per_page)
+        context = {
+            "form": form,
+            "page": paginator.get_page(request.GET.get("page")),
+            "can_change": can_change,
+        }
+        return render(request, "admin/shopapp/product/orders.html", context, status=status)
 
+    @query_budget(5)
     def import_csv(self, request: HttpRequest) -> HttpResponse:
+        if not self.has_add_permission(request):
+            raise PermissionDenied
         if request.method == "GET":
             form = CSVImportForm()
             context = {
@@ -82,21 +167,77 @@ class ProductAdmin(admin.ModelAdmin, ExportAsCSVMixin):
                 "form": form,
             }
             return render(request, "admin/csv_form.html", context, status=400)
-        save_scv_products(
-            file=form.files["csv_file"].file,
-            encoding=request.encoding,
+        # сам импорт выполняет run_jobs, админка сразу уходит на страницу прогресса
+        job = enqueue_job(
+            kind=Job.KIND_PRODUCTS_CSV_IMPORT,
+            params={
+                "encoding": request.encoding,
+                "workers": form.cleaned_data["workers"],
+            },
+            user=request.user,
+            source=form.files["csv_file"],
         )
+        self.message_user(request, "CSV import was queued")
+        return redirect("admin:import_products_csv_progress", job_pk=job.pk)
+
+    def get_import_job(self, request: HttpRequest, job_pk: int) -> Job:
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        jobs = Job.objects.filter(kind=Job.KIND_PRODUCTS_CSV_IMPORT)
+        if not request.user.is_superuser:
+            # строки и ошибки чужого импорта видит только суперпользователь
+            jobs = jobs.filter(created_by=request.user)
+        return get_object_or_404(jobs, pk=job_pk)
+
+    @query_budget(5)
+    def import_csv_progress(self, request: HttpRequest, job_pk: int) -> HttpResponse:
+        job = self.get_import_job(request, job_pk)
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "job": job,
+            "status_url": reverse("admin:import_products_csv_status", kwargs={"job_pk": job.pk}),
+        }
+        return render(request, "admin/csv_import_progress.html", context)
 
-        self.message_user(request, "Data from CSV was imported")
-        return redirect("..")
+    @query_budget(5)
+    def import_csv_status(self, request: HttpRequest, job_pk: int) -> JsonResponse:
+        job = self.get_import_job(request, job_pk)
+        errors = []
+        if job.status == Job.STATUS_DONE and job.result:
+            with job.result.open("rb") as result:
+                errors = json.load(result)["errors"]
+        return JsonResponse({
+            "status": job.status,
+            "rows_processed": job.rows_processed,
+            "rows_rejected": job.rows_rejected,
+            "rows_per_second": round(job.rows_per_second, 1),
+            "errors": errors,
+            "error": job.error,
+        })
 
     def get_urls(self):
         urls = super().get_urls()
         new_urls = [
+            path(
+                "<int:object_id>/orders/",
+                self.admin_site.admin_view(self.product_orders),
+                name="shopapp_product_orders",
+            ),
             path(
                 "import-products-csv/",
-                self.import_csv,
-                name="import_products_scv",
+                self.admin_site.admin_view(self.import_csv),
+                name="import_products_csv",
+            ),
+            path(
+                "import-products-csv/<int:job_pk>/",
+                self.admin_site.admin_view(self.import_csv_progress),
+                name="import_products_csv_progress",
+            ),
+            path(
+                "import-products-csv/<int:job_pk>/status/",
+                self.admin_site.admin_view(self.import_csv_status),
+                name="import_products_csv_status",
             ),
         ]
         return new_urls + urls
@@ -107,10 +248,16 @@ class ProductAdmin(admin.ModelAdmin, ExportAsCSVMixin):
 
 class ProductInline(admin.StackedInline):
     model = Order.products.through
+    autocomplete_fields = 'product',
 
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(admin.ModelAdmin, ExportAsCSVMixin):
+    actions = [
+        'export_csv',
+    ]
+    autocomplete_fields = 'products',
+    raw_id_fields = 'user',
     inlines = [
         ProductInline,
     ]
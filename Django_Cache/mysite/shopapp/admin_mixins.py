@@ -1,31 +1,133 @@
-import csv
+from typing import Optional
 
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Paginator
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
 from django.db.models import QuerySet
 from django.db.models.options import Options
-from django.http import HttpRequest, HttpResponse
+from django.http import HttpRequest, StreamingHttpResponse
+from django.utils.functional import cached_property
+
+from requestdataapp.fts import fts_available
+
+from .common import EXPORT_CHUNK_SIZE, iter_csv_rows
+from .search import search_products
 
 
 class ExportAsCSVMixin:
     def export_csv(self, request: HttpRequest, queryset: QuerySet):
         meta: Options = self.model._meta
-        field_names = (field.name for field in meta.fields)
-        response = HttpResponse(content_type='text/csv')
-        response['Content--Disposition'] = f'attachment; filename={meta}-export.csv'
-        csv_writer = csv.writer(response)
-        csv_writer.writerow(field_names)
-        for obj in queryset:
-            csv_writer.writerow(getattr(obj, field) for field in field_names)
+        fields = meta.fields
+        # attname: для внешних ключей берётся колонка *_id, без запросов к связанным таблицам
+        rows = (
+            queryset
+            .prefetch_related(None)
+            .values_list(*(field.attname for field in fields))
+            .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        )
+        response = StreamingHttpResponse(
+            iter_csv_rows([field.name for field in fields], rows),
+            content_type='text/csv',
+        )
+        response['Content-Disposition'] = f'attachment; filename={meta.model_name}-export.csv'
         return response
 
     export_csv.short_description = "Export as CSV"
 
 
+def estimate_table_rows(model, using: str = DEFAULT_DB_ALIAS) -> Optional[int]:
+    """
+    Примерное число строк в таблице по статистике БД, без COUNT(*).
+    SQLite берёт его из sqlite_stat1 (заполняется командой ANALYZE), PostgreSQL — из pg_class.
+    """
+    table = model._meta.db_table
+    connection = connections[using]
+    if connection.vendor == "sqlite":
+        sql = "SELECT stat FROM sqlite_stat1 WHERE tbl = %s"
+    elif connection.vendor == "postgresql":
+        sql = "SELECT reltuples::bigint FROM pg_class WHERE relname = %s"
+    else:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [table])
+            rows = cursor.fetchall()
+    except DatabaseError:
+        return None
+    if not rows:
+        return None
+    # в sqlite_stat1 по строке на индекс, первое число в stat — количество строк в индексе;
+    # частичные индексы покрывают не всю таблицу, поэтому берётся максимум
+    return max(int(str(row[0]).split()[0]) for row in rows)
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Для больших таблиц (больше threshold строк по статистике) не считает COUNT(*) по всей
+    таблице, а берёт оценку из статистики. Списки с фильтрами считаются точно: оценка есть
+    только для таблицы целиком.
 
+    Статистика может устареть. Если страница по оценке оказалась пустой или номер страницы
+    больше оценочного числа страниц, число строк один раз считается точно, а номер
+    страницы ограничивается последней страницей.
+    """
+    threshold = 100_000
+    estimate_timeout = 60 * 10
+    estimated = False
 
+    @cached_property
+    def count(self) -> int:
+        queryset = self.object_list
+        if queryset.query.has_filters():
+            return super().count
+        cache_key = f"estimated_rows:{queryset.db}:{queryset.model._meta.db_table}"
+        estimate = cache.get(cache_key)
+        if estimate is None:
+            estimate = estimate_table_rows(queryset.model, queryset.db) or 0
+            cache.set(cache_key, estimate, self.estimate_timeout)
+        if estimate < self.threshold:
+            return super().count
+        self.estimated = True
+        return estimate
 
+    def page(self, number):
+        try:
+            page = super().page(number)
+            if not self.estimated or page.number == 1 or len(page.object_list):
+                return page
+        except EmptyPage:
+            # номер больше оценочного числа страниц: возможно, оценка занижена
+            if not self.estimated or int(number) < 1:
+                raise
+        # оценка разошлась с таблицей: считаем точно и сбрасываем закэшированное число страниц
+        self.estimated = False
+        self.count = super().count
+        self.__dict__.pop("num_pages", None)
+        try:
+            return super().page(number)
+        except EmptyPage:
+            return super().page(self.num_pages)
 
 
+class EstimatedCountMixin:
+    """
+    Списки в админке без точного COUNT(*) для таблиц больше estimated_count_threshold строк.
+    """
+    estimated_count_threshold = 100_000
+    show_full_result_count = False
 
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        paginator = EstimatedCountPaginator(queryset, per_page, orphans, allow_empty_first_page)
+        paginator.threshold = self.estimated_count_threshold
+        return paginator
 
 
+class ProductFullTextSearchMixin:
+    """
+    Поиск в списке товаров по FTS5-индексу вместо LIKE по search_fields.
+    """
 
+    def get_search_results(self, request, queryset, search_term):
+        if search_term and fts_available(queryset.db):
+            return search_products(queryset, search_term), False
+        return super().get_search_results(request, queryset, search_term)
@@ -0,0 +1,182 @@
+"""
+Подсказки по началу названия товара из индекса в памяти процесса.
+
+Индекс — отсортированный список (название в casefold, pk, название) неархивных товаров,
+префикс ищется bisect'ом. Свою копию индекса держит каждый процесс (воркер gunicorn):
+
+- save()/delete() товара записывают изменение в журнал под номером из счётчика
+  вместе с версией каталога, которую получило это изменение. Журнал лежит в кэше
+  settings.PRODUCT_SUGGEST_CACHE с атомарным incr, иначе два процесса получат один номер
+  и одно изменение затрёт другое;
+- перед поиском, не чаще раза в check_interval секунд, индекс сверяет номер журнала
+  и версию каталога и догоняет журнал, перечитывая из БД только изменённые товары;
+- если журнал не объясняет текущую версию каталога (массовые update/bulk_create,
+  пропущенные или истёкшие записи журнала), индекс перестраивается целиком в фоновом
+  потоке, а запросы пока получают подсказки из прежнего индекса.
+
+Журнал общий для процессов, только когда общий сам кэш: без DEBUG это redis (REDIS_URL
+обязателен, см. settings). С LocMemCache (DEBUG без REDIS_URL) у каждого процесса свой журнал,
+другие процессы видят только новую версию каталога и после каждого изменения товара
+перестраивают индекс целиком.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+from .common import get_products_version
+from .models import Product
+
+log = logging.getLogger(__name__)
+
+CHANGES_SEQ_KEY = "product_names_changes_seq"
+CHANGE_KEY = "product_names_change:{seq}"
+CHANGES_TIMEOUT = 60 * 60
+MAX_CHANGES_BEHIND = 1000
+
+
+def changes_cache():
+    return caches[settings.PRODUCT_SUGGEST_CACHE]
+
+
+class ProductNameIndex:
+    check_interval = 1.0
+    background_rebuild = True
+
+    def __init__(self):
+        self.entries: list[tuple[str, int, str]] = []
+        self.keys: dict[int, tuple[str, int, str]] = {}
+        self.version: Optional[int] = None
+        self.seq = 0
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+        self.rebuilding = False
+
+    def lookup(self, prefix: str, limit: int = 10) -> list[tuple[int, str]]:
+        self.refresh()
+        key = prefix.casefold()
+        # списки не меняются на месте, а заменяются целиком, поэтому читать можно без блокировки
+        entries = self.entries
+        start = bisect_left(entries, (key,))
+        result = []
+        for folded, pk, name in entries[start:start + limit]:
+            if not folded.startswith(key):
+                break
+            result.append((pk, name))
+        return result
+
+    def refresh(self) -> None:
+        if self.version is not None and time.monotonic() - self.checked_at < self.check_interval:
+            return
+        with self.lock:
+            if self.version is not None and time.monotonic() - self.checked_at < self.check_interval:
+                return
+            self.checked_at = time.monotonic()
+            version = get_products_version()
+            seq = changes_cache().get(CHANGES_SEQ_KEY, 0)
+            if version == self.version and seq == self.seq:
+                return
+            if self.version is None:
+                # отдавать пока нечего, первый раз строим сразу
+                self.rebuild(version, seq)
+            elif not self.catch_up(version, seq):
+                self.schedule_rebuild(version, seq)
+
+    def schedule_rebuild(self, version: int, seq: int) -> None:
+        # вызывается под self.lock
+        if not self.background_rebuild:
+            self.rebuild(version, seq)
+            return
+        if self.rebuilding:
+            return
+        self.rebuilding = True
+        threading.Thread(
+            target=self.rebuild_in_background,
+            args=(version, seq),
+            name="product-name-index",
+            daemon=True,
+        ).start()
+
+    def rebuild_in_background(self, version: int, seq: int) -> None:
+        try:
+            rows = list(self.fetch_rows())
+            with self.lock:
+                self.load(rows, version, seq)
+        except Exception:
+            log.exception("Product name index rebuild failed")
+        finally:
+            self.rebuilding = False
+            # соединение этого потока никто, кроме него, не закроет
+            connections.close_all()
+
+    def catch_up(self, version: int, seq: int) -> bool:
+        if not 0 <= seq - self.seq <= MAX_CHANGES_BEHIND:
+            return False
+        keys = [CHANGE_KEY.format(seq=number) for number in range(self.seq + 1, seq + 1)]
+        changes = changes_cache().get_many(keys)
+        # пропущенный номер — изменение, которого индекс не видел
+        if len(changes) != len(keys):
+            return False
+        last_version = changes[keys[-1]][1] if keys else self.version
+        if last_version != version:
+            return False
+        self.apply({changes[key][0] for key in keys})
+        self.version, self.seq = version, seq
+        return True
+
+    def apply(self, pks: Iterable[int]) -> None:
+        pks = set(pks)
+        names = dict(
+            Product.objects
+            .filter(pk__in=pks, archived=False)
+            .values_list("pk", "name")
+        )
+        entries = self.entries.copy()
+        keys = self.keys.copy()
+        for pk in pks:
+            old = keys.pop(pk, None)
+            if old is not None:
+                del entries[bisect_left(entries, old)]
+            if pk in names:
+                entry = (names[pk].casefold(), pk, names[pk])
+                entries.insert(bisect_left(entries, entry), entry)
+                keys[pk] = entry
+        self.entries, self.keys = entries, keys
+
+    @staticmethod
+    def fetch_rows() -> Iterable[tuple[int, str]]:
+        return Product.objects.filter(archived=False).values_list("pk", "name").iterator(chunk_size=10_000)
+
+    def rebuild(self, version: int, seq: int) -> None:
+        self.load(self.fetch_rows(), version, seq)
+
+    def load(self, rows: Iterable[tuple[int, str]], version: int, seq: int) -> None:
+        entries = sorted((name.casefold(), pk, name) for pk, name in rows)
+        self.keys = {entry[1]: entry for entry in entries}
+        self.entries = entries
+        self.version, self.seq = version, seq
+
+    def record_change(self, pk: int, version: int) -> None:
+        """
+        Записывает изменение товара в журнал; вызывается после коммита транзакции,
+        чтобы другие процессы прочитали из БД уже новые данные.
+        """
+        cache = changes_cache()
+        try:
+            seq = cache.incr(CHANGES_SEQ_KEY)
+        except ValueError:
+            cache.add(CHANGES_SEQ_KEY, 0, None)
+            seq = cache.incr(CHANGES_SEQ_KEY)
+        cache.set(CHANGE_KEY.format(seq=seq), (pk, version), CHANGES_TIMEOUT)
+        # в своём процессе изменение видно сразу, номер журнала догонит refresh()
+        if self.version is not None:
+            with self.lock:
+                self.apply([pk])
+
+
+product_name_index = ProductNameIndex()
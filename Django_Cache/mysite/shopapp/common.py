@@ -1,18 +1,518 @@
-from csv import DictReader
+import json
+import re
+import time
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from csv import DictReader, reader as csv_reader, writer
 from io import TextIOWrapper
+from functools import reduce
+from itertools import groupby, islice
+from operator import itemgetter, or_
+from typing import AsyncIterable, AsyncIterator, Callable, Iterable, Iterator, Optional, Sequence
 
-from .models import Product
+import django
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, transaction
+from django.db.models import Q, QuerySet
+from django.db.models.fields.files import FieldFile
+from django.http import FileResponse, HttpRequest, HttpResponse, StreamingHttpResponse
 
+from .models import Product, Order
 
-def save_scv_products(file, encoding):
+EXPORT_CHUNK_SIZE = 2000
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_IMPORT_ERRORS = 100
+PRODUCT_IMPORT_FIELDS = ("name", "description", "price", "discount", "archived")
+IMPORT_CHUNK_BYTES = 4 * 1024 * 1024
+# больше процессов разбора, чем ядер, не ускоряет загрузку
+MAX_IMPORT_WORKERS = os.cpu_count() or 1
+FILE_CHUNK_SIZE = 64 * 1024
+USER_ORDERS_EXPORT_TIMEOUT = 60 * 60 * 24
+PRODUCTS_VERSION_KEY = "products_catalog_version"
+PRODUCTS_VERSION_TIMEOUT = 60 * 60 * 24 * 7
+AUTOCOMPLETE_LIMIT = 20
+UPDATE_CHUNK_SIZE = 500
+
+
+def clean_product_row(row: dict) -> dict:
+    """
+    Приводит строку CSV к типам полей Product и проверяет её валидаторами модели.
+    Пустые значения пропускаются, для них останутся значения по умолчанию.
+    """
+    if None in row:
+        raise ValidationError({"__all__": ["Too many values in the row"]})
+    values = {}
+    errors = {}
+    for name in PRODUCT_IMPORT_FIELDS:
+        field = Product._meta.get_field(name)
+        raw = row.get(name)
+        if raw is None or not raw.strip():
+            if not field.blank and not field.has_default():
+                errors[name] = ["This field is required."]
+            continue
+        try:
+            values[name] = field.clean(raw.strip() if name != "description" else raw, None)
+        except ValidationError as error:
+            errors[name] = error.messages
+    if errors:
+        raise ValidationError(errors)
+    return values
+
+
+def _save_products_batch(
+    products: list[Product],
+    report: dict,
+    progress: Optional[Callable[[dict], None]],
+) -> None:
+    # пачка и прогресс задачи коммитятся в одной транзакции: после падения воркера
+    # сохранённый прогресс покрывает ровно те строки, что уже в базе
+    with transaction.atomic():
+        Product.objects.bulk_create(products)
+        report["rows_ok"] += len(products)
+        if progress is not None:
+            progress(report)
+    products.clear()
+
+
+def _reject_row(report: dict, line: int, errors: dict) -> None:
+    report["rows_rejected"] += 1
+    if len(report["errors"]) < MAX_REPORTED_IMPORT_ERRORS:
+        report["errors"].append({"line": line, "errors": errors})
+
+
+def _new_import_report(resumed: Optional[dict] = None) -> dict:
+    report = {
+        "rows_ok": 0,
+        "rows_rejected": 0,
+        "errors": [],
+    }
+    if resumed:
+        report["rows_ok"] = resumed["rows_ok"]
+        report["rows_rejected"] = resumed["rows_rejected"]
+    return report
+
+
+def save_scv_products(
+    file,
+    encoding,
+    batch_size: int = IMPORT_BATCH_SIZE,
+    progress: Optional[Callable[[dict], None]] = None,
+    resumed: Optional[dict] = None,
+) -> dict:
+    """
+    Потоково загружает товары из CSV: строки читаются по одной
+    и сохраняются пачками по batch_size, поэтому память не зависит от размера файла.
+
+    Возвращает отчёт: сколько строк загружено и какие строки (с номерами) отклонены.
+    progress вызывается с текущим отчётом в транзакции каждой сохранённой пачки.
+    resumed — счётчики прерванной загрузки того же файла: учтённые в них строки
+    пропускаются, а в ошибки отчёта попадают только строки после них.
+    """
     csv_file = TextIOWrapper(
         file,
-        encoding=encoding,
+        encoding=encoding or "utf-8",
+        newline="",
     )
+    report = _new_import_report(resumed)
     reader = DictReader(csv_file)
-    products = [
-        Product(**row)
-        for row in reader
-    ]
-    Product.objects.bulk_create(products)
-    return products
\ No newline at end of file
+    # islice пропускает строки через reader, поэтому номера строк в ошибках не сбиваются
+    rows = islice(reader, report["rows_ok"] + report["rows_rejected"], None)
+    batch = []
+    _save_csv_rows(reader, rows, report, batch, batch_size, progress)
+    _finish_import(report, batch, progress)
+    return report
+
+
+def _save_csv_rows(
+    reader: DictReader,
+    rows: Iterable[dict],
+    report: dict,
+    batch: list,
+    batch_size: int,
+    progress: Optional[Callable[[dict], None]],
+    line_offset: int = 0,
+) -> None:
+    for row in rows:
+        try:
+            batch.append(Product(**clean_product_row(row)))
+        except ValidationError as error:
+            _reject_row(report, line_offset + reader.line_num, error.message_dict)
+            continue
+        if len(batch) >= batch_size:
+            _save_products_batch(batch, report, progress)
+
+
+def _finish_import(report: dict, batch: list, progress: Optional[Callable[[dict], None]]) -> None:
+    if batch:
+        _save_products_batch(batch, report, progress)
+    # bulk_create не отправляет post_save; вне транзакции on_commit вызывает функцию сразу
+    if report["rows_ok"]:
+        transaction.on_commit(invalidate_products_cache)
+
+
+def init_worker():
+    # процессы пула не должны пользоваться соединениями с БД родителя
+    django.setup()
+    connections.close_all()
+
+
+def _split_csv_file(path: str, chunk_bytes: int) -> tuple[bytes, list[tuple[int, int]]]:
+    """
+    Делит файл на диапазоны байт по границам строк. Возвращает строку заголовка и диапазоны.
+    """
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, "rb") as file:
+        header = file.readline()
+        start = file.tell()
+        while start < size:
+            file.seek(min(start + chunk_bytes, size))
+            file.readline()
+            end = min(file.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return header, ranges
+
+
+def _parse_csv_chunk(path: str, encoding: str, header: list[str], start: int, end: int):
+    """
+    Разбирает и проверяет один диапазон файла в процессе пула.
+    Возвращает строки в порядке файла — (номер строки внутри диапазона, значения полей, ошибки),
+    где заполнены либо значения, либо ошибки, — и число прочитанных строк,
+    или None, если в диапазоне есть поле с переносом строки.
+    """
+    with open(path, "rb") as file:
+        file.seek(start)
+        # разбиваем только по \n: другие разделители строк могут встречаться в описаниях
+        lines = file.read(end - start).decode(encoding).split("\n")
+    if lines and not lines[-1]:
+        lines.pop()
+    if any(line.count('"') % 2 for line in lines):
+        # кавычка не закрыта до конца строки: в поле перенос строки, по \n кусок не разобрать
+        return None
+    rows = []
+    for index, row in enumerate(csv_reader(lines), start=1):
+        if not row:
+            continue
+        data = dict(zip(header, row))
+        if len(row) > len(header):
+            data[None] = row[len(header):]
+        try:
+            rows.append((index, clean_product_row(data), None))
+        except ValidationError as error:
+            rows.append((index, None, error.message_dict))
+    return rows, len(lines)
+
+
+def save_scv_products_parallel(
+    path: str,
+    encoding: str = "utf-8",
+    workers: int = MAX_IMPORT_WORKERS,
+    batch_size: int = IMPORT_BATCH_SIZE,
+    chunk_bytes: int = IMPORT_CHUNK_BYTES,
+    progress: Optional[Callable[[dict], None]] = None,
+) -> dict:
+    """
+    Загрузка больших CSV на нескольких ядрах: файл делится на куски по границам строк,
+    куски разбираются и проверяются в ProcessPoolExecutor, а сохраняет пачки один процесс.
+
+    Куски режутся по \n, поэтому запись с переносом строки внутри кавычек разобрать
+    в процессе пула нельзя. Первый кусок с незакрытой кавычкой и всё после него
+    загружаются последовательно, как в save_scv_products: куски до него целиком
+    состоят из полных записей. Отчёт и progress такие же, как у save_scv_products.
+    """
+    encoding = encoding or "utf-8"
+    header_line, ranges = _split_csv_file(path, chunk_bytes)
+    header = next(csv_reader([header_line.decode(encoding).lstrip("\ufeff")]), [])
+    report = _new_import_report()
+    line_offset = 1
+    batch = []
+    serial_start = None
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+        # в работе не больше двух кусков на процесс, чтобы результаты не копились в памяти
+        pending = deque()
+        ranges = iter(ranges)
+        while True:
+            for start, end in ranges:
+                pending.append((start, pool.submit(_parse_csv_chunk, path, encoding, header, start, end)))
+                if len(pending) >= workers * 2:
+                    break
+            if not pending:
+                break
+            start, future = pending.popleft()
+            result = future.result()
+            if result is None:
+                serial_start = start
+                pool.shutdown(cancel_futures=True)
+                break
+            line_offset = _write_parsed_chunk(result, report, batch, line_offset, batch_size, progress)
+    if serial_start is not None:
+        with open(path, "rb") as file:
+            file.seek(serial_start)
+            csv_file = TextIOWrapper(file, encoding=encoding, newline="")
+            reader = DictReader(csv_file, fieldnames=header)
+            _save_csv_rows(reader, reader, report, batch, batch_size, progress, line_offset)
+    _finish_import(report, batch, progress)
+    return report
+
+
+def _write_parsed_chunk(
+    result,
+    report: dict,
+    batch: list,
+    line_offset: int,
+    batch_size: int,
+    progress: Optional[Callable[[dict], None]],
+) -> int:
+    rows, lines_count = result
+    # строки учитываются в порядке файла, чтобы прогресс пачки не опережал сохранённое
+    for line, product_values, errors in rows:
+        if errors is not None:
+            _reject_row(report, line_offset + line, errors)
+            continue
+        batch.append(Product(**product_values))
+        if len(batch) >= batch_size:
+            _save_products_batch(batch, report, progress)
+    return line_offset + lines_count
+
+
+def get_products_version() -> int:
+    """
+    Версия каталога товаров, входит в ключи всех кэшей с данными товаров.
+    """
+    return cache.get_or_set(PRODUCTS_VERSION_KEY, time.time_ns, PRODUCTS_VERSION_TIMEOUT)
+
+
+def invalidate_products_cache() -> int:
+    version = time.time_ns()
+    cache.set(PRODUCTS_VERSION_KEY, version, PRODUCTS_VERSION_TIMEOUT)
+    return version
+
+
+def update_in_chunks(queryset: QuerySet, chunk_size: int = UPDATE_CHUNK_SIZE, **values) -> int:
+    """
+    Обновляет строки queryset диапазонами pk не больше chunk_size строк,
+    каждый диапазон в своей короткой транзакции: SQLite не блокируется на всё обновление.
+    Возвращает количество обновлённых строк.
+    """
+    queryset = queryset.order_by("pk")
+    updated = 0
+    last_pk = None
+    while True:
+        chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        pks = list(chunk.values_list("pk", flat=True)[:chunk_size])
+        if not pks:
+            return updated
+        last_pk = pks[-1]
+        with transaction.atomic():
+            updated += queryset.filter(pk__gte=pks[0], pk__lte=last_pk).update(**values)
+
+
+def prefix_filter(field: str, term: str) -> Q:
+    """
+    Поиск по началу строки условием field >= term AND field < term + U+10FFFF.
+    В отличие от LIKE/ILIKE такой диапазон идёт по обычному индексу поля и в SQLite, и в PostgreSQL.
+    Сравнение регистрозависимое, поэтому вариант с заглавной первой буквой ищется отдельно.
+    """
+    variants = {term, term[:1].upper() + term[1:]}
+    return reduce(or_, (
+        Q(**{f"{field}__gte": variant, f"{field}__lt": f"{variant}\U0010ffff"})
+        for variant in variants
+    ))
+
+
+class Echo:
+    """
+    Псевдо-буфер для csv.writer: вместо записи просто возвращает строку,
+    чтобы её можно было сразу отдать в StreamingHttpResponse.
+    """
+    def write(self, value: str) -> str:
+        return value
+
+
+def iter_csv_rows(header: Sequence[str], rows: Iterable[Sequence]) -> Iterator[str]:
+    csv_writer = writer(Echo())
+    yield csv_writer.writerow(header)
+    for row in rows:
+        yield csv_writer.writerow(row)
+
+
+def iter_orders_data(orders: QuerySet) -> Iterator[dict]:
+    """
+    Отдаёт данные заказов для выгрузки за два запроса, сколько бы заказов ни было:
+    сами заказы и связи заказ-товар, оба отсортированы по id заказа и сливаются на ходу.
+    """
+    orders = orders.order_by("pk")
+    links = (
+        Order.products.through.objects
+        .filter(order_id__in=orders.values("pk"))
+        .order_by("order_id", "product_id")
+        .values_list("order_id", "product_id")
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    groups = groupby(links, key=itemgetter(0))
+    group = next(groups, None)
+    rows = orders.values(
+        "pk", "delivery_address", "promocode", "user_id",
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    for row in rows:
+        while group is not None and group[0] < row["pk"]:
+            group = next(groups, None)
+        products_ids = []
+        if group is not None and group[0] == row["pk"]:
+            products_ids = [product_id for _, product_id in group[1]]
+            group = next(groups, None)
+        yield {
+            "ID": row["pk"],
+            "delivery address": row["delivery_address"],
+            "promocode": row["promocode"],
+            "user_id": row["user_id"],
+            "products id": products_ids,
+        }
+
+
+def iter_json_list(key: str, items: Iterable) -> Iterator[str]:
+    """
+    Кусками отдаёт JSON вида {key: [items...]}, не собирая весь список в памяти.
+    """
+    yield f"{{{json.dumps(key)}: ["
+    separator = ""
+    for item in items:
+        yield separator + json.dumps(item, cls=DjangoJSONEncoder)
+        separator = ", "
+    yield "]}"
+
+
+async def aiter_orders_data(orders: QuerySet) -> AsyncIterator[dict]:
+    """
+    Асинхронный вариант iter_orders_data для ASGI: те же два запроса через aiterator().
+    """
+    orders = orders.order_by("pk")
+    links = (
+        Order.products.through.objects
+        .filter(order_id__in=orders.values("pk"))
+        .order_by("order_id", "product_id")
+        # values_list().aiterator() в Django 4.2 выполняет запрос вне потока, values() — нет
+        .values("order_id", "product_id")
+        .aiterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    link = await anext(links, None)
+    rows = orders.values(
+        "pk", "delivery_address", "promocode", "user_id",
+    ).aiterator(chunk_size=EXPORT_CHUNK_SIZE)
+    async for row in rows:
+        while link is not None and link["order_id"] < row["pk"]:
+            link = await anext(links, None)
+        products_ids = []
+        while link is not None and link["order_id"] == row["pk"]:
+            products_ids.append(link["product_id"])
+            link = await anext(links, None)
+        yield {
+            "ID": row["pk"],
+            "delivery address": row["delivery_address"],
+            "promocode": row["promocode"],
+            "user_id": row["user_id"],
+            "products id": products_ids,
+        }
+
+
+async def aiter_json_list(key: str, items: AsyncIterable) -> AsyncIterator[str]:
+    yield f"{{{json.dumps(key)}: ["
+    separator = ""
+    async for item in items:
+        yield separator + json.dumps(item, cls=DjangoJSONEncoder)
+        separator = ", "
+    yield "]}"
+
+
+async def acache_chunks(chunks: AsyncIterable[str], cache_key: str, timeout: int) -> AsyncIterator[bytes]:
+    """
+    Пропускает куски ответа клиенту и, если выгрузка дошла до конца, кладёт её в кэш целиком.
+    """
+    content = []
+    async for chunk in chunks:
+        chunk = chunk.encode()
+        content.append(chunk)
+        yield chunk
+    await cache.aset(cache_key, b"".join(content), timeout)
+
+
+def _user_orders_version_key(user_id: int) -> str:
+    return f"user_orders_export_version:{user_id}"
+
+
+def user_orders_export_cache_key(user_id: int) -> str:
+    """
+    Ключ кэша выгрузки заказов пользователя: id пользователя + версия его данных.
+    """
+    version = cache.get_or_set(
+        _user_orders_version_key(user_id),
+        time.time_ns,
+        USER_ORDERS_EXPORT_TIMEOUT,
+    )
+    return f"user_orders_export:{user_id}:{version}"
+
+
+def invalidate_user_orders_export(*users_ids: int) -> None:
+    """
+    Меняет версию данных пользователей, старые выгрузки просто перестают читаться.
+    """
+    version = time.time_ns()
+    cache.set_many(
+        {_user_orders_version_key(user_id): version for user_id in set(users_ids)},
+        USER_ORDERS_EXPORT_TIMEOUT,
+    )
+
+
+def _iter_file_range(file, start: int, length: int) -> Iterator[bytes]:
+    with file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(FILE_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def file_range_response(request: HttpRequest, file: FieldFile, filename: str) -> HttpResponse:
+    """
+    Отдаёт файл целиком или один диапазон из заголовка Range (ответ 206),
+    чтобы большую выгрузку можно было докачать после обрыва.
+    """
+    size = file.size
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", request.headers.get("Range", "").strip())
+    first, last = match.groups() if match is not None else ("", "")
+    # нет заголовка, несколько диапазонов или некорректный диапазон (last < first):
+    # по RFC 9110 заголовок игнорируется и отдаётся весь файл
+    if (first, last) == ("", "") or (first and last and int(last) < int(first)):
+        response = FileResponse(file.open("rb"), as_attachment=True, filename=filename)
+        response["Accept-Ranges"] = "bytes"
+        return response
+
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        start = max(size - int(last), 0)
+        end = size - 1
+    if start >= size or start > end:
+        # диапазон начинается за концом файла
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    length = end - start + 1
+    response = StreamingHttpResponse(
+        _iter_file_range(file.open("rb"), start, length),
+        status=206,
+        content_type="application/octet-stream",
+    )
+    response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response["Content-Length"] = str(length)
+    response["Accept-Ranges"] = "bytes"
+    response["Content-Disposition"] = f"attachment; filename={filename}"
+    return response
@@ -1,6 +1,8 @@
 from django import forms
 from django.contrib.auth.models import Group
+from django.urls import reverse_lazy
 
+from .common import MAX_IMPORT_WORKERS
 from .models import Product, Order
 
 
@@ -13,10 +15,52 @@ class ProductForm(forms.ModelForm):
     images = forms.ImageField(widget=forms.ClearableFileInput(attrs={"allow_multiple_selected": True}))
 
 
+class AutocompleteMixin:
+    """
+    Виджет выбора модели без полного списка вариантов: в HTML попадают только выбранные
+    объекты, остальные скрипт подгружает по мере ввода с url.
+    """
+    class Media:
+        js = ("shopapp/autocomplete.js",)
+
+    def __init__(self, url, attrs=None):
+        super().__init__(attrs)
+        self.url = url
+
+    def build_attrs(self, base_attrs, extra_attrs=None):
+        attrs = super().build_attrs(base_attrs, extra_attrs)
+        attrs["data-autocomplete-url"] = str(self.url)
+        return attrs
+
+    def optgroups(self, name, value, attrs=None):
+        selected = [v for v in value if v]
+        options = []
+        if not self.allow_multiple_selected:
+            options.append(self.create_option(name, "", self.choices.field.empty_label, not selected, 0))
+        if selected:
+            for obj in self.choices.queryset.filter(pk__in=selected):
+                options.append(self.create_option(
+                    name, obj.pk, self.choices.field.label_from_instance(obj), True, len(options),
+                ))
+        return [(None, options, 0)]
+
+
+class AutocompleteSelect(AutocompleteMixin, forms.Select):
+    pass
+
+
+class AutocompleteSelectMultiple(AutocompleteMixin, forms.SelectMultiple):
+    pass
+
+
 class OrderForm(forms.ModelForm):
     class Meta:
         model = Order
-        fields = 'delivery_address', 'promocode', 'user', 'products'
+        fields = 'user', 'delivery_address', 'promocode', 'products'
+        widgets = {
+            "user": AutocompleteSelect(url=reverse_lazy("shopapp:user_autocomplete")),
+            "products": AutocompleteSelectMultiple(url=reverse_lazy("shopapp:product_autocomplete")),
+        }
 
 
 class GroupForm(forms.ModelForm):
@@ -27,3 +71,14 @@ class GroupForm(forms.ModelForm):
 
 class CSVImportForm(forms.Form):
     csv_file = forms.FileField()
+    workers = forms.IntegerField(
+        min_value=1,
+        max_value=MAX_IMPORT_WORKERS,
+        initial=1,
+        help_text="Processes used to parse the file, more than one for very large files",
+    )
+
+
+class ProductOrdersForm(forms.Form):
+    add_order = forms.ModelChoiceField(queryset=Order.objects.all(), required=False)
+    remove_order = forms.ModelChoiceField(queryset=Order.objects.all(), required=False)
@@ -0,0 +1,205 @@
+"""
+Фоновые задачи магазина: очередь в таблице Job и обработчики для каждого вида задачи.
+
+Задачи ставятся в очередь через API (JobViewSet), а выполняет их команда run_jobs
+в пуле процессов. Обработчик получает задачу и возвращает имя и содержимое
+файла-результата (или None).
+"""
+import json
+import logging
+import traceback
+from datetime import timedelta
+from tempfile import TemporaryFile
+from typing import Callable, Optional
+
+from django.core.files import File
+from django.http import HttpRequest, QueryDict
+from django.utils import timezone
+from rest_framework.request import Request
+
+from .common import (
+    EXPORT_CHUNK_SIZE,
+    MAX_IMPORT_WORKERS,
+    iter_csv_rows,
+    iter_json_list,
+    iter_orders_data,
+    save_scv_products,
+    save_scv_products_parallel,
+)
+from .models import Job, Order
+
+log = logging.getLogger(__name__)
+
+# задача считается брошенной, если воркер столько секунд не продлевал heartbeat_at
+JOB_LEASE_SECONDS = 60
+
+JOB_HANDLERS: dict[str, Callable[[Job], Optional[tuple[str, File]]]] = {}
+
+
+def job_handler(kind: str):
+    def decorator(func):
+        JOB_HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+def enqueue_job(kind: str, params: Optional[dict] = None, user=None, source=None) -> Job:
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    job = Job(kind=kind, params=params or {}, created_by=user)
+    if source is not None:
+        job.source.save(source.name, source, save=False)
+    job.save()
+    return job
+
+
+def claim_next_job() -> Optional[Job]:
+    """
+    Забирает самую старую задачу из очереди. Статус меняется условным UPDATE,
+    поэтому одну задачу не заберут два воркера.
+    """
+    while True:
+        job_pk = (
+            Job.objects
+            .filter(status=Job.STATUS_QUEUED)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+            .first()
+        )
+        if job_pk is None:
+            return None
+        now = timezone.now()
+        claimed = Job.objects.filter(pk=job_pk, status=Job.STATUS_QUEUED).update(
+            status=Job.STATUS_RUNNING,
+            started_at=now,
+            heartbeat_at=now,
+        )
+        if claimed:
+            return Job.objects.get(pk=job_pk)
+
+
+def extend_jobs_lease(jobs_pks) -> None:
+    Job.objects.filter(pk__in=jobs_pks, status=Job.STATUS_RUNNING).update(heartbeat_at=timezone.now())
+
+
+def requeue_stale_jobs(lease: float = JOB_LEASE_SECONDS) -> int:
+    """
+    Возвращает в очередь задачи, воркер которых перестал продлевать аренду (упал или был убит).
+    Загрузка CSV при повторе продолжается с rows_processed: прогресс сохраняется
+    в транзакции каждой пачки, поэтому уже сохранённые строки не задвоятся.
+    Возвращает число таких задач.
+    """
+    stale = Job.objects.filter(
+        status=Job.STATUS_RUNNING,
+        heartbeat_at__lt=timezone.now() - timedelta(seconds=lease),
+    )
+    return stale.update(status=Job.STATUS_QUEUED, started_at=None, heartbeat_at=None)
+
+
+def fail_job(job_pk: int, error: str) -> None:
+    # для ошибок вне run_job: процесс пула упал или не удалось сохранить статус
+    Job.objects.filter(pk=job_pk, status=Job.STATUS_RUNNING).update(
+        status=Job.STATUS_FAILED,
+        error=error,
+        finished_at=timezone.now(),
+    )
+
+
+def run_job(job_pk: int) -> str:
+    """
+    Выполняет задачу и сохраняет результат. Вызывается в процессе пула run_jobs.
+    """
+    job = Job.objects.get(pk=job_pk)
+    try:
+        result = JOB_HANDLERS[job.kind](job)
+        if result is not None:
+            name, content = result
+            with content:
+                job.result.save(name, content, save=False)
+        job.status = Job.STATUS_DONE
+    except Exception:
+        log.exception("Job %s failed", job_pk)
+        job.status = Job.STATUS_FAILED
+        job.error = traceback.format_exc()
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "result", "error", "finished_at"])
+    return job.status
+
+
+def _write_chunks(chunks) -> File:
+    # результат пишется во временный файл, а не собирается в памяти
+    tmp = TemporaryFile()
+    for chunk in chunks:
+        tmp.write(chunk.encode())
+    tmp.seek(0)
+    return File(tmp)
+
+
+@job_handler(Job.KIND_PRODUCTS_CSV_EXPORT)
+def export_products_csv(job: Job):
+    # фильтры те же, что у ProductViewSet.download_csv: params — это его query string
+    from .views import ProductViewSet
+
+    query = QueryDict(mutable=True)
+    for key, value in job.params.get("query", {}).items():
+        query.setlist(key, value if isinstance(value, list) else [value])
+    http_request = HttpRequest()
+    http_request.method = "GET"
+    http_request.GET = query
+    viewset = ProductViewSet(
+        request=Request(http_request),
+        action="download_csv",
+        kwargs={},
+        format_kwarg=None,
+    )
+    queryset = viewset.filter_queryset(viewset.get_queryset())
+    fields = viewset.csv_fields
+    rows = queryset.values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    return "products-export.csv", _write_chunks(iter_csv_rows(fields, rows))
+
+
+@job_handler(Job.KIND_ORDERS_EXPORT)
+def export_orders(job: Job):
+    orders = Order.objects.all()
+    user_id = job.params.get("user_id")
+    if user_id is not None:
+        orders = orders.filter(user_id=user_id)
+    return "orders-export.json", _write_chunks(iter_json_list("orders", iter_orders_data(orders)))
+
+
+@job_handler(Job.KIND_PRODUCTS_CSV_IMPORT)
+def import_products_csv(job: Job):
+    def progress(report: dict):
+        Job.objects.filter(pk=job.pk).update(
+            rows_processed=report["rows_ok"] + report["rows_rejected"],
+            rows_rejected=report["rows_rejected"],
+        )
+
+    # задачи могли попасть в очередь и в обход JobSerializer
+    workers = min(max(int(job.params.get("workers") or 1), 1), MAX_IMPORT_WORKERS)
+    resumed = None
+    if job.rows_processed:
+        # задачу вернули в очередь после падения воркера: продолжаем в одном процессе
+        # со строки, на которой остановился сохранённый прогресс
+        resumed = {
+            "rows_ok": job.rows_processed - job.rows_rejected,
+            "rows_rejected": job.rows_rejected,
+        }
+    if workers > 1 and resumed is None:
+        # разбор на нескольких ядрах, процессам нужен путь к файлу
+        report = save_scv_products_parallel(
+            path=job.source.path,
+            encoding=job.params.get("encoding"),
+            workers=workers,
+            progress=progress,
+        )
+    else:
+        with job.source.open("rb") as source:
+            report = save_scv_products(
+                file=source,
+                encoding=job.params.get("encoding"),
+                progress=progress,
+                resumed=resumed,
+            )
+    progress(report)
+    return "products-import.json", _write_chunks([json.dumps(report)])
@@ -0,0 +1,52 @@
+import time
+from random import choice, randint
+from string import ascii_lowercase
+
+from django.core.management import BaseCommand
+
+from shopapp.autocomplete import ProductNameIndex
+from shopapp.common import get_products_version
+
+
+class Command(BaseCommand):
+    """
+    Замеряет время поиска по префиксу в индексе названий товаров (ProductNameIndex).
+
+    По умолчанию индекс строится из синтетических названий, с --from-db — из товаров в базе.
+    Проверка версии в кэше входит в замер так же, как при обычных запросах.
+    """
+    help = "Benchmark product name prefix lookups"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=1_000_000)
+        parser.add_argument("--lookups", type=int, default=100_000)
+        parser.add_argument("--from-db", action="store_true")
+
+    def handle(self, *args, **options):
+        index = ProductNameIndex()
+        started = time.perf_counter()
+        if options["from_db"]:
+            index.refresh()
+        else:
+            rows = ((pk, self.random_name()) for pk in range(options["products"]))
+            index.load(rows, version=get_products_version(), seq=0)
+            index.checked_at = time.monotonic()
+        self.stdout.write(
+            f"index of {len(index.entries):,} names built in {time.perf_counter() - started:.2f} s"
+        )
+
+        prefixes = [self.random_name()[:randint(1, 4)] for _ in range(options["lookups"])]
+        started = time.perf_counter()
+        found = sum(len(index.lookup(prefix)) for prefix in prefixes)
+        seconds = time.perf_counter() - started
+        self.stdout.write(
+            f"{len(prefixes):,} lookups: {seconds / len(prefixes) * 1_000_000:.1f} µs per lookup, "
+            f"{found / len(prefixes):.1f} names per lookup"
+        )
+
+    @staticmethod
+    def random_name() -> str:
+        return " ".join(
+            "".join(choice(ascii_lowercase) for _ in range(randint(3, 8)))
+            for _ in range(2)
+        ).capitalize()
@@ -0,0 +1,96 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from statistics import median
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.management import BaseCommand, CommandError
+from django.conf import settings
+from django.test import Client, AsyncClient, override_settings
+from django.urls import reverse
+
+
+class Command(BaseCommand):
+    """
+    Сравнивает пропускную способность выгрузок при одновременных запросах:
+    синхронная view через WSGI-обработчик с ограниченным числом потоков (как воркеры gunicorn)
+    и async view через ASGI-обработчик в одном event loop (как один воркер uvicorn).
+
+    Запросы идут в процессе, через тестовые клиенты Django, по текущей базе данных.
+    """
+    help = "Benchmark concurrent export throughput under WSGI and ASGI"
+
+    exports = {
+        "orders": ("shopapp:order-export", "shopapp:order-export-async"),
+        "products": ("shopapp:products-export", "shopapp:products-export-async"),
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument("--export", choices=sorted(self.exports), default="orders")
+        parser.add_argument("--requests", type=int, default=100)
+        parser.add_argument("--concurrency", type=int, default=20)
+        parser.add_argument("--threads", type=int, default=4, help="WSGI worker threads")
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(is_staff=True).first()
+        if user is None:
+            raise CommandError("A staff user is required to run the benchmark")
+        sync_url, async_url = (reverse(name) for name in self.exports[options["export"]])
+
+        self.stdout.write(
+            f"{options['requests']} requests, concurrency {options['concurrency']}"
+        )
+        # тестовые клиенты ходят с хостом testserver
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+            self.report("WSGI", sync_url, self.run_wsgi(user, sync_url, options))
+            self.report("ASGI", async_url, asyncio.run(self.run_asgi(user, async_url, options)))
+
+    def report(self, name: str, url: str, result):
+        total, latencies = result
+        self.stdout.write(
+            f"{name} {url}: {len(latencies) / total:.1f} req/s, "
+            f"median latency {median(latencies) * 1000:.1f} ms"
+        )
+
+    @staticmethod
+    def read(response) -> int:
+        if response.streaming:
+            return sum(len(chunk) for chunk in response.streaming_content)
+        return len(response.content)
+
+    def run_wsgi(self, user: User, url: str, options):
+        local = threading.local()
+
+        def fetch(_):
+            if not hasattr(local, "client"):
+                local.client = Client()
+                local.client.force_login(user)
+            started = time.perf_counter()
+            self.read(local.client.get(url))
+            return time.perf_counter() - started
+
+        # запросы сверх числа потоков ждут в очереди, как в backlog у gunicorn
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=min(options["threads"], options["concurrency"])) as pool:
+            latencies = list(pool.map(fetch, range(options["requests"])))
+        return time.perf_counter() - started, latencies
+
+    async def run_asgi(self, user: User, url: str, options):
+        client = AsyncClient()
+        await sync_to_async(client.force_login)(user)
+        semaphore = asyncio.Semaphore(options["concurrency"])
+
+        async def fetch():
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.get(url)
+                if response.streaming:
+                    async for _ in response.streaming_content:
+                        pass
+                return time.perf_counter() - started
+
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(fetch() for _ in range(options["requests"])))
+        return time.perf_counter() - started, latencies
@@ -0,0 +1,62 @@
+import time
+from csv import writer
+from random import randint, choice
+from string import ascii_letters
+from tempfile import NamedTemporaryFile
+
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from shopapp.common import save_scv_products, save_scv_products_parallel
+
+
+class Command(BaseCommand):
+    """
+    Замеряет скорость загрузки товаров из CSV (строк в секунду):
+    обычная потоковая загрузка и многопроцессная при разном числе процессов.
+
+    Каждый прогон выполняется в транзакции, которая откатывается, так что база не меняется.
+    """
+    help = "Benchmark CSV product import throughput at 1, 2, 4 and 8 workers"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=200_000)
+        parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+        with NamedTemporaryFile("w", suffix=".csv", newline="") as source:
+            self.write_csv(source, rows)
+            source.flush()
+            self.stdout.write(f"{rows} rows")
+
+            with open(source.name, "rb") as file:
+                seconds = self.measure(lambda: save_scv_products(file, "utf-8"))
+            self.stdout.write(f"streaming: {rows / seconds:,.0f} rows/sec")
+            for workers in options["workers"]:
+                seconds = self.measure(
+                    lambda: save_scv_products_parallel(source.name, "utf-8", workers=workers)
+                )
+                self.stdout.write(f"parallel, {workers} workers: {rows / seconds:,.0f} rows/sec")
+
+    @staticmethod
+    def write_csv(file, rows: int):
+        csv_writer = writer(file)
+        csv_writer.writerow(["name", "description", "price", "discount", "archived"])
+        for i in range(rows):
+            csv_writer.writerow([
+                f"bench product {i}",
+                "".join(choice(ascii_letters) for _ in range(60)),
+                f"{randint(1, 99999)}.{randint(0, 99):02d}",
+                randint(0, 50),
+                i % 10 == 0,
+            ])
+
+    @staticmethod
+    def measure(func) -> float:
+        with transaction.atomic():
+            started = time.perf_counter()
+            func()
+            seconds = time.perf_counter() - started
+            transaction.set_rollback(True)
+        return seconds
@@ -0,0 +1,109 @@
+import time
+from datetime import timedelta
+from random import choice, randint
+from statistics import median
+from string import ascii_lowercase
+
+from django.contrib.auth.models import User
+from django.core.management import BaseCommand
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+from shopapp.models import Order, Product
+
+
+class Command(BaseCommand):
+    """
+    Сравнивает горячие запросы магазина (как в queries.sql) с индексами из Meta.indexes
+    и со старыми одиночными индексами по description и user.
+
+    Всё выполняется в транзакции, которая откатывается: синтетические товары и заказы
+    и подмена индексов в базе не остаются.
+    """
+    help = "Benchmark shop queries before and after the composite/partial indexes"
+
+    old_indexes = {
+        Product: [models.Index(fields=["description"], name="bench_product_description")],
+        Order: [models.Index(fields=["user"], name="bench_order_user")],
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=100_000)
+        parser.add_argument("--orders", type=int, default=100_000)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = self.generate(options["products"], options["orders"])
+            queries = self.get_queries(user)
+            after = self.measure(queries, options["repeat"])
+            self.swap_indexes()
+            before = self.measure(queries, options["repeat"])
+            transaction.set_rollback(True)
+
+        for name in queries:
+            self.stdout.write(
+                f"{name}: {before[name][0]:.2f} ms -> {after[name][0]:.2f} ms\n"
+                f"  before: {before[name][1]}\n"
+                f"  after:  {after[name][1]}"
+            )
+
+    def generate(self, products: int, orders: int) -> User:
+        users = [User.objects.create(username=f"bench_indexes_{i}") for i in range(50)]
+        now = timezone.now()
+        Product.objects.bulk_create(
+            (
+                Product(
+                    name="".join(choice(ascii_lowercase) for _ in range(10)),
+                    description="".join(choice(ascii_lowercase) for _ in range(200)),
+                    price=randint(1, 100_000),
+                    archived=i % 5 == 0,
+                    created_by=users[0],
+                )
+                for i in range(products)
+            ),
+            batch_size=5000,
+        )
+        order_ids = Order.objects.bulk_create(
+            (Order(user=choice(users)) for _ in range(orders)),
+            batch_size=5000,
+        )
+        # auto_now_add ставит всем одно время, для сортировки нужен разброс дат
+        for order in order_ids[::100]:
+            Order.objects.filter(pk=order.pk).update(created_at=now - timedelta(minutes=randint(0, 100_000)))
+        Product.objects.filter(pk__in=Product.objects.order_by("?")[:1000].values("pk")).update(
+            created_at=now - timedelta(days=1),
+        )
+        return users[0]
+
+    @staticmethod
+    def get_queries(user: User) -> dict:
+        return {
+            "product list page": Product.objects.filter(archived=False)[:50],
+            "latest products feed": Product.objects.filter(archived=False).order_by("-created_at")[:5],
+            "user orders": Order.objects.filter(user=user).order_by("-created_at")[:20],
+        }
+
+    @staticmethod
+    def measure(queries: dict, repeat: int) -> dict:
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        result = {}
+        for name, queryset in queries.items():
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - started) * 1000)
+            plan = " | ".join(line.strip() for line in queryset.explain().splitlines())
+            result[name] = median(timings), plan
+        return result
+
+    def swap_indexes(self):
+        editor = connection.schema_editor()
+        with connection.cursor() as cursor:
+            for model, indexes in self.old_indexes.items():
+                for index in model._meta.indexes:
+                    cursor.execute(str(index.remove_sql(model, editor)))
+                for index in indexes:
+                    cursor.execute(str(index.create_sql(model, editor)))
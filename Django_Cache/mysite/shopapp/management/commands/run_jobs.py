@@ -0,0 +1,84 @@
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.core.management import BaseCommand
+from django.db import connections
+
+from shopapp.common import init_worker
+from shopapp.jobs import JOB_LEASE_SECONDS, claim_next_job, extend_jobs_lease, fail_job, requeue_stale_jobs, run_job
+from shopapp.models import Job
+
+
+class Command(BaseCommand):
+    """
+    Воркер очереди фоновых задач (модель Job).
+
+    Забирает задачи из базы данных и выполняет их в пуле процессов.
+    Пока задача выполняется, воркер продлевает её аренду (heartbeat_at); задачи
+    упавших воркеров с истёкшей арендой возвращаются в очередь.
+    """
+    help = "Run queued background jobs in a process pool"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=2)
+        parser.add_argument("--poll-interval", type=float, default=1.0)
+        parser.add_argument(
+            "--lease",
+            type=float,
+            default=JOB_LEASE_SECONDS,
+            help="Seconds without a heartbeat after which a running job is considered abandoned",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit when the queue is empty instead of waiting for new jobs",
+        )
+
+    def handle(self, *args, **options):
+        workers = options["workers"]
+        connections.close_all()
+        self.stdout.write(f"Running jobs with {workers} workers")
+        running = {}
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker)
+        broken = False
+        try:
+            while True:
+                requeued = requeue_stale_jobs(options["lease"])
+                if requeued:
+                    self.stdout.write(f"Requeued or failed {requeued} abandoned jobs")
+
+                if broken and not running:
+                    # процесс пула убит (например, OOM): пул больше не принимает задачи
+                    pool.shutdown(wait=False)
+                    pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker)
+                    broken = False
+
+                while not broken and len(running) < workers:
+                    job = claim_next_job()
+                    if job is None:
+                        break
+                    self.stdout.write(f"Started {job}")
+                    running[pool.submit(run_job, job.pk)] = job
+
+                if not running:
+                    if options["once"]:
+                        break
+                    time.sleep(options["poll_interval"])
+                    continue
+
+                done, _ = wait(running, timeout=options["poll_interval"], return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = running.pop(future)
+                    try:
+                        status = future.result()
+                    except Exception as error:
+                        broken = broken or isinstance(error, BrokenProcessPool)
+                        fail_job(job.pk, traceback.format_exc())
+                        status = Job.STATUS_FAILED
+                    self.stdout.write(f"Finished job {job.pk}: {status}")
+                extend_jobs_lease([job.pk for job in running.values()])
+        finally:
+            pool.shutdown()
+        self.stdout.write(self.style.SUCCESS("Done"))
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.11 on 2026-10-18 11:38
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import shopapp.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('shopapp', '0012_alter_order_options_alter_product_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('products_csv_export', 'Products CSV export'), ('orders_export', 'Orders export'), ('products_csv_import', 'Products CSV import')], max_length=50)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='queued', max_length=20)),
+                ('params', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('source', models.FileField(blank=True, null=True, upload_to=shopapp.models.job_directory_path)),
+                ('result', models.FileField(blank=True, null=True, upload_to=shopapp.models.job_directory_path)),
+                ('error', models.TextField(blank=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Job',
+                'verbose_name_plural': 'Jobs',
+                'ordering': ['pk'],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.11 on 2026-10-18 11:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopapp', '0013_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='rows_processed',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='rows_rejected',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.11 on 2026-10-18 11:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+import requestdataapp.fts
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopapp', '0014_job_progress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearch',
+            fields=[
+                ('product', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search', serialize=False, to='shopapp.product')),
+                ('document', requestdataapp.fts.FullTextField(db_column='shopapp_product_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'shopapp_product_fts',
+                'managed': False,
+            },
+        ),
+        # FTS5 есть только в SQLite, на других БД поиск остаётся LIKE
+        requestdataapp.fts.CreateFullTextIndex(
+            table='shopapp_product_fts',
+            content_table='shopapp_product',
+            columns=['name', 'description'],
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.11 on 2026-10-18 12:16
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import requestdataapp.fts
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('shopapp', '0015_product_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'created_at'], name='shopapp_order_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('archived', False)), fields=['name', 'price'], name='shopapp_product_live_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('archived', False)), fields=['-created_at'], name='shopapp_product_feed_idx'),
+        ),
+        # на SQLite AlterField пересоздаёт таблицу, а с ней пропадают триггеры FTS5:
+        # индекс поиска удаляется и строится заново после изменения shopapp_product
+        requestdataapp.fts.DropFullTextIndex(
+            table='shopapp_product_fts',
+            content_table='shopapp_product',
+            columns=['name', 'description'],
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='description',
+            field=models.TextField(blank=True),
+        ),
+        requestdataapp.fts.CreateFullTextIndex(
+            table='shopapp_product_fts',
+            content_table='shopapp_product',
+            columns=['name', 'description'],
+        ),
+    ]
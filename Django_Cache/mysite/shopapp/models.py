@@ -1,8 +1,13 @@
 from django.contrib.auth.models import User
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.shortcuts import reverse
 
+from requestdataapp.fts import FullTextField
+
+from .search import PRODUCT_FTS_TABLE
+
 
 def product_preview_directory_path(instance: "Product", filename: str) -> str:
     return "products/product_{pk}/preview/{filename}".format(
@@ -21,9 +26,25 @@ class Product(models.Model):
         ordering = ["name", "price"]
         verbose_name = _("Product")
         verbose_name_plural = _("Products")
+        indexes = [
+            # витрина: неархивные товары в порядке Meta.ordering
+            models.Index(
+                fields=["name", "price"],
+                condition=models.Q(archived=False),
+                name="shopapp_product_live_idx",
+            ),
+            # лента последних товаров; filter(archived=False) превращается в NOT "archived",
+            # по такому условию составной индекс (archived, created_at) не используется
+            models.Index(
+                fields=["-created_at"],
+                condition=models.Q(archived=False),
+                name="shopapp_product_feed_idx",
+            ),
+        ]
 
     name = models.CharField(max_length=100, db_index=True)
-    description = models.TextField(null=False, blank=True, db_index=True)
+    # поиск по описанию идёт через FTS5 (shopapp_product_fts), B-tree индекс по тексту не нужен
+    description = models.TextField(null=False, blank=True)
     price = models.DecimalField(default=0, max_digits=8, decimal_places=2)
     discount = models.SmallIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -62,13 +83,103 @@ class Order(models.Model):
     class Meta:
         verbose_name = _("Order")
         verbose_name_plural = _("Orders")
+        indexes = [
+            # заказы пользователя по дате; заменяет отдельный индекс внешнего ключа user
+            models.Index(fields=["user", "created_at"], name="shopapp_order_user_idx"),
+        ]
 
     delivery_address = models.TextField(null=True, blank=True)
     promocode = models.CharField(max_length=20, null=False, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    user = models.ForeignKey(User, on_delete=models.PROTECT)
+    user = models.ForeignKey(User, on_delete=models.PROTECT, db_index=False)
     products = models.ManyToManyField(Product, related_name='orders')
     receipt = models.FileField(null=True, upload_to="orders/receipts/")
 
     def __str__(self) -> str:
         return f'Order(pk={self.pk}, delivery_address={self.delivery_address!r})'
+
+
+class ProductSearch(models.Model):
+    """
+    FTS5-индекс названий и описаний товаров, только для SQLite.
+    Таблицу создаёт и заполняет миграция, Django ею не управляет.
+    """
+    class Meta:
+        managed = False
+        db_table = PRODUCT_FTS_TABLE
+
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column="rowid",
+        db_constraint=False,
+        related_name="search",
+    )
+    document = FullTextField(db_column=PRODUCT_FTS_TABLE)
+    rank = models.FloatField()
+
+
+def job_directory_path(instance: "Job", filename: str) -> str:
+    return "jobs/{kind}/{filename}".format(
+        kind=instance.kind,
+        filename=filename,
+    )
+
+
+class Job(models.Model):
+    """
+    Фоновая задача (выгрузка или загрузка), которую выполняет команда run_jobs.
+
+    Очередь хранится в той же базе данных, отдельный брокер не нужен.
+    """
+    class Meta:
+        ordering = ["pk"]
+        verbose_name = _("Job")
+        verbose_name_plural = _("Jobs")
+
+    KIND_PRODUCTS_CSV_EXPORT = "products_csv_export"
+    KIND_ORDERS_EXPORT = "orders_export"
+    KIND_PRODUCTS_CSV_IMPORT = "products_csv_import"
+    KIND_CHOICES = [
+        (KIND_PRODUCTS_CSV_EXPORT, _("Products CSV export")),
+        (KIND_ORDERS_EXPORT, _("Orders export")),
+        (KIND_PRODUCTS_CSV_IMPORT, _("Products CSV import")),
+    ]
+
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, _("Queued")),
+        (STATUS_RUNNING, _("Running")),
+        (STATUS_DONE, _("Done")),
+        (STATUS_FAILED, _("Failed")),
+    ]
+
+    kind = models.CharField(max_length=50, choices=KIND_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED, db_index=True)
+    params = models.JSONField(default=dict, blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # воркер run_jobs продлевает, пока выполняет задачу; см. jobs.requeue_stale_jobs
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    source = models.FileField(null=True, blank=True, upload_to=job_directory_path)
+    result = models.FileField(null=True, blank=True, upload_to=job_directory_path)
+    error = models.TextField(null=False, blank=True)
+    rows_processed = models.PositiveBigIntegerField(default=0)
+    rows_rejected = models.PositiveBigIntegerField(default=0)
+
+    @property
+    def rows_per_second(self) -> float:
+        if self.started_at is None or not self.rows_processed:
+            return 0.0
+        finished_at = self.finished_at or timezone.now()
+        seconds = (finished_at - self.started_at).total_seconds()
+        return self.rows_processed / seconds if seconds > 0 else 0.0
+
+    def __str__(self) -> str:
+        return f'Job(pk={self.pk}, kind={self.kind!r}, status={self.status!r})'
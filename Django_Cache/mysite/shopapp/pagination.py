@@ -0,0 +1,170 @@
+"""
+Пагинация для REST API магазина.
+
+По умолчанию работает обычная постраничная пагинация (PageNumberPagination).
+Клиент может включить keyset-пагинацию параметром ``?pagination=cursor``:
+тогда страница выбирается условием по ключам сортировки, без COUNT(*) и OFFSET,
+и время ответа не зависит от глубины страницы.
+"""
+import datetime
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from functools import reduce
+from operator import or_
+from typing import Sequence
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q, QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class CursorJSONEncoder(DjangoJSONEncoder):
+    # DjangoJSONEncoder обрезает время до миллисекунд: курсор оказался бы раньше
+    # последней строки страницы, и она повторилась бы на следующей
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (cursor) пагинация по составному ключу сортировки.
+
+    Ключ берётся из ``view.keyset_ordering`` и должен заканчиваться уникальным
+    полем (pk), чтобы позиция в выдаче была однозначной.
+    Курсор — это значения ключа последней строки страницы.
+    """
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = "cursor"
+    mode_query_param = "pagination"
+    ordering = ("pk",)
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset: QuerySet, request: Request, view=None):
+        self.request = request
+        self.ordering = tuple(getattr(view, "keyset_ordering", self.ordering))
+        # сортировка ключа заменяет ?ordering=, иначе курсор теряет смысл
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.get_keyset_filter(position))
+
+        page = list(queryset[:self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        page = page[:self.page_size]
+        self.next_position = self.get_position(page[-1]) if self.has_next else None
+        return page
+
+    def get_keyset_filter(self, position: Sequence) -> Q:
+        # (a, b, pk) > (x, y, z) разворачивается в
+        # a > x OR (a = x AND b > y) OR (a = x AND b = y AND pk > z)
+        conditions = []
+        for index, field in enumerate(self.ordering):
+            equal = {name: value for name, value in zip(self.ordering[:index], position)}
+            conditions.append(Q(**equal, **{f"{field}__gt": position[index]}))
+        return reduce(or_, conditions)
+
+    def get_position(self, obj) -> list:
+        return [getattr(obj, field) for field in self.ordering]
+
+    def encode_cursor(self, position: Sequence) -> str:
+        data = json.dumps(position, cls=CursorJSONEncoder).encode()
+        return urlsafe_b64encode(data).decode()
+
+    def decode_cursor(self, request: Request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            position = json.loads(urlsafe_b64decode(encoded.encode()))
+        except (TypeError, ValueError, BinasciiError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.mode_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {
+                    "type": "string",
+                    "nullable": True,
+                    "format": "uri",
+                },
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Keyset pagination cursor value.",
+                "schema": {"type": "string"},
+            },
+        ]
+
+
+class ShopPagination(PageNumberPagination):
+    """
+    Постраничная пагинация с переключением на keyset-режим по запросу клиента:
+    ``?pagination=cursor`` для первой страницы, дальше по ссылке ``next`` с ``?cursor=``.
+    """
+    keyset_pagination_class = KeysetPagination
+
+    def __init__(self):
+        self.keyset = None
+
+    def use_keyset(self, request: Request) -> bool:
+        keyset_class = self.keyset_pagination_class
+        return (
+            request.query_params.get(keyset_class.mode_query_param) == "cursor"
+            or keyset_class.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_keyset(request):
+            self.keyset = self.keyset_pagination_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view):
+        keyset_class = self.keyset_pagination_class
+        return super().get_schema_operation_parameters(view) + [
+            {
+                "name": keyset_class.mode_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Set to \"cursor\" to switch to keyset pagination.",
+                "schema": {"type": "string", "enum": ["cursor"]},
+            },
+        ] + keyset_class().get_schema_operation_parameters(view)
@@ -0,0 +1,37 @@
+"""
+Полнотекстовый поиск товаров по FTS5-индексу SQLite.
+
+Индекс — виртуальная таблица shopapp_product_fts (модель ProductSearch) с внешним
+содержимым из shopapp_product, её создаёт миграция 0015. Общие для магазина и блогов
+функции поиска лежат в requestdataapp.fts.
+На других БД индекса нет, и поиск остаётся обычным LIKE по полям.
+"""
+from django.db.models import QuerySet
+from rest_framework.filters import SearchFilter
+
+from requestdataapp.fts import fts_available, fts_query, fts_search
+
+PRODUCT_FTS_TABLE = "shopapp_product_fts"
+
+
+def search_products(queryset: QuerySet, term: str) -> QuerySet:
+    """
+    Товары queryset, подходящие под строку поиска, с релевантностью search_rank
+    (bm25, чем меньше, тем лучше).
+    """
+    return fts_search(queryset, term)
+
+
+class ProductSearchFilter(SearchFilter):
+    """
+    ``?search=`` по FTS5-индексу товаров, результаты по убыванию релевантности
+    (если не задан ``?ordering=``). Без индекса работает как обычный SearchFilter.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        if not fts_available(queryset.db):
+            return super().filter_queryset(request, queryset, view)
+        term = " ".join(self.get_search_terms(request))
+        if not fts_query(term):
+            return queryset
+        return search_products(queryset, term).order_by("search_rank", "pk")
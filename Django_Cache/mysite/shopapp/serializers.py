@@ -1,6 +1,10 @@
 from rest_framework import serializers
 
-from .models import Product, Order
+from django.core.exceptions import ValidationError
+from django.urls import reverse
+
+from .common import MAX_IMPORT_WORKERS
+from .models import Product, Order, Job
 
 
 class ProductSerializer(serializers.ModelSerializer):
@@ -11,9 +15,83 @@ class ProductSerializer(serializers.ModelSerializer):
         )
 
 
+class PrimaryKeysField(serializers.ManyRelatedField):
+    """
+    Список pk, как PrimaryKeyRelatedField(many=True), но объекты загружаются
+    одним запросом pk__in, а не запросом на каждый pk.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, "__iter__"):
+            self.fail("not_a_list", input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail("empty")
+        queryset = self.child_relation.get_queryset()
+        pk_field = queryset.model._meta.pk
+        pks = []
+        for item in data:
+            try:
+                if isinstance(item, bool):
+                    raise TypeError
+                pks.append(pk_field.to_python(item))
+            except (TypeError, ValueError, ValidationError):
+                self.child_relation.fail("incorrect_type", data_type=type(item).__name__)
+        objects = queryset.in_bulk(pks)
+        for pk in pks:
+            if pk not in objects:
+                self.child_relation.fail("does_not_exist", pk_value=pk)
+        return [objects[pk] for pk in pks]
+
+
 class OrderSerializer(serializers.ModelSerializer):
+    products = PrimaryKeysField(
+        child_relation=serializers.PrimaryKeyRelatedField(queryset=Product.objects.all()),
+        allow_empty=False,
+    )
+
     class Meta:
         model = Order
         fields = (
             "delivery_address", "promocode", "created_at", "user", "products",
         )
+
+
+class JobSerializer(serializers.ModelSerializer):
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = (
+            "pk", "kind", "status", "params", "source", "created_at", "started_at", "finished_at",
+            "error", "download_url",
+        )
+        read_only_fields = (
+            "status", "created_at", "started_at", "finished_at", "error",
+        )
+        extra_kwargs = {
+            "source": {"write_only": True},
+        }
+
+    def get_download_url(self, obj: Job):
+        if obj.status != Job.STATUS_DONE or not obj.result:
+            return None
+        url = reverse("shopapp:job-download", kwargs={"pk": obj.pk})
+        request = self.context.get("request")
+        return request.build_absolute_uri(url) if request else url
+
+    def validate_params(self, params):
+        if not isinstance(params, dict):
+            raise serializers.ValidationError("Expected an object")
+        if "workers" in params:
+            workers = params["workers"]
+            # каждый процесс разбора — отдельный процесс ОС, число ограничено ядрами
+            if isinstance(workers, bool) or not isinstance(workers, int) or not 1 <= workers <= MAX_IMPORT_WORKERS:
+                raise serializers.ValidationError(
+                    {"workers": f"Must be an integer from 1 to {MAX_IMPORT_WORKERS}"}
+                )
+        return params
+
+    def validate(self, attrs):
+        if attrs["kind"] == Job.KIND_PRODUCTS_CSV_IMPORT and not attrs.get("source"):
+            raise serializers.ValidationError({"source": "CSV file is required for import"})
+        return attrs
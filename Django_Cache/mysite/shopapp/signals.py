@@ -0,0 +1,73 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save, m2m_changed
+from django.dispatch import receiver
+
+from .autocomplete import product_name_index
+from .common import invalidate_user_orders_export, invalidate_products_cache
+from .models import Order, Product
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_changed(sender, instance: Product, **kwargs):
+    # после delete() у instance уже не будет pk, поэтому он запоминается сейчас
+    pk = instance.pk
+
+    def invalidate():
+        # версия меняется после коммита: иначе параллельный запрос успеет закэшировать
+        # ещё старые строки уже под новой версией
+        version = invalidate_products_cache()
+        product_name_index.record_change(pk, version)
+
+    transaction.on_commit(invalidate)
+
+
+@receiver(pre_delete, sender=Product)
+def product_deleted(sender, instance: Product, **kwargs):
+    # каскадное удаление связей Order.products не шлёт m2m_changed, а после удаления
+    # связей уже нет: владельцев заказов с этим товаром выбираем сейчас
+    users_ids = list(
+        Order.objects.filter(products=instance).values_list("user_id", flat=True).distinct()
+    )
+    if users_ids:
+        transaction.on_commit(lambda: invalidate_user_orders_export(*users_ids))
+
+
+@receiver(pre_save, sender=Order)
+def order_owner_changed(sender, instance: Order, **kwargs):
+    # если заказ переходит к другому пользователю, устаревает и выгрузка прежнего владельца
+    if instance.pk is None:
+        return
+    previous_user_id = (
+        Order.objects.filter(pk=instance.pk).values_list("user_id", flat=True).first()
+    )
+    if previous_user_id is not None and previous_user_id != instance.user_id:
+        # версию меняем после коммита: иначе параллельный запрос успеет закэшировать
+        # выгрузку по ещё не закоммиченным данным уже под новой версией
+        transaction.on_commit(lambda: invalidate_user_orders_export(previous_user_id))
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def order_changed(sender, instance: Order, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(lambda: invalidate_user_orders_export(user_id))
+
+
+@receiver(m2m_changed, sender=Order.products.through)
+def order_products_changed(sender, instance, action: str, reverse: bool, pk_set, **kwargs):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            user_id = instance.user_id
+            transaction.on_commit(lambda: invalidate_user_orders_export(user_id))
+        return
+    # со стороны товара: product.orders.add/remove/clear
+    if action in ("post_add", "post_remove") and pk_set:
+        orders = Order.objects.filter(pk__in=pk_set)
+    elif action == "pre_clear":
+        orders = instance.orders.all()
+    else:
+        return
+    # при pre_clear связи ещё есть, поэтому пользователей выбираем сейчас, а не после коммита
+    users_ids = list(orders.values_list("user_id", flat=True).distinct())
+    transaction.on_commit(lambda: invalidate_user_orders_export(*users_ids))
@@ -0,0 +1,48 @@
+(function () {
+    // поле поиска над select: варианты приходят с data-autocomplete-url по началу строки
+    function setup(select) {
+        const input = document.createElement("input");
+        input.type = "search";
+        input.placeholder = "Search...";
+        const results = document.createElement("ul");
+        select.before(input, results);
+        let timer = null;
+
+        function choose(item) {
+            let option = Array.from(select.options).find(function (o) { return o.value === String(item.id); });
+            if (!option) {
+                option = new Option(item.text, item.id);
+                select.add(option);
+            }
+            option.selected = true;
+            results.replaceChildren();
+        }
+
+        function search() {
+            const url = select.dataset.autocompleteUrl + "?term=" + encodeURIComponent(input.value);
+            fetch(url, {credentials: "same-origin"})
+                .then(function (response) { return response.json(); })
+                .then(function (data) {
+                    results.replaceChildren(...data.results.map(function (item) {
+                        const li = document.createElement("li");
+                        const link = document.createElement("a");
+                        link.href = "#";
+                        link.textContent = item.text;
+                        link.addEventListener("click", function (event) {
+                            event.preventDefault();
+                            choose(item);
+                        });
+                        li.append(link);
+                        return li;
+                    }));
+                });
+        }
+
+        input.addEventListener("input", function () {
+            clearTimeout(timer);
+            timer = setTimeout(search, 250);
+        });
+    }
+
+    document.querySelectorAll("select[data-autocomplete-url]").forEach(setup);
+})();
@@ -1,16 +1,47 @@
+import csv
+import json
+import shutil
+import tempfile
+from concurrent.futures import Future
+from datetime import timedelta
+from io import BytesIO, StringIO
 from random import choices
 from string import ascii_letters
+from unittest.mock import Mock, patch
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.management import call_command
 from django.contrib.auth.models import User, Permission
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 
-from shopapp.models import Product, Order
+from shopapp.admin import ProductAdmin, mark_archived
+from shopapp.admin_mixins import EstimatedCountPaginator
+from shopapp.autocomplete import CHANGE_KEY, ProductNameIndex, product_name_index
+from shopapp.common import get_products_version, invalidate_products_cache, update_in_chunks
+from shopapp.common import MAX_IMPORT_WORKERS, save_scv_products, save_scv_products_parallel
+from shopapp.common import user_orders_export_cache_key
+from shopapp.jobs import claim_next_job, requeue_stale_jobs, run_job
+from shopapp.models import Product, Order, Job
+from shopapp.search import search_products
 from shopapp.utils import add_two_numbers
 
 
+
+class WorkerKilled(BaseException):
+    """
+    Имитирует гибель процесса воркера: run_job ловит только Exception,
+    поэтому статус задачи не меняется.
+    """
+
+
 class AddTwoNumbersTestCase(TestCase):
     def test_add_two_numbers(self):
         result = add_two_numbers(2, 3)
@@ -140,6 +171,53 @@ class OrderDetailViewTestCase(TestCase):
         self.assertContains(response, f"Order №{self.order.pk}")
 
 
+class OrderApiTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="order_api_user")
+        self.client.force_login(self.user)
+        self.products = [
+            Product.objects.create(name=f"Order API product {index}", created_by=self.user)
+            for index in range(10)
+        ]
+
+    def create_order(self, products):
+        return self.client.post(
+            reverse("shopapp:order-list"),
+            {"delivery_address": "address", "user": self.user.pk, "products": products},
+            content_type="application/json",
+        )
+
+    def test_products_validated_in_one_query(self):
+        # число запросов не зависит от числа товаров, бюджет OrderViewSet проверяется в тестах
+        with CaptureQueriesContext(connection) as single:
+            self.create_order([self.products[0].pk])
+        with CaptureQueriesContext(connection) as many:
+            response = self.create_order([product.pk for product in self.products])
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(len(many), len(single))
+        order = Order.objects.latest("pk")
+        self.assertEqual(
+            sorted(order.products.values_list("pk", flat=True)),
+            [product.pk for product in self.products],
+        )
+
+        url = reverse("shopapp:order-detail", kwargs={"pk": order.pk})
+        response = self.client.patch(url, {"products": [self.products[0].pk]}, content_type="application/json")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(list(order.products.values_list("pk", flat=True)), [self.products[0].pk])
+
+    def test_invalid_products(self):
+        missing = self.products[-1].pk + 1
+        response = self.create_order([self.products[0].pk, missing])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(f"Invalid pk \"{missing}\"", response.json()["products"][0])
+        response = self.create_order(["abc"])
+        self.assertEqual(response.status_code, 400)
+        response = self.create_order([])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+
 class ProductsExportViewTestCase(TestCase):
     fixtures = [
         "products-fixture.json",
@@ -163,6 +241,13 @@ class ProductsExportViewTestCase(TestCase):
         products_data = response.json()
         self.assertEqual(products_data["products"], expected_data)
 
+    def test_products_export_cache_hit(self):
+        invalidate_products_cache()
+        first = self.client.get(reverse("shopapp:products-export"))
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse("shopapp:products-export"))
+        self.assertEqual(first.content, second.content)
+
 
 class OrderExportViewTestCase(TestCase):
 
@@ -193,7 +278,7 @@ class OrderExportViewTestCase(TestCase):
         # статус ответа 200
         self.assertEqual(response.status_code, 200)
 
-        orders_data = response.json()
+        orders_data = json.loads(b"".join(response.streaming_content))
         orders = Order.objects.order_by("pk").all()
         expected_data = [
             {
@@ -201,9 +286,997 @@ class OrderExportViewTestCase(TestCase):
                 "delivery address": order.delivery_address,
                 "promocode": order.promocode,
                 "user_id": order.user.id,
-                "products id": str([product.pk for product in order.products.all()]),
+                "products id": sorted(product.pk for product in order.products.all()),
             }
             for order in orders
         ]
         # в JSON - теле ответа ожидаемые значения
         self.assertEqual(orders_data["orders"], expected_data)
+
+    def test_orders_export_query_count_is_constant(self):
+        def export():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse("shopapp:order-export"))
+                b"".join(response.streaming_content)
+            return len(queries)
+
+        queries_before = export()
+        products = Product.objects.all()
+        for _ in range(5):
+            order = Order.objects.create(user=self.user)
+            order.products.set(products)
+        self.assertEqual(export(), queries_before)
+
+
+class ProductsCsvDownloadTestCase(TestCase):
+    fixtures = [
+        "users-fixture",
+        "products-fixture.json",
+    ]
+
+    def test_download_csv_is_streamed(self):
+        response = self.client.get(reverse("shopapp:product-download-csv"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+
+        content = b"".join(response.streaming_content).decode()
+        rows = content.splitlines()
+        self.assertEqual(rows[0], "name,description,price,discount")
+        self.assertEqual(len(rows) - 1, Product.objects.count())
+
+    def test_download_csv_applies_filters(self):
+        product = Product.objects.order_by("pk").first()
+        response = self.client.get(
+            reverse("shopapp:product-download-csv"),
+            {"name": product.name},
+        )
+        content = b"".join(response.streaming_content).decode()
+        rows = content.splitlines()[1:]
+        self.assertEqual(len(rows), Product.objects.filter(name=product.name).count())
+        self.assertTrue(all(row.startswith(product.name) for row in rows))
+
+
+@override_settings(CACHES={
+    **settings.CACHES,
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "user-orders-export-tests"},
+})
+class UserOrdersExportViewTestCase(TestCase):
+    fixtures = [
+        "users-fixture",
+        "products-fixture.json",
+        "orders-fixture",
+    ]
+
+    def setUp(self):
+        cache.clear()
+        self.order = Order.objects.order_by("pk").first()
+        self.url = reverse("myauth:user_orders_export", kwargs={"pk": self.order.user_id})
+
+    def test_export_is_cached(self):
+        first = self.client.get(self.url)
+        with self.assertNumQueries(1):
+            second = self.client.get(self.url)
+        self.assertEqual(first.content, second.content)
+
+    def test_export_invalidated_on_products_change(self):
+        self.client.get(self.url)
+        product = Product.objects.exclude(orders=self.order).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.products.add(product)
+
+        orders_data = self.client.get(self.url).json()["orders"]
+        exported = next(order for order in orders_data if order["ID"] == self.order.pk)
+        self.assertIn(product.pk, exported["products id"])
+
+    def test_export_invalidated_on_order_delete(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.delete()
+
+        orders_data = self.client.get(self.url).json()["orders"]
+        self.assertNotIn(self.order.pk, [order["ID"] for order in orders_data])
+
+    def test_export_invalidated_on_product_delete(self):
+        product = Product.objects.create(name="deleted with orders", created_by_id=self.order.user_id)
+        self.order.products.add(product)
+        product_pk = product.pk
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            product.delete()
+
+        orders_data = self.client.get(self.url).json()["orders"]
+        exported = next(order for order in orders_data if order["ID"] == self.order.pk)
+        self.assertNotIn(product_pk, exported["products id"])
+
+    def test_invalidated_after_commit(self):
+        cache_key = user_orders_export_cache_key(self.order.user_id)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.order.products.clear()
+        # до коммита версия прежняя
+        self.assertEqual(user_orders_export_cache_key(self.order.user_id), cache_key)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(user_orders_export_cache_key(self.order.user_id), cache_key)
+
+    def test_unknown_user(self):
+        response = self.client.get(
+            reverse("myauth:user_orders_export", kwargs={"pk": 10 ** 6}),
+            follow=True,
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class ProductKeysetPaginationTestCase(TestCase):
+    fixtures = [
+        "users-fixture",
+    ]
+
+    def setUp(self):
+        Product.objects.bulk_create(
+            Product(name=f"product {i % 4}", price=i % 3, created_by_id=1)
+            for i in range(27)
+        )
+        invalidate_products_cache()
+
+    def test_walk_all_pages(self):
+        url = reverse("shopapp:product-list") + "?pagination=cursor"
+        seen = []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                data = self.client.get(url).json()
+            self.assertFalse(any("COUNT(" in query["sql"] for query in queries))
+            self.assertNotIn("count", data)
+            seen.extend(product["pk"] for product in data["results"])
+            url = data["next"]
+
+        expected = list(
+            Product.objects.order_by("name", "price", "pk").values_list("pk", flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_walk_orders_by_created_at(self):
+        user = User.objects.get(pk=1)
+        started = timezone.now().replace(microsecond=0)
+        for index in range(25):
+            order = Order.objects.create(delivery_address=f"keyset {index}", user=user)
+            # несколько заказов в одной миллисекунде и пары с одинаковым временем
+            Order.objects.filter(pk=order.pk).update(created_at=started + timedelta(microseconds=index // 2 * 137))
+        expected = list(Order.objects.order_by("created_at", "pk").values_list("delivery_address", flat=True))
+        url = reverse("shopapp:order-list") + "?pagination=cursor"
+        seen = []
+        # с курсором, обрезанным до миллисекунд, обход повторял бы страницу бесконечно
+        while url and len(seen) <= len(expected):
+            data = self.client.get(url).json()
+            seen.extend(order["delivery_address"] for order in data["results"])
+            url = data["next"]
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(
+            reverse("shopapp:product-list"), {"cursor": "broken"}, follow=True,
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_page_number_pagination_by_default(self):
+        data = self.client.get(reverse("shopapp:product-list")).json()
+        self.assertEqual(data["count"], Product.objects.count())
+
+
+class ProductListCacheTestCase(TestCase):
+    fixtures = [
+        "users-fixture",
+        "products-fixture.json",
+    ]
+
+    def setUp(self):
+        invalidate_products_cache()
+        self.url = reverse("shopapp:product-list")
+
+    def test_list_is_cached(self):
+        first = self.client.get(self.url, {"ordering": "price", "archived": "false"})
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url, {"archived": "false", "ordering": "price"})
+        self.assertEqual(first.json(), second.json())
+
+    def test_list_invalidated_on_save(self):
+        self.client.get(self.url)
+        product = Product.objects.order_by("pk").first()
+        product.price = 42
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+
+        data = self.client.get(self.url).json()
+        exported = next(item for item in data["results"] if item["pk"] == product.pk)
+        self.assertEqual(exported["price"], "42.00")
+
+    def test_list_invalidated_after_commit(self):
+        version = get_products_version()
+        product = Product.objects.order_by("pk").first()
+        with self.captureOnCommitCallbacks() as callbacks:
+            product.save()
+        # пока транзакция не закоммичена, кэш остаётся под прежней версией
+        self.assertEqual(get_products_version(), version)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(get_products_version(), version)
+
+    def test_list_invalidated_by_admin_action(self):
+        self.client.get(self.url, {"archived": "true"})
+        with self.captureOnCommitCallbacks(execute=True):
+            mark_archived(Mock(), None, Product.objects.all())
+
+        data = self.client.get(self.url, {"archived": "true"}).json()
+        self.assertEqual(data["count"], Product.objects.count())
+
+
+class AsyncExportViewsTestCase(TestCase):
+    fixtures = [
+        "users-fixture",
+        "products-fixture.json",
+        "orders-fixture",
+    ]
+
+    @staticmethod
+    async def read_content(response) -> bytes:
+        if not response.streaming:
+            return response.content
+        return b"".join([chunk async for chunk in response.streaming_content])
+
+    async def test_products_export(self):
+        await sync_to_async(invalidate_products_cache)()
+        response = await self.async_client.get(reverse("shopapp:products-export-async"))
+        self.assertEqual(response.status_code, 200)
+        streamed = json.loads(await self.read_content(response))
+
+        cached = await self.async_client.get(reverse("shopapp:products-export-async"))
+        self.assertFalse(cached.streaming)
+        self.assertEqual(json.loads(cached.content), streamed)
+
+        expected = await self.client_get_json(reverse("shopapp:products-export"))
+        self.assertEqual(streamed, expected)
+
+    async def test_orders_export_requires_staff(self):
+        response = await self.async_client.get(reverse("shopapp:order-export-async"))
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.url.startswith(str(settings.LOGIN_URL)))
+
+        user = await User.objects.acreate(username="not_staff")
+        await sync_to_async(self.async_client.force_login)(user)
+        response = await self.async_client.get(reverse("shopapp:order-export-async"))
+        self.assertEqual(response.status_code, 403)
+
+    async def test_orders_export(self):
+        user = await User.objects.acreate(username="staff", is_staff=True)
+        await sync_to_async(self.async_client.force_login)(user)
+        response = await self.async_client.get(reverse("shopapp:order-export-async"))
+        orders_data = json.loads(await self.read_content(response))["orders"]
+        self.assertEqual(
+            [order["ID"] for order in orders_data],
+            [order.pk async for order in Order.objects.order_by("pk")],
+        )
+        expected_products = await sync_to_async(lambda: [
+            sorted(order.products.values_list("pk", flat=True)) for order in Order.objects.order_by("pk")
+        ])()
+        self.assertEqual([order["products id"] for order in orders_data], expected_products)
+
+    async def client_get_json(self, url):
+        response = await sync_to_async(self.client.get)(url)
+        return json.loads(response.content)
+
+
+class JobViewSetTestCase(TestCase):
+    fixtures = [
+        "users-fixture",
+        "products-fixture.json",
+        "orders-fixture",
+    ]
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.settings_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.staff = User.objects.create_user(username="staff", password="qwerty", is_staff=True)
+        self.client.force_login(self.staff)
+
+    def enqueue(self, data, **kwargs):
+        return self.client.post(reverse("shopapp:job-list"), data, **kwargs)
+
+    def test_orders_export_job(self):
+        response = self.enqueue({"kind": Job.KIND_ORDERS_EXPORT}, content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["status"], Job.STATUS_QUEUED)
+
+        job = claim_next_job()
+        self.assertEqual(job.pk, response.json()["pk"])
+        self.assertEqual(job.status, Job.STATUS_RUNNING)
+        self.assertIsNone(claim_next_job())
+        self.assertEqual(run_job(job.pk), Job.STATUS_DONE)
+
+        job_url = reverse("shopapp:job-detail", kwargs={"pk": job.pk})
+        self.assertIsNotNone(self.client.get(job_url).json()["download_url"])
+
+        download_url = reverse("shopapp:job-download", kwargs={"pk": job.pk})
+        full = b"".join(self.client.get(download_url).streaming_content)
+        self.assertEqual(len(json.loads(full)["orders"]), Order.objects.count())
+
+        partial = self.client.get(download_url, HTTP_RANGE="bytes=5-14")
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(partial["Content-Range"], f"bytes 5-14/{len(full)}")
+        self.assertEqual(b"".join(partial.streaming_content), full[5:15])
+
+        tail = self.client.get(download_url, HTTP_RANGE="bytes=-4")
+        self.assertEqual(b"".join(tail.streaming_content), full[-4:])
+
+        outside = self.client.get(download_url, HTTP_RANGE=f"bytes={len(full)}-")
+        self.assertEqual(outside.status_code, 416)
+
+        # last < first: заголовок игнорируется
+        invalid = self.client.get(download_url, HTTP_RANGE="bytes=14-5")
+        self.assertEqual(invalid.status_code, 200)
+        self.assertEqual(b"".join(invalid.streaming_content), full)
+
+    def test_worker_failure_does_not_stop_queue(self):
+        first = self.enqueue({"kind": Job.KIND_ORDERS_EXPORT}, content_type="application/json").json()["pk"]
+        second = self.enqueue({"kind": Job.KIND_ORDERS_EXPORT}, content_type="application/json").json()["pk"]
+        calls = []
+
+        def run_job_in_pool(job_pk):
+            # пул процессов заменён синхронным выполнением, первая задача падает вне run_job
+            calls.append(job_pk)
+            future = Future()
+            if job_pk == first:
+                future.set_exception(RuntimeError("worker crashed"))
+            else:
+                future.set_result(run_job(job_pk))
+            return future
+
+        with patch("shopapp.management.commands.run_jobs.ProcessPoolExecutor") as pool_class:
+            pool_class.return_value.submit.side_effect = lambda func, job_pk: run_job_in_pool(job_pk)
+            call_command("run_jobs", "--once", "--workers=1", stdout=StringIO())
+        self.assertEqual(calls, [first, second])
+        self.assertEqual(Job.objects.get(pk=first).status, Job.STATUS_FAILED)
+        self.assertIn("worker crashed", Job.objects.get(pk=first).error)
+        self.assertEqual(Job.objects.get(pk=second).status, Job.STATUS_DONE)
+
+    def test_stale_running_jobs_requeued(self):
+        export_pk = self.enqueue({"kind": Job.KIND_ORDERS_EXPORT}, content_type="application/json").json()["pk"]
+        import_pk = self.enqueue(
+            {"kind": Job.KIND_PRODUCTS_CSV_IMPORT, "source": SimpleUploadedFile("products.csv", b"name\n")},
+        ).json()["pk"]
+        claim_next_job()
+        claim_next_job()
+        Job.objects.filter(pk=import_pk).update(rows_processed=10)
+        self.assertEqual(requeue_stale_jobs(lease=60), 0)
+
+        Job.objects.update(heartbeat_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(requeue_stale_jobs(lease=60), 2)
+        self.assertEqual(Job.objects.get(pk=export_pk).status, Job.STATUS_QUEUED)
+        # загрузка продолжится с сохранённого прогресса
+        self.assertEqual(Job.objects.get(pk=import_pk).status, Job.STATUS_QUEUED)
+        self.assertEqual(Job.objects.get(pk=import_pk).rows_processed, 10)
+
+    def test_import_resumed_after_worker_crash(self):
+        content = "name,price\n" + "".join(
+            f"resumed {i},{'bad' if i % 100 == 0 else i}\n" for i in range(1, 2501)
+        )
+        job_pk = self.enqueue({
+            "kind": Job.KIND_PRODUCTS_CSV_IMPORT,
+            "source": SimpleUploadedFile("products.csv", content.encode()),
+        }).json()["pk"]
+        bulk_create = Product.objects.bulk_create
+        calls = []
+
+        def crash_on_second_batch(products):
+            # воркер убит после вставки второй пачки, но до коммита её транзакции
+            calls.append(len(products))
+            bulk_create(products)
+            if len(calls) == 2:
+                raise WorkerKilled
+
+        with patch.object(Product.objects, "bulk_create", side_effect=crash_on_second_batch):
+            with self.assertRaises(WorkerKilled):
+                run_job(claim_next_job().pk)
+        job = Job.objects.get(pk=job_pk)
+        self.assertEqual(job.status, Job.STATUS_RUNNING)
+        # первая пачка: 1000 годных строк и 10 отклонённых до последней из них
+        self.assertEqual((job.rows_processed, job.rows_rejected), (1010, 10))
+        self.assertEqual(Product.objects.filter(name__startswith="resumed ").count(), 1000)
+
+        Job.objects.filter(pk=job_pk).update(heartbeat_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(requeue_stale_jobs(lease=60), 1)
+        self.assertEqual(run_job(claim_next_job().pk), Job.STATUS_DONE)
+        job = Job.objects.get(pk=job_pk)
+        self.assertEqual((job.rows_processed, job.rows_rejected), (2500, 25))
+        names = list(Product.objects.filter(name__startswith="resumed ").values_list("name", flat=True))
+        self.assertEqual(len(names), 2475)
+        self.assertEqual(len(set(names)), len(names))
+        with job.result.open("rb") as result:
+            report = json.load(result)
+        self.assertEqual((report["rows_ok"], report["rows_rejected"]), (2475, 25))
+        # номера строк после пропуска считаются от начала файла
+        self.assertEqual(report["errors"][0]["line"], 1101)
+
+    def test_download_before_done(self):
+        job_pk = self.enqueue({"kind": Job.KIND_ORDERS_EXPORT}, content_type="application/json").json()["pk"]
+        response = self.client.get(reverse("shopapp:job-download", kwargs={"pk": job_pk}))
+        self.assertEqual(response.status_code, 409)
+
+    def test_orders_export_requires_permission(self):
+        user = User.objects.create_user(username="customer", password="qwerty")
+        self.client.force_login(user)
+        response = self.enqueue({"kind": Job.KIND_ORDERS_EXPORT}, content_type="application/json")
+        self.assertEqual(response.status_code, 403)
+
+    def test_orders_export_requires_staff(self):
+        # как OrderDataExportView: права view_order без is_staff мало
+        user = User.objects.create_user(username="order_viewer", password="qwerty")
+        user.user_permissions.add(Permission.objects.get(codename="view_order"))
+        self.client.force_login(user)
+        response = self.enqueue({"kind": Job.KIND_ORDERS_EXPORT}, content_type="application/json")
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Job.objects.exists())
+        response = self.client.get(reverse("shopapp:order-export"))
+        self.assertEqual(response.status_code, 403)
+
+    def test_products_import_job(self):
+        source = SimpleUploadedFile(
+            "products.csv",
+            b"name,description,price,discount\nJob product,From job,10.50,5\n",
+        )
+        response = self.enqueue({"kind": Job.KIND_PRODUCTS_CSV_IMPORT, "source": source})
+        self.assertEqual(response.status_code, 201)
+
+        self.assertEqual(run_job(claim_next_job().pk), Job.STATUS_DONE)
+        self.assertTrue(Product.objects.filter(name="Job product").exists())
+
+    def test_products_import_workers_limited(self):
+        for workers in (0, MAX_IMPORT_WORKERS + 1, "many"):
+            source = SimpleUploadedFile("products.csv", b"name\nJob product\n")
+            response = self.enqueue({
+                "kind": Job.KIND_PRODUCTS_CSV_IMPORT,
+                "source": source,
+                "params": json.dumps({"workers": workers}),
+            })
+            self.assertEqual(response.status_code, 400, workers)
+            self.assertIn("workers", response.json()["params"])
+        self.assertFalse(Job.objects.exists())
+
+
+class ProductsCsvImportTestCase(TestCase):
+    fixtures = [
+        "users-fixture",
+    ]
+
+    def test_import_report(self):
+        content = (
+            "name,description,price,discount,archived\n"
+            "Table,A good table,100.50,10,False\n"
+            ",No name,10,0,False\n"
+            "Chair,,not a price,0,\n"
+            "Lamp,,,,\n"
+        )
+        report = save_scv_products(BytesIO(content.encode()), "utf-8", batch_size=2)
+        self.assertEqual(report["rows_ok"], 2)
+        self.assertEqual(report["rows_rejected"], 2)
+        self.assertEqual([error["line"] for error in report["errors"]], [3, 4])
+        self.assertIn("name", report["errors"][0]["errors"])
+        self.assertIn("price", report["errors"][1]["errors"])
+
+        lamp = Product.objects.get(name="Lamp")
+        self.assertEqual(lamp.price, 0)
+        self.assertFalse(lamp.archived)
+
+    def test_import_in_batches(self):
+        content = "name,price\n" + "".join(f"imported {i},{i}\n" for i in range(25))
+        with CaptureQueriesContext(connection) as queries:
+            report = save_scv_products(BytesIO(content.encode()), "utf-8", batch_size=10)
+        self.assertEqual(report["rows_ok"], 25)
+        self.assertEqual(Product.objects.filter(name__startswith="imported ").count(), 25)
+        inserts = [query for query in queries if query["sql"].startswith("INSERT")]
+        self.assertEqual(len(inserts), 3)
+
+    def test_parallel_import(self):
+        content = "name,price,discount\n" + "".join(
+            f"parallel {i},{i}.5,{'bad' if i % 7 == 0 else i % 50}\r\n"
+            for i in range(1, 200)
+        )
+        with tempfile.NamedTemporaryFile(suffix=".csv") as source:
+            source.write(content.encode())
+            source.flush()
+            report = save_scv_products_parallel(
+                source.name, "utf-8", workers=2, batch_size=50, chunk_bytes=512,
+            )
+        rejected = [i for i in range(1, 200) if i % 7 == 0]
+        self.assertEqual(report["rows_ok"], 199 - len(rejected))
+        self.assertEqual(report["rows_rejected"], len(rejected))
+        # номер строки в файле: заголовок — первая строка
+        self.assertEqual([error["line"] for error in report["errors"]], [i + 1 for i in rejected])
+        self.assertEqual(
+            Product.objects.filter(name__startswith="parallel ").count(),
+            report["rows_ok"],
+        )
+        product = Product.objects.get(name="parallel 3")
+        self.assertEqual(str(product.price), "3.50")
+        self.assertEqual(product.discount, 3)
+
+    def test_parallel_import_multiline_fields(self):
+        rows = [f"multiline {i},{i}\n" for i in range(1, 40)]
+        rows[25] = '"multiline 26","first line\nsecond line"\n'
+        rows[29] = "multiline 30,too,many\n"
+        content = "name,description\n" + "".join(rows)
+        with tempfile.NamedTemporaryFile(suffix=".csv") as source:
+            source.write(content.encode())
+            source.flush()
+            report = save_scv_products_parallel(
+                source.name, "utf-8", workers=2, batch_size=10, chunk_bytes=64,
+            )
+        self.assertEqual(report["rows_ok"], 38)
+        self.assertEqual(report["rows_rejected"], 1)
+        # заголовок, 29 строк до неё и ещё одна строка от поля с переносом
+        self.assertEqual(report["errors"][0]["line"], 32)
+        # запись с переносом строки разобрана целиком, а не двумя кусками
+        self.assertEqual(Product.objects.get(name="multiline 26").description, "first line\nsecond line")
+        self.assertEqual(Product.objects.filter(name__startswith="multiline ").count(), 38)
+
+    def test_upload_csv_returns_report(self):
+        source = SimpleUploadedFile("products.csv", b"name,price\nDesk,12\nBed,oops\n")
+        response = self.client.post(reverse("shopapp:product-upload-csv"), {"file": source})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["rows_ok"], 1)
+        self.assertEqual(response.json()["rows_rejected"], 1)
+
+
+class ProductAdminImportTestCase(TestCase):
+    fixtures = [
+        "users-fixture",
+    ]
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.settings_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username="importer", password="qwerty")
+        self.client.force_login(self.admin)
+
+    def test_changelist_opens(self):
+        response = self.client.get(reverse("admin:shopapp_product_changelist"))
+        self.assertContains(response, reverse("admin:import_products_csv"))
+
+    def test_import_runs_in_background(self):
+        source = SimpleUploadedFile("products.csv", b"name,price\nSofa,99\nBad,price\n")
+        response = self.client.post(
+            reverse("admin:import_products_csv"),
+            {"csv_file": source, "workers": 1},
+        )
+        job = Job.objects.get(kind=Job.KIND_PRODUCTS_CSV_IMPORT)
+        self.assertRedirects(
+            response,
+            reverse("admin:import_products_csv_progress", kwargs={"job_pk": job.pk}),
+        )
+        self.assertFalse(Product.objects.filter(name="Sofa").exists())
+
+        status_url = reverse("admin:import_products_csv_status", kwargs={"job_pk": job.pk})
+        self.assertEqual(self.client.get(status_url).json()["status"], Job.STATUS_QUEUED)
+
+        run_job(claim_next_job().pk)
+        status = self.client.get(status_url).json()
+        self.assertEqual(status["status"], Job.STATUS_DONE)
+        self.assertEqual(status["rows_processed"], 2)
+        self.assertEqual(status["rows_rejected"], 1)
+        self.assertEqual(status["errors"][0]["line"], 3)
+        self.assertTrue(Product.objects.filter(name="Sofa").exists())
+
+        progress = self.client.get(
+            reverse("admin:import_products_csv_progress", kwargs={"job_pk": job.pk})
+        )
+        self.assertContains(progress, f"CSV import #{job.pk}")
+
+    def test_import_visible_to_its_author_only(self):
+        staff = User.objects.create_user(username="import_staff", is_staff=True)
+        job = Job.objects.create(kind=Job.KIND_PRODUCTS_CSV_IMPORT, created_by=self.admin)
+        urls = [
+            reverse("admin:import_products_csv_progress", kwargs={"job_pk": job.pk}),
+            reverse("admin:import_products_csv_status", kwargs={"job_pk": job.pk}),
+        ]
+        self.client.force_login(staff)
+        for url in urls:
+            self.assertEqual(self.client.get(url).status_code, 403)
+
+        staff.user_permissions.add(Permission.objects.get(codename="add_product"))
+        for url in urls:
+            self.assertEqual(self.client.get(url).status_code, 404)
+
+        Job.objects.filter(pk=job.pk).update(created_by=staff)
+        for url in urls:
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class AdminExportCSVTestCase(TestCase):
+    fixtures = [
+        "users-fixture",
+        "products-fixture.json",
+        "orders-fixture",
+    ]
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username="exporter", password="qwerty")
+        self.client.force_login(self.admin)
+
+    def export(self, changelist: str, queryset):
+        response = self.client.post(
+            reverse(changelist),
+            {
+                "action": "export_csv",
+                "_selected_action": [obj.pk for obj in queryset],
+            },
+        )
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_export_products(self):
+        content = self.export("admin:shopapp_product_changelist", Product.objects.all())
+        rows = list(csv.reader(StringIO(content)))
+        self.assertEqual(rows[0][:3], ["id", "name", "description"])
+        self.assertEqual(len(rows) - 1, Product.objects.count())
+        self.assertTrue(all(row for row in rows[1:]))
+
+    def test_export_orders_uses_fk_ids(self):
+        orders = Order.objects.order_by("pk")
+        with CaptureQueriesContext(connection) as queries:
+            content = self.export("admin:shopapp_order_changelist", orders)
+        rows = list(csv.reader(StringIO(content)))
+        self.assertIn("user", rows[0])
+        user_column = rows[0].index("user")
+        self.assertEqual(
+            sorted(int(row[user_column]) for row in rows[1:]),
+            sorted(order.user_id for order in orders),
+        )
+        self.assertFalse(any('"auth_user"' in query["sql"] and "shopapp_order" in query["sql"]
+                             for query in queries))
+
+
+class ProductAdminChangelistTestCase(TestCase):
+    fixtures = [
+        "users-fixture",
+        "products-fixture.json",
+    ]
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username="lister", password="qwerty")
+        self.client.force_login(self.admin)
+        cache.delete(f"estimated_rows:default:{Product._meta.db_table}")
+        self.addCleanup(cache.delete, f"estimated_rows:default:{Product._meta.db_table}")
+
+    def test_description_short_from_database(self):
+        product = Product.objects.exclude(description="").order_by("pk").first()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("admin:shopapp_product_changelist"))
+        self.assertContains(response, f"{product.description[:48]}...")
+        product_queries = [q["sql"] for q in queries if 'FROM "shopapp_product"' in q["sql"]]
+        self.assertTrue(any("SUBSTR(" in sql for sql in product_queries))
+        # полный текст описания встречается только внутри SUBSTR() и LENGTH()
+        for sql in product_queries:
+            self.assertNotRegex(sql, r'(?<!\()"shopapp_product"\."description"')
+
+    def test_estimated_count(self):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        total = Product.objects.count()
+        paginator = EstimatedCountPaginator(Product.objects.all(), 10)
+        paginator.threshold = 1
+        with self.assertNumQueries(1):
+            self.assertEqual(paginator.count, total)
+
+        # с фильтрами оценки нет, число строк точное
+        paginator = EstimatedCountPaginator(Product.objects.filter(archived=False), 10)
+        paginator.threshold = 1
+        self.assertEqual(paginator.count, Product.objects.filter(archived=False).count())
+
+    def test_stale_estimate(self):
+        total = Product.objects.count()
+        cache_key = f"estimated_rows:default:{Product._meta.db_table}"
+        # статистика завышена: последние страницы по оценке пустые
+        cache.set(cache_key, total + 100)
+        paginator = EstimatedCountPaginator(Product.objects.order_by("pk"), 2)
+        paginator.threshold = 1
+        page = paginator.page(paginator.num_pages)
+        self.assertEqual(paginator.count, total)
+        self.assertEqual(page.number, paginator.num_pages)
+        self.assertTrue(page.object_list)
+
+        # статистика занижена: страницы после оценочной последней тоже открываются
+        cache.set(cache_key, 2)
+        paginator = EstimatedCountPaginator(Product.objects.order_by("pk"), 1)
+        paginator.threshold = 1
+        page = paginator.page(3)
+        self.assertEqual(page.number, 3)
+        self.assertEqual(paginator.count, total)
+
+
+class ProductAdminOrdersTestCase(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username="product_orders_admin", password="qwerty")
+        self.client.force_login(self.admin)
+        self.product = Product.objects.create(name="lazy_orders_product", created_by=self.admin)
+        self.orders = [
+            Order.objects.create(delivery_address=f"address {i}", user=self.admin)
+            for i in range(3)
+        ]
+        for order in self.orders[:2]:
+            order.products.add(self.product)
+        self.url = reverse("admin:shopapp_product_orders", kwargs={"object_id": self.product.pk})
+
+    def test_change_form_without_orders_inline(self):
+        response = self.client.get(reverse("admin:shopapp_product_change", args=(self.product.pk,)))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "Order_products")
+        self.assertContains(response, self.url)
+
+    def test_orders_paginated(self):
+        with patch.object(ProductAdmin, "orders_per_page", 1):
+            response = self.client.get(self.url, {"page": 2})
+        self.assertContains(response, f"#{self.orders[0].pk}")
+        self.assertNotContains(response, f"#{self.orders[1].pk}<")
+        self.assertContains(response, "Page 2 of 2, 2 orders")
+        self.assertContains(response, 'name="add_order"')
+
+    def test_add_and_remove_order(self):
+        response = self.client.post(self.url, {"add_order": self.orders[2].pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(self.orders[2].products.filter(pk=self.product.pk).exists())
+
+        response = self.client.post(self.url, {"remove_order": self.orders[0].pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(self.orders[0].products.filter(pk=self.product.pk).exists())
+
+        response = self.client.post(self.url, {"add_order": 0})
+        self.assertEqual(response.status_code, 400)
+
+
+class OrderFormAutocompleteTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="autocomplete_user", password="qwerty")
+        self.client.force_login(self.user)
+        self.laptop = Product.objects.create(name="Autocomplete laptop", created_by=self.user)
+        self.phone = Product.objects.create(name="Autocomplete phone", created_by=self.user)
+        Product.objects.create(name="Autocomplete archived", created_by=self.user, archived=True)
+
+    def test_form_renders_selected_only(self):
+        response = self.client.get(reverse("shopapp:order_create"))
+        self.assertNotContains(response, "Autocomplete laptop")
+        self.assertContains(response, reverse("shopapp:product_autocomplete"))
+        self.assertContains(response, "shopapp/autocomplete.js")
+
+        order = Order.objects.create(user=self.user)
+        order.products.add(self.phone)
+        response = self.client.get(reverse("shopapp:order_update", kwargs={"pk": order.pk}))
+        self.assertContains(response, "Autocomplete phone")
+        self.assertNotContains(response, "Autocomplete laptop")
+
+    def test_create_order(self):
+        response = self.client.post(reverse("shopapp:order_create"), {
+            "user": self.user.pk,
+            "delivery_address": "street",
+            "promocode": "",
+            "products": [self.laptop.pk, self.phone.pk],
+        })
+        self.assertEqual(response.status_code, 302)
+        order = Order.objects.get(user=self.user)
+        self.assertEqual(set(order.products.values_list("pk", flat=True)), {self.laptop.pk, self.phone.pk})
+
+    def test_product_autocomplete_prefix(self):
+        response = self.client.get(reverse("shopapp:product_autocomplete"), {"term": "autocomplete l"})
+        self.assertEqual([item["id"] for item in response.json()["results"]], [self.laptop.pk])
+
+        response = self.client.get(reverse("shopapp:product_autocomplete"), {"term": "Autocomplete"})
+        self.assertEqual([item["id"] for item in response.json()["results"]], [self.laptop.pk, self.phone.pk])
+
+    def test_user_autocomplete_requires_login(self):
+        response = self.client.get(reverse("shopapp:user_autocomplete"), {"term": "autocomplete_"})
+        self.assertEqual([item["text"] for item in response.json()["results"]], ["autocomplete_user"])
+        self.client.logout()
+        response = self.client.get(reverse("shopapp:user_autocomplete"))
+        self.assertEqual(response.status_code, 302)
+
+    def test_admin_autocomplete(self):
+        self.client.force_login(User.objects.create_superuser(username="autocomplete_admin"))
+        response = self.client.get(reverse("admin:autocomplete"), {
+            "term": "autocomplete p",
+            "app_label": "shopapp",
+            "model_name": "order",
+            "field_name": "products",
+        })
+        self.assertEqual([item["id"] for item in response.json()["results"]], [str(self.phone.pk)])
+        response = self.client.get(reverse("admin:shopapp_order_add"))
+        self.assertNotContains(response, "Autocomplete laptop")
+
+
+class ProductArchiveActionsTestCase(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username="archive_admin")
+        self.client.force_login(self.admin)
+        Product.objects.bulk_create(
+            Product(name=f"archive_action_{i}", created_by=self.admin, archived=i < 2)
+            for i in range(7)
+        )
+        self.products = Product.objects.filter(name__startswith="archive_action_")
+
+    def test_update_in_chunks(self):
+        with CaptureQueriesContext(connection) as queries:
+            updated = update_in_chunks(self.products.filter(archived=False), chunk_size=2, discount=5)
+        self.assertEqual(updated, 5)
+        self.assertEqual(self.products.filter(discount=5).count(), 5)
+        updates = [q["sql"] for q in queries if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 3)
+
+    def test_archive_action_reports_changed_rows(self):
+        version = get_products_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("admin:shopapp_product_changelist"),
+                {
+                    "action": "mark_archived",
+                    "_selected_action": list(self.products.values_list("pk", flat=True)),
+                },
+                follow=True,
+            )
+        self.assertContains(response, "5 products archived")
+        self.assertFalse(self.products.filter(archived=False).exists())
+        self.assertNotEqual(get_products_version(), version)
+
+
+class ProductFullTextSearchTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser(username="fts_admin")
+        self.client.force_login(self.user)
+        self.kettle = Product.objects.create(
+            name="Ftskettle steel", description="Electric kettle", created_by=self.user,
+        )
+        self.teapot = Product.objects.create(
+            name="Ftsteapot", description="Not a ftskettle, but ftskettle-like", created_by=self.user,
+        )
+
+    def test_search_products(self):
+        found = search_products(Product.objects.all(), "ftskett")
+        self.assertEqual([product.pk for product in found.order_by("search_rank")], [self.teapot.pk, self.kettle.pk])
+        self.assertFalse(search_products(Product.objects.all(), "ftskettle electric OR").exists())
+        self.assertEqual(list(search_products(Product.objects.all(), "ftskettle electric")), [self.kettle])
+
+    def test_index_follows_changes(self):
+        self.kettle.name = "Ftsboiler"
+        self.kettle.save()
+        self.assertEqual(list(search_products(Product.objects.all(), "ftsboiler")), [self.kettle])
+        self.kettle.delete()
+        self.assertFalse(search_products(Product.objects.all(), "ftsboiler").exists())
+
+    def test_api_search(self):
+        response = self.client.get(reverse("shopapp:product-list"), {"search": "ftskettle"})
+        names = [item["name"] for item in response.json()["results"]]
+        self.assertEqual(names, ["Ftsteapot", "Ftskettle steel"])
+
+        response = self.client.get(reverse("shopapp:product-list"), {"search": "ftskettle", "ordering": "name"})
+        names = [item["name"] for item in response.json()["results"]]
+        self.assertEqual(names, ["Ftskettle steel", "Ftsteapot"])
+
+    def test_admin_search(self):
+        response = self.client.get(reverse("admin:shopapp_product_changelist"), {"q": "electric"})
+        self.assertContains(response, "Ftskettle steel")
+        self.assertNotContains(response, "Ftsteapot")
+
+
+class ProductNameIndexTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches[settings.PRODUCT_SUGGEST_CACHE].clear()
+        self.user = User.objects.create_user(username="suggest_user")
+        self.laptop = Product.objects.create(name="Suggest Laptop", created_by=self.user)
+        Product.objects.create(name="Suggest lamp", created_by=self.user)
+        Product.objects.create(name="Suggest archived", created_by=self.user, archived=True)
+        self.index = ProductNameIndex()
+        # фоновый поток не видит данных из незакрытой транзакции теста
+        self.index.background_rebuild = False
+        background = patch.object(product_name_index, "background_rebuild", False)
+        background.start()
+        self.addCleanup(background.stop)
+
+    def test_lookup(self):
+        self.assertEqual(
+            [name for pk, name in self.index.lookup("suggest la")],
+            ["Suggest lamp", "Suggest Laptop"],
+        )
+        self.assertEqual(len(self.index.lookup("suggest", limit=1)), 1)
+        self.assertEqual(self.index.lookup("suggest ar"), [])
+
+    def test_other_process_catches_up_from_log(self):
+        self.index.lookup("suggest")
+        writer = ProductNameIndex()
+        writer.lookup("suggest")
+        with patch("shopapp.signals.product_name_index", writer), self.captureOnCommitCallbacks(execute=True):
+            self.laptop.name = "Suggest Notebook"
+            self.laptop.save()
+        self.assertEqual(writer.lookup("suggest n"), [(self.laptop.pk, "Suggest Notebook")])
+
+        self.index.checked_at = 0
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.index.lookup("suggest n"), [(self.laptop.pk, "Suggest Notebook")])
+        # догнал журнал: перечитан только изменённый товар
+        self.assertEqual(len(queries), 1)
+        self.assertIn(str(self.laptop.pk), queries[0]["sql"])
+        self.assertEqual(self.index.lookup("suggest lap"), [])
+
+    def test_rebuild_after_bulk_update(self):
+        self.index.lookup("suggest")
+        Product.objects.filter(pk=self.laptop.pk).update(archived=True)
+        invalidate_products_cache()
+        self.index.checked_at = 0
+        self.assertEqual([name for pk, name in self.index.lookup("suggest la")], ["Suggest lamp"])
+
+    def test_journal_of_other_process_not_shared(self):
+        # LocMemCache у каждого процесса свой: журнала писателя читатель не видит
+        self.index.lookup("suggest")
+        other_process_cache = LocMemCache("other-process-changes", {})
+        with patch("shopapp.autocomplete.changes_cache", return_value=other_process_cache), \
+                patch("shopapp.signals.product_name_index", ProductNameIndex()), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.laptop.name = "Suggest Notebook"
+            self.laptop.save()
+        self.index.checked_at = 0
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.index.lookup("suggest n"), [(self.laptop.pk, "Suggest Notebook")])
+        # версия каталога изменилась без записи в журнале: индекс перестроен целиком
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn(" IN (", queries[0]["sql"])
+        self.assertEqual(self.index.seq, 0)
+
+    def test_missing_change_forces_rebuild(self):
+        self.index.lookup("suggest")
+        with patch("shopapp.signals.product_name_index", ProductNameIndex()), self.captureOnCommitCallbacks(execute=True):
+            self.laptop.name = "Suggest Notebook"
+            self.laptop.save()
+        # запись журнала потеряна: догнать нельзя, только перестроить
+        caches[settings.PRODUCT_SUGGEST_CACHE].delete(CHANGE_KEY.format(seq=1))
+        self.index.checked_at = 0
+        self.assertEqual(self.index.lookup("suggest n"), [(self.laptop.pk, "Suggest Notebook")])
+
+    def test_rebuild_in_background(self):
+        self.index.lookup("suggest")
+        self.index.background_rebuild = True
+        Product.objects.filter(pk=self.laptop.pk).update(archived=True)
+        invalidate_products_cache()
+        self.index.checked_at = 0
+        with patch("shopapp.autocomplete.threading.Thread") as thread:
+            # пока индекс строится, запрос получает прежние подсказки
+            self.assertEqual(len(self.index.lookup("suggest la")), 2)
+            self.index.checked_at = 0
+            self.index.lookup("suggest la")
+        thread.assert_called_once()
+        thread.return_value.start.assert_called_once()
+
+        with patch("shopapp.autocomplete.connections"):
+            self.index.rebuild_in_background(*thread.call_args.kwargs["args"])
+        self.assertFalse(self.index.rebuilding)
+        self.assertEqual([name for pk, name in self.index.lookup("suggest la")], ["Suggest lamp"])
+
+    def test_suggest_view(self):
+        response = self.client.get(reverse("shopapp:products-suggest"), {"q": "suggest lap"})
+        self.assertEqual(response.json(), {"results": [{"id": self.laptop.pk, "name": "Suggest Laptop"}]})
@@ -14,16 +14,25 @@ from shopapp.views import (
     ProductDeleteView,
     OrderCreateView,
     OrderDeleteView,
+    ProductAutocompleteView,
+    ProductSuggestView,
+    UserAutocompleteView,
     ProductsDataExportView,
     OrderDataExportView,
+    AsyncProductsDataExportView,
+    AsyncOrderDataExportView,
     ProductViewSet,
     OrderViewSet,
+    JobViewSet,
     LatestProductsFeed,
+    ShopAPIRootView,
 )
 
 routers = routers.DefaultRouter()
+routers.APIRootView = ShopAPIRootView
 routers.register("products", ProductViewSet)
 routers.register("orders", OrderViewSet)
+routers.register("jobs", JobViewSet)
 
 app_name = 'shopapp'
 
@@ -34,13 +43,18 @@ urlpatterns = [
     path('groups/', GroupsListView.as_view(), name='groups_list'),
     path('products/', ProductListView.as_view(), name='products_list'),
     path("products/latest/feed", LatestProductsFeed(), name="products-feed"),
+    path("products/suggest/", ProductSuggestView.as_view(), name="products-suggest"),
     path("products/export/", ProductsDataExportView.as_view(), name="products-export"),
+    path("products/export/async/", AsyncProductsDataExportView.as_view(), name="products-export-async"),
     path('products/create/', ProductCreateView.as_view(), name='product_create'),
     path('products/<int:pk>', ProductDetailView.as_view(), name='product_details'),
     path('products/<int:pk>/update/', ProductUpdateView.as_view(), name='product_update'),
     path('products/<int:pk>/archive/', ProductDeleteView.as_view(), name='product_delete'),
     path('orders/', OrdersListView.as_view(), name='orders_list'),
     path("orders/export/", OrderDataExportView.as_view(), name="order-export"),
+    path("orders/export/async/", AsyncOrderDataExportView.as_view(), name="order-export-async"),
+    path("autocomplete/products/", ProductAutocompleteView.as_view(), name="product_autocomplete"),
+    path("autocomplete/users/", UserAutocompleteView.as_view(), name="user_autocomplete"),
     path('orders/create/', OrderCreateView.as_view(), name='order_create'),
     path('orders/<int:pk>', OrderDetailView.as_view(), name='order_details'),
     path('orders/<int:pk>/update/', OrderUpdateView.as_view(), name='order_update'),
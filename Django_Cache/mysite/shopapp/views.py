@@ -3,21 +3,26 @@
 
 views по товарам, заказам и т.д.
 """
+import json
 import logging
-from csv import DictWriter
+from hashlib import md5
+from urllib.parse import urlencode
 from django.http import (
     HttpRequest,
     HttpResponse,
     HttpResponseRedirect,
     JsonResponse, Http404,
+    StreamingHttpResponse,
 )
 from django.shortcuts import render, redirect, reverse
 from django.contrib.auth.mixins import (
+    AccessMixin,
     LoginRequiredMixin,
     PermissionRequiredMixin,
     UserPassesTestMixin,
 )
 
+from asgiref.sync import sync_to_async
 from django.contrib.auth.models import Group, User
 from django.contrib.syndication.views import Feed
 from django.urls import reverse_lazy
@@ -29,22 +34,43 @@ from django.views.generic import (
     UpdateView,
     DeleteView,
 )
-from django.views.decorators.cache import cache_page
-from django.utils.decorators import method_decorator
 from django.core.cache import cache
-from rest_framework.viewsets import ModelViewSet
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework import mixins, status
+from rest_framework.exceptions import PermissionDenied as ApiPermissionDenied
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.viewsets import ModelViewSet, GenericViewSet
 from rest_framework.filters import SearchFilter, OrderingFilter
 from rest_framework.decorators import action
 from rest_framework.request import Request
+from rest_framework.routers import APIRootView
 from rest_framework.response import Response
-from rest_framework.parsers import MultiPartParser
+from rest_framework.parsers import MultiPartParser, JSONParser
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_spectacular.utils import extend_schema, OpenApiResponse
 
-from .forms import ProductForm, GroupForm
-from .models import Product, Order, ProductImage
-from .serializers import ProductSerializer, OrderSerializer
-from .common import save_scv_products
+from .forms import ProductForm, GroupForm, OrderForm
+from .models import Product, Order, ProductImage, Job
+from .serializers import ProductSerializer, OrderSerializer, JobSerializer
+from .jobs import enqueue_job
+from .autocomplete import product_name_index
+from .pagination import ShopPagination
+from .search import ProductSearchFilter
+from .common import (
+    save_scv_products,
+    iter_csv_rows,
+    iter_orders_data,
+    iter_json_list,
+    aiter_orders_data,
+    aiter_json_list,
+    acache_chunks,
+    file_range_response,
+    user_orders_export_cache_key,
+    get_products_version,
+    prefix_filter,
+    AUTOCOMPLETE_LIMIT,
+    USER_ORDERS_EXPORT_TIMEOUT,
+)
 
 import datetime
 
@@ -52,6 +78,10 @@ import datetime
 log = logging.getLogger(__name__)
 
 
+class ShopAPIRootView(APIRootView):
+    query_budget = 2
+
+
 @extend_schema(description="Product views CRUD")
 class ProductViewSet(ModelViewSet):
     """
@@ -60,8 +90,11 @@ class ProductViewSet(ModelViewSet):
     """
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    pagination_class = ShopPagination
+    # ключ для ?pagination=cursor: сортировка Product.Meta.ordering + pk
+    keyset_ordering = ("name", "price", "pk")
     filter_backends = [
-        SearchFilter,
+        ProductSearchFilter,
         DjangoFilterBackend,
         OrderingFilter,
     ]
@@ -81,11 +114,41 @@ class ProductViewSet(ModelViewSet):
         "description",
         "price",
     ]
-
-    @method_decorator(cache_page(60 * 2))
-    def list(self, *args, **kwargs):
-        # print("hello products list")
-        return super().list(*args, **kwargs)
+    csv_fields = [
+        "name",
+        "description",
+        "price",
+        "discount",
+    ]
+    csv_chunk_size = 2000
+    query_budget = 6
+    query_budgets = {
+        "list": 4,
+        "download_csv": 3,
+        # по запросу на каждую пачку из IMPORT_BATCH_SIZE строк, большие файлы — через JobViewSet
+        "upload_csv": None,
+    }
+    # список сбрасывается сменой версии каталога, поэтому его можно держать долго
+    list_cache_timeout = 60 * 60 * 6
+
+    def get_list_cache_key(self, request: Request) -> str:
+        query = urlencode(sorted(
+            (key, value)
+            for key, values in request.query_params.lists()
+            for value in values
+        ))
+        url = f"{request.get_host()}{request.path}?{query}"
+        return f"products_list:{get_products_version()}:{md5(url.encode()).hexdigest()}"
+
+    def list(self, request: Request, *args, **kwargs):
+        # кэшируются данные, а не готовый ответ: рендерер выбирается для каждого запроса
+        cache_key = self.get_list_cache_key(request)
+        data = cache.get(cache_key)
+        if data is not None:
+            return Response(data)
+        response = super().list(request, *args, **kwargs)
+        cache.set(cache_key, response.data, self.list_cache_timeout)
+        return response
 
     @extend_schema(
         summary="Get one product by ID",
@@ -100,52 +163,112 @@ class ProductViewSet(ModelViewSet):
 
     @action(methods=["get"], detail=False)
     def download_csv(self, request: Request):
-        response = HttpResponse(content_type="text/csv")
-        filename = "products-export.csv"
-        response["Content_Disposition"] = f"attachment; filename={filename}"
+        fields = self.csv_fields
+        # фильтры SearchFilter/DjangoFilterBackend/OrderingFilter применяются как раньше,
+        # но строки читаются кусками через iterator() и без создания объектов Product
         queryset = self.filter_queryset(self.get_queryset())
-        fields = [
-            "name",
-            "description",
-            "price",
-            "discount",
-        ]
-        queryset = queryset.only(*fields)
-        writer = DictWriter(response, fieldnames=fields)
-        writer.writeheader()
-        for product in queryset:
-            writer.writerow({
-                field: getattr(product, field)
-                for field in fields
-            })
+        rows = queryset.values_list(*fields).iterator(chunk_size=self.csv_chunk_size)
+        response = StreamingHttpResponse(
+            iter_csv_rows(fields, rows),
+            content_type="text/csv",
+        )
+        filename = "products-export.csv"
+        response["Content-Disposition"] = f"attachment; filename={filename}"
         return response
 
-
     @action(
         detail=False,
         methods=["post", ],
         parser_classes=[MultiPartParser, ]
     )
     def upload_csv(self, request: Request):
-        products = save_scv_products(
+        report = save_scv_products(
             file=request.FILES["file"].file,
             encoding=request.encoding,
         )
-        serializer = self.get_serializer(products, many=True)
-        return Response(serializer.data)
+        return Response(report)
 
 
 class OrderViewSet(ModelViewSet):
-    queryset = Order.objects.all()
+    # products сериализуются списком pk, без prefetch это запрос на каждый заказ
+    queryset = Order.objects.prefetch_related("products")
     serializer_class = OrderSerializer
+    pagination_class = ShopPagination
+    keyset_ordering = ("created_at", "pk")
     filter_backends = [SearchFilter, DjangoFilterBackend, OrderingFilter]
     search_fields = ["delivery_address", "products"]
     filterset_fields = ["delivery_address", "promocode", "created_at", "user", "products",]
     ordering_fields = ["delivery_address", "user", "products"]
+    query_budget = 5
+    # товары заказа проверяются одним запросом (PrimaryKeysField), бюджет не растёт с их числом
+    query_budgets = {
+        "create": 9,
+        "update": 10,
+        "partial_update": 10,
+    }
+
+
+@extend_schema(description="Background export and import jobs")
+class JobViewSet(
+    mixins.CreateModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.ListModelMixin,
+    GenericViewSet,
+):
+    """
+    Постановка фоновых задач в очередь, их статус и скачивание результата.
+    Задачи выполняет команда run_jobs.
+    """
+    queryset = Job.objects.all()
+    serializer_class = JobSerializer
+    permission_classes = [IsAuthenticated]
+    parser_classes = [JSONParser, MultiPartParser]
+    # выгрузка всех заказов, как и OrderDataExportView, только для сотрудников
+    staff_only_kinds = {Job.KIND_ORDERS_EXPORT}
+    kind_permissions = {
+        Job.KIND_PRODUCTS_CSV_IMPORT: "shopapp.add_product",
+    }
+    query_budget = 4
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.user.is_staff:
+            return queryset
+        return queryset.filter(created_by=self.request.user)
+
+    def perform_create(self, serializer):
+        kind = serializer.validated_data["kind"]
+        permission = self.kind_permissions.get(kind)
+        user = self.request.user
+        if kind in self.staff_only_kinds and not user.is_staff:
+            raise ApiPermissionDenied
+        if permission and not (user.is_staff or user.has_perm(permission)):
+            raise ApiPermissionDenied
+        params = serializer.validated_data.get("params") or {}
+        if kind == Job.KIND_PRODUCTS_CSV_IMPORT:
+            params.setdefault("encoding", self.request.encoding)
+        serializer.instance = enqueue_job(
+            kind=kind,
+            params=params,
+            user=user,
+            source=serializer.validated_data.get("source"),
+        )
+
+    @action(methods=["get"], detail=True)
+    def download(self, request: Request, pk=None):
+        job = self.get_object()
+        if job.status != Job.STATUS_DONE or not job.result:
+            return Response(
+                {"detail": "Job has no result yet", "status": job.status},
+                status=status.HTTP_409_CONFLICT,
+            )
+        return file_range_response(request, job.result, job.result.name.rsplit("/", 1)[-1])
 
 
 # @method_decorator(cache_page(60 * 2))
 class ShopIndexView(View):
+    query_budget = 0
+
     def get(self, request: HttpRequest) -> HttpResponse:
         products = [
             ('BIG', 1000),
@@ -160,11 +283,12 @@ class ShopIndexView(View):
         }
         log.debug("Products for shop index: %s", products)
         log.info("Rendering shop index")
-        print("shop index context:", context)
         return render(request, 'shopapp/shop_index.html', context=context)
 
 
 class GroupsListView(View):
+    query_budget = 4
+
     def get(self, request: HttpRequest):
         context = {
             'form': GroupForm,
@@ -180,6 +304,7 @@ class GroupsListView(View):
 
 
 class ProductListView(ListView):
+    query_budget = 3
     template_name = 'shopapp/products_list.html'
     # model = Product
     context_object_name = 'products'
@@ -193,12 +318,14 @@ class ProductListView(ListView):
 
 
 class ProductDetailView(DetailView):
+    query_budget = 2
     template_name = 'shopapp/product-details.html'
-    queryset = Product.objects.prefetch_related("images")
+    queryset = Product.objects.select_related("created_by").prefetch_related("images")
     context_object_name = 'product'
 
 
 class ProductCreateView(PermissionRequiredMixin, CreateView):
+    query_budget = 5
     # def test_func(self):
     #     # return self.request.user.groups.filter(name="secret-group").exists()
     #     return self.request.user.is_superuser
@@ -214,6 +341,7 @@ class ProductCreateView(PermissionRequiredMixin, CreateView):
 
 
 class ProductUpdateView(UserPassesTestMixin, UpdateView):
+    query_budget = 7
 
     def test_func(self):
         if self.request.user.is_superuser:
@@ -244,6 +372,7 @@ class ProductUpdateView(UserPassesTestMixin, UpdateView):
 
 
 class ProductDeleteView(DeleteView):
+    query_budget = 3
     model = Product
     success_url = reverse_lazy('shopapp:products_list')
 
@@ -255,6 +384,7 @@ class ProductDeleteView(DeleteView):
 
 
 class OrdersListView(LoginRequiredMixin, ListView):
+    query_budget = 4
     template_name = "shopapp/order_list.html"
     context_object_name = 'orders'
     queryset = (
@@ -263,15 +393,17 @@ class OrdersListView(LoginRequiredMixin, ListView):
 
 
 class OrderDetailView(PermissionRequiredMixin, DetailView):
+    query_budget = 6
     permission_required = "shopapp.view_order"
     template_name = 'shopapp/order_detail.html'
-    model = Order
+    queryset = Order.objects.select_related("user").prefetch_related("products")
     context_object_name = 'order'
 
 
 class OrderUpdateView(UpdateView):
+    query_budget = 8
     model = Order
-    fields = 'user', 'delivery_address', 'promocode', 'products'
+    form_class = OrderForm
     template_name_suffix = "_update_form"
 
     def get_success_url(self):
@@ -282,85 +414,189 @@ class OrderUpdateView(UpdateView):
 
 
 class OrderCreateView(CreateView):
+    query_budget = 8
     model = Order
-    fields = 'user', 'delivery_address', 'promocode', 'products'
+    form_class = OrderForm
     success_url = reverse_lazy('shopapp:orders_list')
 
 
+class AutocompleteView(View):
+    """
+    Варианты для виджетов автодополнения в формах заказа: не больше AUTOCOMPLETE_LIMIT
+    объектов, у которых search_field начинается с ?term=.
+    """
+    query_budget = 3
+    queryset = None
+    search_field = None
+
+    def get(self, request: HttpRequest) -> JsonResponse:
+        term = request.GET.get("term", "").strip()
+        queryset = self.queryset.only(self.search_field).order_by(self.search_field, "pk")
+        if term:
+            queryset = queryset.filter(prefix_filter(self.search_field, term))
+        objects = list(queryset[:AUTOCOMPLETE_LIMIT + 1])
+        return JsonResponse({
+            "results": [
+                {"id": obj.pk, "text": str(obj)}
+                for obj in objects[:AUTOCOMPLETE_LIMIT]
+            ],
+            "more": len(objects) > AUTOCOMPLETE_LIMIT,
+        })
+
+
+class ProductAutocompleteView(AutocompleteView):
+    queryset = Product.objects.filter(archived=False)
+    search_field = "name"
+
+
+class ProductSuggestView(View):
+    """
+    Подсказки для строки поиска магазина: названия неархивных товаров, начинающиеся с ?q=,
+    из индекса в памяти процесса, без запроса к БД.
+    """
+    # индекс перестраивается из БД только при смене версии каталога
+    query_budget = 2
+    limit = 10
+
+    def get(self, request: HttpRequest) -> JsonResponse:
+        term = request.GET.get("q", "").strip()
+        results = product_name_index.lookup(term, self.limit) if term else []
+        return JsonResponse({
+            "results": [{"id": pk, "name": name} for pk, name in results],
+        })
+
+
+class UserAutocompleteView(LoginRequiredMixin, AutocompleteView):
+    queryset = User.objects.all()
+    search_field = "username"
+
+
 class OrderDeleteView(DeleteView):
+    query_budget = 3
     model = Order
     success_url = reverse_lazy("shopapp:orders_list")
 
 
 class ProductsDataExportView(View):
-    def get(self, request: HttpRequest) -> JsonResponse:
-        cache_key = "product_data_export"
-        products_data = cache.get(cache_key)
-        if products_data is None:
-            products = Product.objects.order_by("pk").all()
-            products_data = [
-                {
-                    "pk": product.pk,
-                    "name": product.name,
-                    "price": product.price,
-                    "archived": product.archived,
-                }
-                for product in products
-            ]
-        # elem = products_data[0]
-        # name = elem["name"]
-        # print("name: ", name)
-        cache.set(cache_key, products_data, 60 * 5)
-        return JsonResponse({"products": products_data})
+    query_budget = 1
+    cache_key = "product_data_export"
+    cache_timeout = 60 * 60
+    fields = "pk", "name", "price", "archived"
+
+    def get(self, request: HttpRequest) -> HttpResponse:
+        # в кэше лежит уже сериализованный JSON, при попадании его не нужно ни пересчитывать,
+        # ни перезаписывать; ключ меняется вместе с версией каталога
+        cache_key = f"{self.cache_key}:{get_products_version()}"
+        content = cache.get(cache_key)
+        if content is None:
+            content = self.build_content()
+            cache.set(cache_key, content, self.cache_timeout)
+        return HttpResponse(content, content_type="application/json")
+
+    def build_content(self) -> bytes:
+        products = Product.objects.order_by("pk").values(*self.fields)
+        products_data = list(products.iterator())
+        return json.dumps(
+            {"products": products_data},
+            cls=DjangoJSONEncoder,
+        ).encode()
 
 
 class OrderDataExportView(UserPassesTestMixin, View):
+    query_budget = 4
+
     def test_func(self):
         if self.request.user.is_staff:
             return True
         else:
             return False
 
-    def get(self, request: HttpRequest) -> JsonResponse:
-        orders = Order.objects.order_by("pk").all()
-        orders_data = [
-            {
-                "ID": order.pk,
-                "delivery address": order.delivery_address,
-                "promocode": order.promocode,
-                "user_id": order.user.id,
-                "products id": str([product.pk for product in order.products.all()]),
-            }
-            for order in orders
-        ]
-        return JsonResponse({"orders": orders_data})
+    def get(self, request: HttpRequest) -> StreamingHttpResponse:
+        orders = Order.objects.all()
+        return StreamingHttpResponse(
+            iter_json_list("orders", iter_orders_data(orders)),
+            content_type="application/json",
+        )
 
 
 class UserOrdersDataExportView(View):
+    query_budget = 3
 
-    def get(self, request, **kwargs) -> JsonResponse:
-        try:
-            self.owner = User.objects.filter(pk=self.kwargs['pk'])[0]
-        except IndexError:
+    def get(self, request, **kwargs) -> HttpResponse:
+        owner_id = self.kwargs["pk"]
+        if not User.objects.filter(pk=owner_id).exists():
             raise Http404
-        cache_key = "product_data_export"
-        products_data = cache.get(cache_key)
-        orders = Order.objects.filter(user=self.owner).order_by("pk").all()
-        orders_data = [
-             {
-                "ID": order.pk,
-                "delivery address": order.delivery_address,
-                "promocode": order.promocode,
-                "user_id": order.user.id,
-                "products id": str([product.pk for product in order.products.all()]),
-             }
-            for order in orders
-        ]
-        cache.set(cache_key, products_data, 60 * 5)
-        return JsonResponse({"orders": orders_data})
+        cache_key = user_orders_export_cache_key(owner_id)
+        content = cache.get(cache_key)
+        if content is None:
+            orders = Order.objects.filter(user_id=owner_id)
+            content = "".join(iter_json_list("orders", iter_orders_data(orders))).encode()
+            cache.set(cache_key, content, USER_ORDERS_EXPORT_TIMEOUT)
+        return HttpResponse(content, content_type="application/json")
+
+
+class AsyncProductsDataExportView(View):
+    """
+    Асинхронная выгрузка товаров для ASGI: ответ отдаётся потоком, пока читается таблица,
+    и один воркер uvicorn может обслуживать много одновременных выгрузок.
+    """
+    query_budget = 1
+    cache_key = ProductsDataExportView.cache_key
+    cache_timeout = ProductsDataExportView.cache_timeout
+    fields = ProductsDataExportView.fields
+
+    async def get(self, request: HttpRequest) -> HttpResponse:
+        version = await sync_to_async(get_products_version)()
+        cache_key = f"{self.cache_key}:{version}"
+        content = await cache.aget(cache_key)
+        if content is not None:
+            return HttpResponse(content, content_type="application/json")
+        products = Product.objects.order_by("pk").values(*self.fields)
+        chunks = aiter_json_list("products", products.aiterator())
+        return StreamingHttpResponse(
+            acache_chunks(chunks, cache_key, self.cache_timeout),
+            content_type="application/json",
+        )
+
+
+class AsyncOrderDataExportView(AccessMixin, View):
+    # как у OrderDataExportView: сессия, пользователь и два запроса выгрузки
+    query_budget = 4
+
+    async def get(self, request: HttpRequest) -> HttpResponse:
+        # UserPassesTestMixin синхронный, а request.user ленивый и ходит в БД
+        is_staff = await sync_to_async(lambda: request.user.is_staff)()
+        if not is_staff:
+            # как у OrderDataExportView: анонима на страницу входа, остальным 403
+            return self.handle_no_permission()
+        orders = Order.objects.all()
+        return StreamingHttpResponse(
+            aiter_json_list("orders", aiter_orders_data(orders)),
+            content_type="application/json",
+        )
+
+
+class AsyncUserOrdersDataExportView(View):
+    query_budget = 3
+
+    async def get(self, request: HttpRequest, **kwargs) -> HttpResponse:
+        owner_id = self.kwargs["pk"]
+        if not await User.objects.filter(pk=owner_id).aexists():
+            raise Http404
+        cache_key = await sync_to_async(user_orders_export_cache_key)(owner_id)
+        content = await cache.aget(cache_key)
+        if content is not None:
+            return HttpResponse(content, content_type="application/json")
+        orders = Order.objects.filter(user_id=owner_id)
+        chunks = aiter_json_list("orders", aiter_orders_data(orders))
+        return StreamingHttpResponse(
+            acache_chunks(chunks, cache_key, USER_ORDERS_EXPORT_TIMEOUT),
+            content_type="application/json",
+        )
 
 
 class LatestProductsFeed(Feed):
+    query_budget = 1
     title = "Products (latest)"
     description = "Updates on changes in the products presented"
     link = reverse_lazy("shopapp:products_list")
@@ -379,10 +615,11 @@ class LatestProductsFeed(Feed):
         return item.description[:200]
 
     def item_link(self, item: Product):
-        return reverse("shopapp:products_list", kwargs={"pk": item.pk})
+        return reverse("shopapp:product_details", kwargs={"pk": item.pk})
 
 
 class UserOrdersListView(ListView):
+    query_budget = 3
     template_name = "shopapp/user_orders_list.html"
     model = Order
     context_object_name = 'user_orders'
@@ -390,7 +627,7 @@ class UserOrdersListView(ListView):
 
     def get_queryset(self):
         self.owner = self.kwargs["pk"]
-        queryset = Order.objects.filter(user=self.owner).all()
+        queryset = Order.objects.filter(user=self.owner).prefetch_related("products")
         return queryset
 
     def get_context_data(self, **kwargs):